@@ -0,0 +1,491 @@
+import compresser as compresser
+import numpy as np
+import os
+from cache import cached_year
+from columnar_file import write_columnar_file
+
+COUNTRY_COLUMN = "GEOGRAPHIE_MOD"
+FLUX_COLUMN = "N027_LIB"
+MONTH_COLUMN = "N053_LIB"
+PRODUCT_COLUMN = "N890_LIB"
+VALUE_COLUMN = "VALEUR"
+YEAR_COLUMN = "ANNREF"
+ANNUAL_TOTAL = "Total annuel"
+CONTINENT_COLUMN = "CONTINENT"
+MEASURE_COLUMN = "MEASURE"
+MONTH_NAMES = ["Janvier", "Février", "Mars", "Avril", "Mai", "Juin", "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
+
+# Export and import flux of every measure, in the order of the MEASURE column (labels of exports.json)
+MEASURES = [
+    ("volume", "Exportation (volume)", "Importation (volume)"),
+    ("valeur", "Exportation (valeur)", "Importation (valeur)"),
+]
+DERIVED_FILE_NAME = "derived"
+
+
+def load_years(output_file_name:str, start:int, end:int) -> dict[int, np.ndarray]:
+    """
+    Loads the indexed yearly files written by the pipeline.
+
+    Args:
+        output_file_name (str): The base name of the yearly files.
+        start (int): The first year.
+        end (int): The last year.
+    Returns:
+        dict: The indexed data of every year found.
+    """
+    years_data = {}
+    for year in range(start, end + 1):
+        file_name = f"{output_file_name}_{year}.npz"
+        if os.path.exists(file_name):
+            years_data[year] = cached_year(file_name)
+        else:
+            print(f"Missing yearly file {file_name}, skipped.")
+    return years_data
+
+
+def group_sum(keys:list[np.ndarray], sizes:list[int], values:np.ndarray) -> np.ndarray:
+    """
+    Sums values grouped by several integer keys into a dense cube.
+
+    Args:
+        keys (list[np.ndarray]): The code of every row for each dimension.
+        sizes (list[int]): The number of codes of each dimension.
+        values (np.ndarray): The values to sum.
+    Returns:
+        np.ndarray: The int64 cube of shape sizes.
+    """
+    flat_keys = np.ravel_multi_index(keys, sizes)
+    sums = np.bincount(flat_keys, weights=values, minlength=int(np.prod(sizes)))
+    return np.rint(sums).astype(np.int64).reshape(sizes)
+
+
+def cube_columns(cube:np.ndarray, names:list[str], labels:list[np.ndarray]|None=None) -> dict[str, np.ndarray]:
+    """
+    Converts a dense cube into columns, one row per non-zero cell.
+
+    Args:
+        cube (np.ndarray): The dense cube.
+        names (list[str]): The name of every dimension.
+        labels (list[np.ndarray]|None): The value of every code of each dimension, the codes are kept if None.
+    Returns:
+        dict: The dimension columns and the VALEUR column.
+    """
+    coordinates = np.nonzero(cube)
+    columns = {}
+    for dimension, (name, coordinate) in enumerate(zip(names, coordinates)):
+        columns[name] = coordinate if labels is None or labels[dimension] is None else labels[dimension][coordinate]
+    columns[VALUE_COLUMN] = cube[coordinates]
+    return columns
+
+
+def rollup_cubes(
+        years_data:dict[int, np.ndarray],
+        header:list[str],
+        dicos:dict[str, dict[str, str]],
+        continents:dict[str, dict],
+    ) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Precomputes the sums displayed by the charts from the indexed yearly data.
+
+    The rows are summed as they are in the data: the aggregate countries (EU, AFRSB...) and
+    products are kept like any other code. The yearly totals use the "Total annuel" rows,
+    the month series every other month. The continent rollups sum the countries listed in
+    continents.json, the aggregate countries of the data are therefore not counted twice.
+    The flux is always kept as a dimension since volumes and values can not be added.
+
+    Args:
+        years_data (dict): The indexed data of every year.
+        header (list[str]): The header of the indexed data.
+        dicos (dict): The exported dictionaries (code to value) by column name.
+        continents (dict): The content of continents.json.
+    Returns:
+        dict: The columns of every cube by cube name.
+    """
+    years = np.array(sorted(years_data), dtype=np.int64)
+    data = np.concatenate([years_data[year] for year in years]) if len(years) else np.empty((0, len(header)), dtype=np.int32)
+    year_index = np.repeat(np.arange(len(years)), [len(years_data[year]) for year in years])
+
+    country = data[:, header.index(COUNTRY_COLUMN)].astype(np.int64)
+    flux = data[:, header.index(FLUX_COLUMN)].astype(np.int64)
+    month = data[:, header.index(MONTH_COLUMN)].astype(np.int64)
+    product = data[:, header.index(PRODUCT_COLUMN)].astype(np.int64)
+    values = data[:, header.index(VALUE_COLUMN)].astype(np.float64)
+    n_years = len(years)
+    n_countries = len(dicos[COUNTRY_COLUMN])
+    n_flux = len(dicos[FLUX_COLUMN])
+    n_months = len(dicos[MONTH_COLUMN])
+    n_products = len(dicos[PRODUCT_COLUMN])
+
+    # Rows holding the yearly totals, every row if the data has no such month
+    total_codes = [int(code) for code, label in dicos[MONTH_COLUMN].items() if label == ANNUAL_TOTAL]
+    total = month == total_codes[0] if total_codes else np.ones(len(month), dtype=bool)
+
+    # Continent of every country code, -1 for codes outside continents.json
+    continent_of = {country_code: i for i, continent in enumerate(continents.values()) for country_code in continent["countries"]}
+    country_continent = np.array([continent_of.get(dicos[COUNTRY_COLUMN][str(code)], -1) for code in range(n_countries)], dtype=np.int64)
+    row_continent = country_continent[country]
+    in_continent = total & (row_continent >= 0)
+
+    cubes = {
+        "year_totals": cube_columns(
+            group_sum([year_index[total], flux[total]], [n_years, n_flux], values[total]),
+            [YEAR_COLUMN, FLUX_COLUMN], [years, None],
+        ),
+        "country_totals": cube_columns(
+            group_sum([year_index[total], country[total], flux[total]], [n_years, n_countries, n_flux], values[total]),
+            [YEAR_COLUMN, COUNTRY_COLUMN, FLUX_COLUMN], [years, None, None],
+        ),
+        "product_totals": cube_columns(
+            group_sum([year_index[total], product[total], flux[total]], [n_years, n_products, n_flux], values[total]),
+            [YEAR_COLUMN, PRODUCT_COLUMN, FLUX_COLUMN], [years, None, None],
+        ),
+        "continent_totals": cube_columns(
+            group_sum(
+                [year_index[in_continent], row_continent[in_continent], flux[in_continent]],
+                [n_years, len(continents), n_flux],
+                values[in_continent],
+            ),
+            [YEAR_COLUMN, CONTINENT_COLUMN, FLUX_COLUMN], [years, None, None],
+        ),
+        "month_series": cube_columns(
+            group_sum([year_index[~total], month[~total], flux[~total]], [n_years, n_months, n_flux], values[~total]),
+            [YEAR_COLUMN, MONTH_COLUMN, FLUX_COLUMN], [years, None, None],
+        ),
+    }
+    return cubes
+
+
+def build_rollups(
+        output_file_name:str,
+        start:int,
+        end:int,
+        dico_folder:str,
+        output_folder:str,
+        continents_path:str="visualization/src/data/continents",
+    ) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Computes the rollup cubes from the yearly files and writes one file per cube.
+
+    Every cube is written as rollup_<name>.bin (see columnar_file), with one row per
+    non-zero cell. The continent codes are listed in rollup_continents.json, in the order
+    of their index in the CONTINENT column.
+
+    Args:
+        output_file_name (str): The base name of the yearly files.
+        start (int): The first year.
+        end (int): The last year.
+        dico_folder (str): The folder of the dictionaries.
+        output_folder (str): The folder to write the cubes to.
+        continents_path (str): Path to continents.json (without the file extension).
+    Returns:
+        dict: The columns of every cube by cube name.
+    """
+    header = compresser.open_json_file(dico_folder+"header")
+    if not isinstance(header, list) or not header:
+        print("Error: no header found, the rollups need the dictionaries of the pipeline.")
+        return {}
+    dicos = {name: compresser.open_json_file(dico_folder+name) for name in [COUNTRY_COLUMN, FLUX_COLUMN, MONTH_COLUMN, PRODUCT_COLUMN]}
+    continents = compresser.open_json_file(continents_path)
+
+    cubes = rollup_cubes(load_years(output_file_name, start, end), header, dicos, continents)
+    for name, columns in cubes.items():
+        write_columnar_file(output_folder+"rollup_"+name+".bin", list(columns.values()), list(columns))
+        print(f"Successfully wrote rollup {name} ({len(columns[VALUE_COLUMN])} cells).")
+    compresser.json_list_output_file(output_folder+"rollup_continents", list(continents))
+    return cubes
+
+
+def sparse_group_sums(keys:list[np.ndarray], sizes:list[int], weights:list[np.ndarray]) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """
+    Sums several value columns grouped by integer keys, keeping only the groups present.
+
+    The sparse counterpart of group_sum, for key spaces too large for a dense cube: the
+    groups are found once and every value column is summed with one bincount.
+
+    Args:
+        keys (list[np.ndarray]): The code of every row for each dimension.
+        sizes (list[int]): The number of codes of each dimension.
+        weights (list[np.ndarray]): The value columns to sum.
+    Returns:
+        tuple: The codes of every group for each dimension, in key order, and the int64 sums of every value column.
+    """
+    flat_keys = np.ravel_multi_index(keys, sizes) if len(keys[0]) else np.empty(0, dtype=np.int64)
+    groups, inverse = np.unique(flat_keys, return_inverse=True)
+    sums = [np.rint(np.bincount(inverse, weights=values, minlength=len(groups))).astype(np.int64) for values in weights]
+    return list(np.unravel_index(groups, sizes)), sums
+
+
+def measure_flux(flux_dico:dict[str, str]) -> list[tuple[int, int]]:
+    """
+    Returns the export and import flux codes of every measure of MEASURES, -1 when missing.
+    """
+    codes = {label: int(code) for code, label in flux_dico.items()}
+    return [(codes.get(export_label, -1), codes.get(import_label, -1)) for _, export_label, import_label in MEASURES]
+
+
+def month_numbers(month_dico:dict[str, str]) -> np.ndarray:
+    """
+    Returns the month number (1 to 12) of every month code, 0 for the yearly total and unknown labels.
+    """
+    return np.array([MONTH_NAMES.index(month_dico[str(code)]) + 1 if month_dico[str(code)] in MONTH_NAMES else 0 for code in range(len(month_dico))], dtype=np.int64)
+
+
+def balance_tables(
+        year_index:np.ndarray,
+        area:np.ndarray,
+        flux:np.ndarray,
+        month:np.ndarray,
+        product:np.ndarray,
+        values:np.ndarray,
+        sizes:list[int],
+        flux_codes:list[tuple[int, int]],
+        area_column:str=COUNTRY_COLUMN,
+    ) -> dict[str, np.ndarray]:
+    """
+    Computes the trade balance of every area (country or continent), month, product and measure.
+
+    The balance of a measure is its exports minus its imports, a missing flux counting as
+    zero. The rows of an area below 0 and of the flux outside the measures are ignored.
+
+    Args:
+        year_index (np.ndarray): The index of the year of every row.
+        area (np.ndarray): The area code of every row.
+        flux (np.ndarray): The flux code of every row.
+        month (np.ndarray): The month code of every row.
+        product (np.ndarray): The product code of every row.
+        values (np.ndarray): The value of every row.
+        sizes (list[int]): The number of years, months, areas, products and flux.
+        flux_codes (list): The export and import flux codes of every measure, see measure_flux.
+        area_column (str): The name of the area column.
+    Returns:
+        dict: The year index, month, area, product and measure codes of every cell and its
+            EXPORT, IMPORT and BALANCE, sorted by year.
+    """
+    measure_of_flux = np.full(sizes[4], -1, dtype=np.int64)
+    is_export = np.zeros(sizes[4], dtype=bool)
+    for measure, (export_code, import_code) in enumerate(flux_codes):
+        for code, export in [(export_code, True), (import_code, False)]:
+            if code >= 0:
+                measure_of_flux[code] = measure
+                is_export[code] = export
+
+    selected = (measure_of_flux[flux] >= 0) & (area >= 0)
+    exports = is_export[flux[selected]]
+    keys, (export_sums, import_sums) = sparse_group_sums(
+        [year_index[selected], month[selected], area[selected], product[selected], measure_of_flux[flux[selected]]],
+        sizes[:4] + [len(flux_codes)],
+        [np.where(exports, values[selected], 0), np.where(exports, 0, values[selected])],
+    )
+    return dict(zip([YEAR_COLUMN, MONTH_COLUMN, area_column, PRODUCT_COLUMN, MEASURE_COLUMN], keys)) | {
+        "EXPORT": export_sums,
+        "IMPORT": import_sums,
+        "BALANCE": export_sums - import_sums,
+    }
+
+
+def series_table(
+        year_index:np.ndarray,
+        country:np.ndarray,
+        flux:np.ndarray,
+        month:np.ndarray,
+        product:np.ndarray,
+        values:np.ndarray,
+        sizes:list[int],
+    ) -> dict[str, np.ndarray]:
+    """
+    Computes the month-over-month and year-over-year deltas and the rolling 12-month sums
+    of every (country, product, flux) series.
+
+    Every (series, month) cell is keyed by series * n_periods + period, so the cells are
+    sorted by series then month and the previous month, the previous year and the
+    cumulated sums of a cell are found with binary searches on the keys of the non-zero
+    cells, without a dense series x months matrix. The months without a row are zero, the
+    months before the first year too: the deltas of the first month (MoM) or first year
+    (YoY) and the first eleven rolling sums are partial. The months after the last month
+    present in the data are not computed.
+
+    Args:
+        year_index (np.ndarray): The number of years between the year of every row and the first year.
+        country (np.ndarray): The country code of every row.
+        flux (np.ndarray): The flux code of every row.
+        month (np.ndarray): The month number (1 to 12) of every row, the rows at 0 are ignored.
+        product (np.ndarray): The product code of every row.
+        values (np.ndarray): The value of every row.
+        sizes (list[int]): The number of calendar years, countries, products and flux.
+    Returns:
+        dict: The year offset, month number, country, product and flux codes of every non-zero
+            cell and its VALEUR, MOM_DELTA, YOY_DELTA and ROLLING_12, sorted by year.
+    """
+    monthly = month > 0
+    period = year_index[monthly].astype(np.int64) * 12 + month[monthly] - 1
+    n_periods = int(period.max()) + 1 if len(period) else 0
+    series, series_index = np.unique(np.ravel_multi_index([country[monthly], product[monthly], flux[monthly]], sizes[1:]), return_inverse=True)
+
+    keys, cell_index = np.unique(series_index.astype(np.int64) * n_periods + period, return_inverse=True)
+    cell_values = np.rint(np.bincount(cell_index, weights=values[monthly].astype(np.float64), minlength=len(keys))).astype(np.int64)
+    keys, cell_values = keys[cell_values != 0], cell_values[cell_values != 0]
+    cumulated = np.concatenate([[0], np.cumsum(cell_values)])
+
+    def value_at(cells:np.ndarray) -> np.ndarray:
+        positions = np.minimum(np.searchsorted(keys, cells), max(len(keys) - 1, 0))
+        return np.where(keys[positions] == cells, cell_values[positions], 0) if len(keys) else np.zeros(len(cells), dtype=np.int64)
+
+    # A value changes the cell itself, the MoM delta of the next month and the YoY delta and
+    # rolling sums of the next twelve: only these cells can be non-zero
+    offsets = np.arange(13)
+    candidates = keys[:, None] + offsets
+    candidates = np.unique(candidates[keys[:, None] % max(n_periods, 1) + offsets < n_periods])
+    cell_period = candidates % max(n_periods, 1)
+    current = value_at(candidates)
+    derived = {
+        "VALEUR": current,
+        "MOM_DELTA": current - np.where(cell_period >= 1, value_at(candidates - 1), 0),
+        "YOY_DELTA": current - np.where(cell_period >= 12, value_at(candidates - 12), 0),
+        "ROLLING_12": cumulated[np.searchsorted(keys, candidates, side="right")]
+            - cumulated[np.searchsorted(keys, np.where(cell_period >= 12, candidates - 12, candidates - cell_period - 1), side="right")],
+    }
+    kept = np.any([column != 0 for column in derived.values()], axis=0) if len(candidates) else np.zeros(0, dtype=bool)
+    cells = candidates[kept] // max(n_periods, 1), cell_period[kept]
+    series_country, series_product, series_flux = np.unravel_index(series[cells[0]], sizes[1:])
+    order = np.argsort(cells[1] // 12, kind="stable")
+    return {
+        YEAR_COLUMN: cells[1][order] // 12,
+        MONTH_COLUMN: cells[1][order] % 12 + 1,
+        COUNTRY_COLUMN: series_country[order],
+        PRODUCT_COLUMN: series_product[order],
+        FLUX_COLUMN: series_flux[order],
+    } | {name: column[kept][order] for name, column in derived.items()}
+
+
+def split_years(columns:dict[str, np.ndarray], years:np.ndarray) -> dict[int, dict[str, np.ndarray]]:
+    """
+    Splits a table sorted by year index into one table per year, without the year column.
+    """
+    bounds = np.searchsorted(columns[YEAR_COLUMN], np.arange(len(years) + 1))
+    return {
+        int(year): {name: column[bounds[i]:bounds[i + 1]] for name, column in columns.items() if name != YEAR_COLUMN}
+        for i, year in enumerate(years)
+    }
+
+
+def derived_tables(
+        years_data:dict[int, np.ndarray],
+        header:list[str],
+        dicos:dict[str, dict[str, str]],
+        continents:dict[str, dict],
+    ) -> dict[str, dict[int, dict[str, np.ndarray]]]:
+    """
+    Precomputes the trade balances and the deltas of the series from the indexed yearly data.
+
+    Every table is computed once on the rows of all years, then split by year:
+        - "balance_countries" and "balance_continents": EXPORT, IMPORT and BALANCE of every
+          (month, country or continent, product, measure), yearly totals included, the
+          measure being the index of the volume or value flux in MEASURES,
+        - "series": VALEUR, MOM_DELTA, YOY_DELTA and ROLLING_12 of every (month, country,
+          product, flux) in which one of them is not zero.
+    As in the rollups, the aggregate codes of the data are kept as they are and the
+    continents sum the countries listed in continents.json.
+
+    Args:
+        years_data (dict): The indexed data of every year.
+        header (list[str]): The header of the indexed data.
+        dicos (dict): The exported dictionaries (code to value) by column name.
+        continents (dict): The content of continents.json.
+    Returns:
+        dict: The columns of every year of every table, by table name.
+    """
+    years = np.array(sorted(years_data), dtype=np.int64)
+    data = np.concatenate([years_data[year] for year in years]) if len(years) else np.empty((0, len(header)), dtype=np.int32)
+    year_index = np.repeat(np.arange(len(years)), [len(years_data[year]) for year in years])
+
+    country = data[:, header.index(COUNTRY_COLUMN)].astype(np.int64)
+    flux = data[:, header.index(FLUX_COLUMN)].astype(np.int64)
+    month = data[:, header.index(MONTH_COLUMN)].astype(np.int64)
+    product = data[:, header.index(PRODUCT_COLUMN)].astype(np.int64)
+    values = data[:, header.index(VALUE_COLUMN)].astype(np.float64)
+    n_countries = len(dicos[COUNTRY_COLUMN])
+    n_flux = len(dicos[FLUX_COLUMN])
+    n_months = len(dicos[MONTH_COLUMN])
+    n_products = len(dicos[PRODUCT_COLUMN])
+    flux_codes = measure_flux(dicos[FLUX_COLUMN])
+
+    continent_of = {country_code: i for i, continent in enumerate(continents.values()) for country_code in continent["countries"]}
+    country_continent = np.array([continent_of.get(dicos[COUNTRY_COLUMN][str(code)], -1) for code in range(n_countries)], dtype=np.int64)
+
+    numbers = month_numbers(dicos[MONTH_COLUMN])
+    month_codes = np.zeros(13, dtype=np.int64)
+    month_codes[numbers[numbers > 0]] = np.flatnonzero(numbers > 0)
+
+    # The series run on calendar months: a missing year counts as twelve empty months, and
+    # its derived cells are dropped since it has no file to go with
+    year_offsets = years - years[0] if len(years) else years
+    series = series_table(year_offsets[year_index], country, flux, numbers[month], product, values, [int(year_offsets[-1]) + 1 if len(years) else 0, n_countries, n_products, n_flux])
+    loaded = np.isin(series[YEAR_COLUMN], year_offsets)
+    series = {name: column[loaded] for name, column in series.items()}
+    series[YEAR_COLUMN] = np.searchsorted(year_offsets, series[YEAR_COLUMN])
+    series[MONTH_COLUMN] = month_codes[series[MONTH_COLUMN]]
+    return {
+        "balance_countries": split_years(balance_tables(
+            year_index, country, flux, month, product, values,
+            [len(years), n_months, n_countries, n_products, n_flux], flux_codes,
+        ), years),
+        "balance_continents": split_years(balance_tables(
+            year_index, country_continent[country], flux, month, product, values,
+            [len(years), n_months, len(continents), n_products, n_flux], flux_codes, CONTINENT_COLUMN,
+        ), years),
+        "series": split_years(series, years),
+    }
+
+
+def build_derived(
+        output_file_name:str,
+        start:int,
+        end:int,
+        dico_folder:str,
+        output_folder:str,
+        continents_path:str="visualization/src/data/continents",
+    ) -> dict[str, dict[int, dict[str, np.ndarray]]]:
+    """
+    Computes the derived tables from the yearly files and writes one file per table and year.
+
+    Every table of every year is written as derived_<table>_<year>.bin.gz (see columnar_file),
+    keyed by the codes of the dictionaries. derived.json lists the tables and their columns,
+    the years, the continents in the order of their index and the measures, with the flux
+    codes of their exports and imports.
+
+    Args:
+        output_file_name (str): The base name of the yearly files.
+        start (int): The first year.
+        end (int): The last year.
+        dico_folder (str): The folder of the dictionaries.
+        output_folder (str): The folder to write the tables to.
+        continents_path (str): Path to continents.json (without the file extension).
+    Returns:
+        dict: The columns of every year of every table, by table name.
+    """
+    header = compresser.open_json_file(dico_folder+"header")
+    if not isinstance(header, list) or not header:
+        print("Error: no header found, the derived tables need the dictionaries of the pipeline.")
+        return {}
+    dicos = {name: compresser.open_json_file(dico_folder+name) for name in [COUNTRY_COLUMN, FLUX_COLUMN, MONTH_COLUMN, PRODUCT_COLUMN]}
+    continents = compresser.open_json_file(continents_path)
+
+    years_data = load_years(output_file_name, start, end)
+    tables = derived_tables(years_data, header, dicos, continents)
+    for name, years in tables.items():
+        for year, columns in years.items():
+            write_columnar_file(f"{output_folder}{DERIVED_FILE_NAME}_{name}_{year}.bin.gz", list(columns.values()), list(columns), compress=True)
+        print(f"Successfully wrote derived table {name} ({sum(len(columns['VALEUR' if name == 'series' else 'BALANCE']) for columns in years.values())} rows).")
+
+    description = {
+        "years": sorted(years_data),
+        "tables": {name: list(next(iter(years.values()), {})) for name, years in tables.items()},
+        "continents": list(continents),
+        "measures": [
+            {"name": name, "export": export_code, "import": import_code}
+            for (name, _, _), (export_code, import_code) in zip(MEASURES, measure_flux(dicos[FLUX_COLUMN]))
+        ],
+    }
+    compresser.json_output_file(output_folder+DERIVED_FILE_NAME, description)
+    return tables
@@ -0,0 +1,72 @@
+"""
+Compares the size and decoding time of the yearly file formats on existing npz files.
+
+Usage:
+    python benchmarks/bench_encoded.py --data visualization/public/data/data --dico-folder test_result/
+    python benchmarks/bench_encoded.py --sort-key N027_LIB GEOGRAPHIE_MOD N053_LIB N890_LIB
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import compresser as compresser
+from columnar_file import read_columnar_file, write_columnar_file
+from encoded_file import read_encoded_file, write_encoded_file
+
+
+def read_npz(file_path:str) -> np.ndarray:
+    with np.load(file_path) as npz:
+        return npz["data"]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the formats of the yearly files.")
+    parser.add_argument("--data", default="visualization/public/data/data", help="base name of the yearly npz files")
+    parser.add_argument("--dico-folder", default="test_result/", help="folder of header.json")
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    parser.add_argument("--sort-key", nargs="*", help="columns to sort the rows by, every column but the last one by default")
+    args = parser.parse_args()
+
+    header = compresser.open_json_file(args.dico_folder+"header")
+    sizes = {"npz": 0, "bin.gz": 0, "rle": 0, "rle.gz": 0}
+    times = {"npz": 0.0, "bin.gz": 0.0, "rle": 0.0, "rle.gz": 0.0}
+    with tempfile.TemporaryDirectory() as folder:
+        for year in range(args.start, args.end + 1):
+            npz_path = f"{args.data}_{year}.npz"
+            if not os.path.exists(npz_path):
+                continue
+            data, elapsed = timed(read_npz, npz_path)
+            sizes["npz"] += os.path.getsize(npz_path)
+            times["npz"] += elapsed
+            columns = [data[:, i] for i in range(len(header))]
+
+            columnar_path = os.path.join(folder, f"{year}.bin.gz")
+            write_columnar_file(columnar_path, columns, header, compress=True)
+            sizes["bin.gz"] += os.path.getsize(columnar_path)
+            times["bin.gz"] += timed(read_columnar_file, columnar_path)[1]
+
+            sort_key = args.sort_key or header[:-1]
+            order = np.lexsort([data[:, header.index(name)] for name in reversed(sort_key)])
+            for extension in ["rle", "rle.gz"]:
+                encoded_path = os.path.join(folder, f"{year}.{extension}")
+                write_encoded_file(encoded_path, columns, header, sort_key, compress=extension == "rle.gz")
+                decoded, elapsed = timed(read_encoded_file, encoded_path)
+                sizes[extension] += os.path.getsize(encoded_path)
+                times[extension] += elapsed
+                if not np.array_equal(np.column_stack([decoded[name] for name in header]), data[order]):
+                    raise SystemExit(f"The decoded rows of {year} differ from the npz file.")
+
+    print(f"{'format':8} {'size (kB)':>10} {'vs npz':>7} {'decode (ms)':>12}")
+    for extension, size in sizes.items():
+        print(f"{extension:8} {size / 1024:10.0f} {size / sizes['npz']:6.2f}x {times[extension] * 1000:12.1f}")
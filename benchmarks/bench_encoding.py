@@ -0,0 +1,118 @@
+"""
+Compares the dictionary encoding of multiple_indexation_columns with the former row by row encoder.
+
+Usage:
+    python benchmarks/bench_encoding.py --rows 250000
+    python benchmarks/bench_encoding.py --input data/FDS_COMEXTBOIS_2024.csv
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import compresser as compresser
+from table import Table
+
+HEADER = ["ANNREF", "GEOGRAPHIE_MOD", "N027_LIB", "N053_LIB", "N890_LIB", "VALEUR"]
+
+
+def synthetic_year(rows:int, year:int=2024, seed:int=0) -> list[list[str]]:
+    """
+    Generates one year of pruned rows with the cardinalities of the real data.
+    """
+    rng = random.Random(seed)
+    countries = [f"C{i}" for i in range(102)]
+    flux = [f"Flux {i}" for i in range(4)]
+    months = [f"Mois {i}" for i in range(13)]
+    products = [f"Produit {i}" for i in range(149)]
+    return [
+        [str(year), rng.choice(countries), rng.choice(flux), rng.choice(months), rng.choice(products), str(rng.randint(0, 20_000_000))]
+        for _ in range(rows)
+    ]
+
+
+def legacy_encoding(data:list[list[str]], header:list[str], col_multiple:str="ANNREF", max_limit:int=250) -> np.ndarray:
+    """
+    The former encoder of multiple_indexation_columns: a per-cell dict lookup, codes converted
+    to str and parsed back to int32 when writing the npz file.
+    """
+    num_columns = len(data[0])
+    count_colum = []
+    for col_index in range(num_columns):
+        distinct_elements = set()
+        for row in data:
+            distinct_elements.add(row[col_index])
+        count_colum.append(len(distinct_elements))
+    indexes = [col_index for col_index in range(num_columns) if count_colum[col_index] < max_limit]
+    dicos: list[dict[str, int]] = [{} for _ in range(num_columns)]
+    col_multiple_index = header.index(col_multiple)
+
+    new_file = []
+    for row in data:
+        new_row = []
+        for col_index, value in enumerate(row):
+            if col_index != col_multiple_index:
+                if col_index in indexes:
+                    if value not in dicos[col_index-1]:
+                        L = len(dicos[col_index-1])
+                        dicos[col_index-1][value] = L
+                        new_row.append(str(L))
+                    else:
+                        new_row.append(str(dicos[col_index-1][value]))
+                else:
+                    new_row.append(value)
+        new_file.append(new_row)
+    return np.array(new_file, dtype=np.int32)
+
+
+def batch_encoding(data:Table, header:list[str], col_multiple:str="ANNREF", max_limit:int=250) -> np.ndarray:
+    """
+    The encoder used by multiple_indexation_columns, on a table already built.
+    """
+    count_colum = compresser.count_all_columns(data)
+    out_header = [name for name in header if name != col_multiple]
+    indexed = [name for name in out_header if count_colum[header.index(name)] < max_limit]
+    return compresser.encode_columns(data, out_header, indexed)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the dictionary encoding of one year.")
+    parser.add_argument("--rows", type=int, default=250000, help="number of synthetic rows")
+    parser.add_argument("--input", help="a yearly csv file to use instead of synthetic rows")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best one is kept")
+    args = parser.parse_args()
+
+    if args.input:
+        table = compresser.prepare_file(args.input, ["GEOGRAPHIE_LIB", "N027_MOD", "N053_MOD", "N890_MOD"])
+        header = table.header
+        rows = list(table)
+    else:
+        header = HEADER
+        rows = synthetic_year(args.rows)
+    print(f"{len(rows)} rows, header {header}")
+
+    legacy_times, build_times, encode_times = [], [], []
+    for _ in range(args.repeat):
+        legacy, legacy_time = timed(legacy_encoding, rows, header)
+        table, build_time = timed(Table.from_rows, rows, header)
+        batch, encode_time = timed(batch_encoding, table, header)
+        legacy_times.append(legacy_time)
+        build_times.append(build_time)
+        encode_times.append(encode_time)
+        if not np.array_equal(legacy, batch):
+            raise SystemExit("The encoders disagree.")
+
+    legacy_time, build_time, encode_time = min(legacy_times), min(build_times), min(encode_times)
+    print(f"legacy row encoder:   {legacy_time:8.3f} s")
+    print(f"table construction:   {build_time:8.3f} s (factorization at ingest)")
+    print(f"batch encoder:        {encode_time:8.3f} s ({legacy_time / encode_time:.0f}x faster)")
+    print(f"construction + batch: {build_time + encode_time:8.3f} s ({legacy_time / (build_time + encode_time):.1f}x faster)")
@@ -0,0 +1,234 @@
+"""
+Times every stage of the compresser pipeline and of correction.merger on synthetic or real data.
+
+Each stage reports its wall time, the rows it received and returned, the peak resident memory
+of the process during the stage and the Python allocations (peak and net) traced by
+tracemalloc, numpy arrays included. The report is written as JSON and can be compared with
+a previous one, the exit status is 1 when a stage got slower than the threshold.
+
+Usage:
+    python benchmarks/bench_pipeline.py --rows-per-year 250000 --report bench.json
+    python benchmarks/bench_pipeline.py --rows-per-year 250000 --compare bench.json
+    python benchmarks/bench_pipeline.py --data . --start 2012 --end 2025  # the real files in ./data
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import compresser as compresser
+import correction as correction
+from metrics import peak_rss, reset_peak_rss
+from synthetic import density_for_rows, write_synthetic_files
+
+ERASED_COLUMNS = ["GEOGRAPHIE_LIB", "N027_MOD", "N053_MOD", "N890_MOD"]
+MEGABYTE = 1024 * 1024
+
+
+class StageRecorder:
+    """
+    Measures the stages of a run, one record per stage in the order they ran.
+    """
+
+    def __init__(self, trace_allocations:bool=True):
+        self.trace_allocations = trace_allocations
+        self.stages:list[dict] = []
+
+    @contextmanager
+    def stage(self, name:str, rows_in:int|None=None):
+        """
+        Measures the block as the stage name. The block can set record["rows_out"].
+        """
+        record = {"name": name, "rows_in": rows_in, "rows_out": None}
+        peak_reset = reset_peak_rss()
+        if self.trace_allocations:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if self.trace_allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                record["alloc_net_mb"] = current / MEGABYTE
+                record["alloc_peak_mb"] = peak / MEGABYTE
+            record["peak_rss_mb"] = peak_rss() / MEGABYTE
+            record["peak_rss_scope"] = "stage" if peak_reset else "process"
+            self.stages.append(record)
+
+
+def run_pipeline(
+        recorder:StageRecorder,
+        start:int,
+        end:int,
+        output_folder:str,
+        max_limit:int=250,
+        file_extensions:list[str]=["npz"],
+    ) -> None:
+    """
+    Runs the in-memory pipeline of compresser.py stage by stage, from the working directory.
+
+    multiple_indexation_columns is run without output format so that the writing of the
+    yearly files is measured on its own by the output_file stage.
+
+    Args:
+        recorder (StageRecorder): The recorder of the stages.
+        start (int): The first year.
+        end (int): The last year.
+        output_folder (str): The folder of the yearly files and of the dictionaries.
+        max_limit (int): The maximum number of distinct values of an indexed column.
+        file_extensions (list[str]): The formats of the yearly files.
+    """
+    with recorder.stage("open_files") as record:
+        data, header = compresser.open_files("data/FDS_COMEXTBOIS", start, end)
+        record["rows_out"] = len(data)
+
+    with recorder.stage("correcter_N890", len(data)) as record:
+        data = compresser.correcter_N890(data, header)
+        record["rows_out"] = len(data)
+
+    with recorder.stage("erased_specific_column", len(data)) as record:
+        data, header = compresser.erased_specific_column(data, header, ERASED_COLUMNS)
+        record["rows_out"] = len(data)
+
+    with recorder.stage("count_all_columns", len(data)) as record:
+        all_count = compresser.count_all_columns(data)
+
+    with recorder.stage("erased_one_value_column", len(data)) as record:
+        data, header = compresser.erased_one_value_column(data, header, all_count)
+        record["rows_out"] = len(data)
+
+    with recorder.stage("multiple_indexation_columns", len(data)) as record:
+        indexed_data = compresser.multiple_indexation_columns(
+            data, header, output_folder+"data", dico_folder=output_folder, col_multiple="ANNREF", max_limit=max_limit, file_extensions=[],
+        )
+        record["rows_out"] = sum(len(file_data) for file_data in indexed_data)
+
+    year_index = header.index("ANNREF")
+    years = np.unique(data.categories[year_index].astype(np.int64)[data.codes[year_index]])
+    out_header = [name for name in header if name != "ANNREF"]
+    with recorder.stage("output_file", sum(len(file_data) for file_data in indexed_data)) as record:
+        for year, file_data in zip(years, indexed_data):
+            compresser.output_file(output_folder+"data_"+str(year), file_data, out_header, file_extensions=file_extensions)
+
+    with recorder.stage("correction.merger") as record:
+        correction.merger(output_folder+"N890_LIB", "data/LIB_MOD_convert", output_folder+"N890_merged.json")
+
+
+def compare_reports(baseline:dict, current:dict, threshold:float=0.2, min_seconds:float=0.05) -> list[str]:
+    """
+    Prints the stages of two reports side by side and lists the regressions.
+
+    Args:
+        baseline (dict): The reference report.
+        current (dict): The new report.
+        threshold (float): The relative slowdown above which a stage is a regression.
+        min_seconds (float): Stages slower by less than this are never regressions, to ignore noise.
+    Returns:
+        list[str]: The names of the stages that regressed.
+    """
+    baseline_stages = {stage["name"]: stage for stage in baseline["stages"]}
+    regressions = []
+    print(f"{'stage':30} {'baseline s':>11} {'current s':>10} {'ratio':>7} {'alloc MB':>17} {'peak RSS MB':>17}")
+    for stage in current["stages"]:
+        old = baseline_stages.get(stage["name"])
+        if old is None:
+            print(f"{stage['name']:30} {'-':>11} {stage['seconds']:10.3f}")
+            continue
+        ratio = stage["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        alloc = " -> ".join(f"{run['alloc_peak_mb']:7.1f}" if "alloc_peak_mb" in run else f"{'-':>7}" for run in [old, stage])
+        rss = " -> ".join(f"{run['peak_rss_mb']:7.1f}" for run in [old, stage])
+        regressed = ratio > 1 + threshold and stage["seconds"] - old["seconds"] > min_seconds
+        print(f"{stage['name']:30} {old['seconds']:11.3f} {stage['seconds']:10.3f} {ratio:6.2f}x {alloc} {rss}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(stage["name"])
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the stages of the compresser pipeline.")
+    parser.add_argument("--data", help="folder containing the data folder to use instead of synthetic files")
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    parser.add_argument("--rows-per-year", type=int, default=100000, help="approximate number of synthetic rows per year")
+    parser.add_argument("--countries", type=int, default=102, help="number of synthetic countries")
+    parser.add_argument("--products", type=int, default=149, help="number of synthetic products")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", nargs="+", default=["npz"], choices=["npz", "bin", "bin.gz", "npy", "rle", "rle.gz", "chunks"], help="formats of the yearly files")
+    parser.add_argument("--no-allocations", action="store_true", help="do not trace the allocations, tracemalloc slows the Python code down")
+    parser.add_argument("--report", help="path of the JSON report to write")
+    parser.add_argument("--compare", help="a previous JSON report to compare the run with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    work_folder = tempfile.mkdtemp(prefix="bench_pipeline_")
+    if args.data:
+        os.symlink(os.path.abspath(os.path.join(args.data, "data")), os.path.join(work_folder, "data"))
+    else:
+        density = density_for_rows(args.rows_per_year, args.countries, args.products)
+        rows = write_synthetic_files(work_folder, args.start, args.end, args.countries, args.products, density, args.seed)
+        print(f"Generated {rows} synthetic rows in {work_folder}.")
+    output_folder = os.path.join(work_folder, "output") + os.sep
+    os.makedirs(output_folder)
+
+    recorder = StageRecorder(trace_allocations=not args.no_allocations)
+    current_folder = os.getcwd()
+    os.chdir(work_folder)
+    try:
+        run_pipeline(recorder, args.start, args.end, output_folder, file_extensions=args.formats)
+    finally:
+        os.chdir(current_folder)
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "data": args.data or "synthetic",
+            "years": [args.start, args.end],
+            "rows_per_year": None if args.data else args.rows_per_year,
+            "countries": None if args.data else args.countries,
+            "products": None if args.data else args.products,
+            "formats": args.formats,
+            "allocations_traced": not args.no_allocations,
+        },
+        "stages": recorder.stages,
+        "total_seconds": sum(stage["seconds"] for stage in recorder.stages),
+    }
+
+    print()
+    print(f"{'stage':30} {'seconds':>9} {'rows in':>10} {'rows out':>10} {'alloc peak MB':>14} {'peak RSS MB':>12}")
+    for stage in recorder.stages:
+        rows_in = "" if stage["rows_in"] is None else stage["rows_in"]
+        rows_out = "" if stage["rows_out"] is None else stage["rows_out"]
+        alloc = f"{stage['alloc_peak_mb']:14.1f}" if "alloc_peak_mb" in stage else f"{'':14}"
+        print(f"{stage['name']:30} {stage['seconds']:9.3f} {rows_in:>10} {rows_out:>10} {alloc} {stage['peak_rss_mb']:12.1f}")
+    print(f"{'total':30} {report['total_seconds']:9.3f}")
+
+    if args.report:
+        with open(args.report, mode='w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=4)
+        print(f"Report written to {args.report}.")
+
+    if args.compare:
+        with open(args.compare, mode='r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["meta"].get("allocations_traced") != report["meta"]["allocations_traced"]:
+            print("Warning: only one of the runs traced the allocations, the timings are not comparable.")
+        print()
+        regressions = compare_reports(baseline, report, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,76 @@
+"""
+Compares the rows per second of the csv readers and checks that they give the same tables.
+
+Usage:
+    python benchmarks/bench_readers.py --rows-per-year 250000            # synthetic files
+    python benchmarks/bench_readers.py --data . --start 2012 --end 2025  # the real files in ./data
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from readers import ENGINES, read_csv
+from synthetic import density_for_rows, write_synthetic_files
+from table import Table
+
+
+def same_table(first:Table, second:Table) -> bool:
+    return first.header == second.header and all(
+        np.array_equal(first.codes[i], second.codes[i]) and list(first.categories[i]) == list(second.categories[i])
+        for i in range(len(first.header))
+    )
+
+
+def bench_engine(file_names:list[str], engine:str, repeat:int) -> tuple[float, list[Table]]:
+    """
+    Reads every file with an engine, keeping the best time of repeat runs.
+
+    Returns:
+        tuple: The best total time in seconds and the tables of the last run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tables = [read_csv(file_name, ";", engine) for file_name in file_names]
+        best = min(best, time.perf_counter() - start)
+    return best, tables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the csv readers.")
+    parser.add_argument("--data", help="folder containing data/FDS_COMEXTBOIS_<year>.csv, synthetic files if not given")
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    parser.add_argument("--rows-per-year", type=int, default=250000, help="size of the synthetic files")
+    parser.add_argument("--countries", type=int, default=102, help="number of synthetic countries")
+    parser.add_argument("--products", type=int, default=149, help="number of synthetic products")
+    parser.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.data is None:
+            density = density_for_rows(args.rows_per_year, args.countries, args.products)
+            write_synthetic_files(folder, args.start, args.end, args.countries, args.products, density)
+        data_folder = args.data or folder
+        file_names = [os.path.join(data_folder, "data", f"FDS_COMEXTBOIS_{year}.csv") for year in range(args.start, args.end + 1)]
+        file_names = [file_name for file_name in file_names if os.path.exists(file_name)]
+        size = sum(os.path.getsize(file_name) for file_name in file_names)
+
+        reference = None
+        print(f"{'engine':8} {'time (s)':>9} {'rows/s':>12} {'MB/s':>8}  same as {args.engines[0]}")
+        for engine in args.engines:
+            if engine == "pyarrow" and importlib.util.find_spec("pyarrow") is None:
+                print(f"{engine:8} not installed")
+                continue
+            elapsed, tables = bench_engine(file_names, engine, args.repeat)
+            rows = sum(len(table) for table in tables)
+            if reference is None:
+                reference = tables
+            same = all(same_table(table, expected) for table, expected in zip(tables, reference))
+            print(f"{engine:8} {elapsed:9.2f} {rows / elapsed:12,.0f} {size / elapsed / 1024 / 1024:8.1f}  {same}")
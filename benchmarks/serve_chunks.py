@@ -0,0 +1,140 @@
+"""
+Serves the public folder with HTTP Range support, as a static host would, and checks the chunked year files.
+
+Usage:
+    python benchmarks/serve_chunks.py --folder visualization/public --port 8000  # serve only
+    python benchmarks/serve_chunks.py --check --start 2012 --end 2025            # fetch every chunk and compare it with the npz file
+"""
+import argparse
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunked_file import decode_chunk
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    A static file handler answering single "Range: bytes=start-end" requests with 206 responses.
+    """
+    range_length:int|None = None
+
+    def send_head(self):
+        match = RANGE_PATTERN.match(self.headers.get("Range", ""))
+        path = self.translate_path(self.path)
+        if match is None or not os.path.isfile(path):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last) if last else size - 1, size - 1)
+        else:
+            start, end = max(size - int(last or 0), 0), size - 1
+        if start > end:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return None
+
+        input_file = open(path, mode='rb')
+        input_file.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.range_length = end - start + 1
+        return input_file
+
+    def copyfile(self, source, outputfile):
+        if self.range_length is None:
+            return super().copyfile(source, outputfile)
+        outputfile.write(source.read(self.range_length))
+        self.range_length = None
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(folder:str, port:int=0) -> ThreadingHTTPServer:
+    """
+    Starts the server in a background thread.
+
+    Args:
+        folder (str): The folder to serve.
+        port (int): The port, any free port if 0.
+    Returns:
+        ThreadingHTTPServer: The running server, see server_address for its port.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), functools.partial(RangeRequestHandler, directory=folder))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch(url:str, start:int|None=None, length:int|None=None) -> bytes:
+    request = urllib.request.Request(url)
+    if start is not None:
+        request.add_header("Range", f"bytes={start}-{start + length - 1}")
+    with urllib.request.urlopen(request) as response:
+        if start is not None and response.status != 206:
+            raise SystemExit(f"The server ignored the range request on {url}.")
+        return response.read()
+
+
+def check_year(base_url:str, npz_path:str, year:int) -> tuple[int, int]:
+    """
+    Fetches the manifest and every chunk of a year with range requests and compares them with the npz file.
+
+    Returns:
+        tuple: The bytes of the smallest chunk and of the whole chunked file.
+    """
+    manifest = json.loads(fetch(f"{base_url}/data/data_{year}.chunks.json"))
+    with np.load(npz_path) as npz:
+        data = npz["data"]
+    header = manifest["header"]
+    keys = data[:, header.index(manifest["chunk_column"])] if manifest["chunk_column"] else np.zeros(len(data), dtype=np.int64)
+    for chunk in manifest["chunks"]:
+        columns = decode_chunk(fetch(f"{base_url}/data/data_{year}.chunks", chunk["offset"], chunk["length"]))
+        expected = data[keys == chunk["key"]]
+        if not np.array_equal(np.column_stack([columns[name] for name in header]), expected):
+            raise SystemExit(f"Chunk {chunk['key']} of {year} differs from the npz file.")
+    return min(chunk["length"] for chunk in manifest["chunks"]), sum(chunk["length"] for chunk in manifest["chunks"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves the public folder with range requests.")
+    parser.add_argument("--folder", default="visualization/public", help="folder to serve, containing the data folder")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--check", action="store_true", help="check the chunked files against the npz files and exit")
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    args = parser.parse_args()
+
+    if not args.check:
+        print(f"Serving {args.folder} on http://127.0.0.1:{args.port}")
+        ThreadingHTTPServer(("127.0.0.1", args.port), functools.partial(RangeRequestHandler, directory=args.folder)).serve_forever()
+
+    server = start_server(args.folder)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    for year in range(args.start, args.end + 1):
+        npz_path = os.path.join(args.folder, "data", f"data_{year}.npz")
+        if not os.path.exists(npz_path) or not os.path.exists(os.path.join(args.folder, "data", f"data_{year}.chunks.json")):
+            print(f"Missing files of {year}, skipped.")
+            continue
+        smallest, total = check_year(base_url, npz_path, year)
+        print(f"{year}: chunks identical to the npz file, smallest chunk {smallest} bytes of {total}.")
+    server.shutdown()
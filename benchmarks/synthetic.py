@@ -0,0 +1,118 @@
+"""
+Generates COMEXTBOIS-shaped csv files for the benchmarks.
+
+Usage:
+    python benchmarks/synthetic.py --folder /tmp/bench --rows-per-year 250000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+from collections.abc import Iterator
+
+HEADER = ["ANNREF", "GEOGRAPHIE_MOD", "GEOGRAPHIE_LIB", "N027_MOD", "N027_LIB", "N053_MOD", "N053_LIB", "N890_MOD", "N890_LIB", "UNITE", "VALEUR"]
+FLUX = ["Exportation (volume)", "Importation (volume)", "Exportation (valeur)", "Importation (valeur)"]
+MONTHS = ["Total annuel", "Janvier", "Février", "Mars", "Avril", "Mai", "Juin", "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
+
+
+def density_for_rows(rows_per_year:int, countries:int, products:int) -> float:
+    """
+    Returns the share of (country, flux, month, product) cells to fill to get about rows_per_year rows.
+    """
+    return min(1.0, rows_per_year / (countries * len(FLUX) * len(MONTHS) * products))
+
+
+def synthetic_rows(
+        year:int,
+        countries:int=102,
+        products:int=149,
+        density:float=0.4,
+        max_value:int=20_000_000,
+        seed:int=0,
+    ) -> Iterator[list[str]]:
+    """
+    Generates the rows of one year, ordered by country, flux, month and product as the source files.
+
+    Args:
+        year (int): The year of the rows.
+        countries (int): The number of distinct countries.
+        products (int): The number of distinct products.
+        density (float): The share of (country, flux, month, product) cells present.
+        max_value (int): The largest value, values follow a log-uniform distribution.
+        seed (int): The seed of the generator, combined with the year.
+    Yields:
+        list[str]: A row of the csv file.
+    """
+    rng = random.Random(seed * 10000 + year)
+    for country in range(countries):
+        for flux_index, flux in enumerate(FLUX):
+            for month_index, month in enumerate(MONTHS):
+                for product in range(products):
+                    if rng.random() >= density:
+                        continue
+                    value = int(max_value ** rng.random())
+                    yield [
+                        str(year), f"C{country:03d}", f"Pays {country}",
+                        str(flux_index + 1), flux,
+                        f"{month_index:02d}", month,
+                        f"P{product:04d}", f"Produit {product}",
+                        "U", str(value),
+                    ]
+
+
+def write_synthetic_files(
+        folder:str,
+        start:int=2012,
+        end:int=2025,
+        countries:int=102,
+        products:int=149,
+        density:float=0.4,
+        seed:int=0,
+    ) -> int:
+    """
+    Writes data/FDS_COMEXTBOIS_<year>.csv files and the data/LIB_MOD_convert.json correction file.
+
+    One product out of five gets a corrected label, so that correcter_N890 has work to do.
+
+    Args:
+        folder (str): The folder to write the data folder into.
+        start (int): The first year.
+        end (int): The last year.
+        countries (int): The number of distinct countries.
+        products (int): The number of distinct products.
+        density (float): The share of (country, flux, month, product) cells present.
+        seed (int): The seed of the generator.
+    Returns:
+        int: The total number of rows written.
+    """
+    os.makedirs(os.path.join(folder, "data"), exist_ok=True)
+    corrections = {f"P{product:04d}": [f"Produit {product} corrigé"] for product in range(0, products, 5)}
+    with open(os.path.join(folder, "data", "LIB_MOD_convert.json"), mode='w', encoding='utf-8') as output_file:
+        json.dump(corrections, output_file, ensure_ascii=False)
+
+    total_rows = 0
+    for year in range(start, end + 1):
+        with open(os.path.join(folder, "data", f"FDS_COMEXTBOIS_{year}.csv"), mode='w', newline='', encoding='utf-8') as output_file:
+            writer = csv.writer(output_file, delimiter=";")
+            writer.writerow(HEADER)
+            for row in synthetic_rows(year, countries, products, density, seed=seed):
+                writer.writerow(row)
+                total_rows += 1
+    return total_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates synthetic COMEXTBOIS csv files.")
+    parser.add_argument("--folder", default=".", help="folder in which the data folder is created")
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    parser.add_argument("--countries", type=int, default=102)
+    parser.add_argument("--products", type=int, default=149)
+    parser.add_argument("--rows-per-year", type=int, default=250000, help="approximate number of rows per year")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    density = density_for_rows(args.rows_per_year, args.countries, args.products)
+    rows = write_synthetic_files(args.folder, args.start, args.end, args.countries, args.products, density, args.seed)
+    print(f"Wrote {rows} rows in {os.path.join(args.folder, 'data')}.")
@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class FileCache:
+    """
+    A least recently used cache of values loaded from files, bounded by a memory budget.
+
+    An entry is keyed on the path of its file and is reloaded when the modification time
+    or the size of the file changed. The size of an entry is measured once, when it is
+    loaded, see value_size. The cached values are shared by every caller and must not be
+    modified, numpy arrays are made read-only.
+    """
+
+    def __init__(self, max_bytes:int=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries:OrderedDict[str, tuple[tuple[int, int], Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return sum(size for _, _, size in self._entries.values())
+
+    def get(self, file_path:str, loader:Callable[[str], Any]) -> Any:
+        """
+        Returns the value loaded from a file, loading it if it is not cached or out of date.
+
+        Args:
+            file_path (str): Path to the file.
+            loader (Callable): Loads the value from the path.
+        Returns:
+            Any: The cached value.
+        """
+        stat = os.stat(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = os.path.abspath(file_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.invalidations += 1
+            self.misses += 1
+
+        value = loader(file_path)
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        size = value_size(value)
+
+        with self._lock:
+            self._entries[key] = (signature, value, size)
+            self._entries.move_to_end(key)
+            total = self.current_bytes
+            # The entry just added is kept even when it exceeds the budget alone
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                total -= evicted_size
+                self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the counters of the cache.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def value_size(value:Any) -> int:
+    """
+    Returns the memory used by a value: the nbytes of numpy arrays, the sys.getsizeof of the
+    other objects and of everything a dict, list or tuple holds. An object held several times
+    is counted every time, so the size of the parsed JSON files is slightly overestimated.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(value_size(key) + value_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(value_size(item) for item in value)
+    return size
+
+
+# Cache shared by the modules of the pipeline
+shared_cache = FileCache()
+
+
+def configure_cache(max_bytes:int) -> None:
+    """
+    Sets the memory budget of the shared cache, evicting entries if needed on the next load.
+    """
+    shared_cache.max_bytes = max_bytes
+
+
+def cache_stats() -> dict[str, int]:
+    """
+    Returns the counters of the shared cache.
+    """
+    return shared_cache.stats()
+
+
+def _load_json(file_path:str) -> Any:
+    with open(file_path, mode='r', encoding='utf-8') as input_file:
+        return json.load(input_file)
+
+
+def _load_npz_data(file_path:str) -> np.ndarray:
+    with np.load(file_path) as npz:
+        return npz["data"]
+
+
+def cached_json(file_path:str) -> Any:
+    """
+    Returns the content of a JSON file (with its extension) through the shared cache.
+    """
+    return shared_cache.get(file_path, _load_json)
+
+
+def cached_year(file_path:str) -> np.ndarray:
+    """
+    Returns the read-only data of an indexed npz file (with its extension) through the shared cache.
+    """
+    return shared_cache.get(file_path, _load_npz_data)
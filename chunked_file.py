@@ -0,0 +1,87 @@
+import gzip
+import json
+import numpy as np
+from columnar_file import columnar_bytes, parse_columnar
+
+VERSION = 1
+CHUNK_COLUMN = "N053_LIB"
+
+
+def write_chunked_file(
+        output_file_path:str,
+        columns:list[np.ndarray],
+        header:list[str],
+        chunk_column:str=CHUNK_COLUMN,
+    ) -> dict:
+    """
+    Writes the rows split by the values of a column into independently decodable chunks.
+
+    <output_file_path>.chunks holds the chunks one after the other, each one a gzipped
+    columnar file (see columnar_file) with the rows of one value of chunk_column, in their
+    original order. <output_file_path>.chunks.json is the manifest:
+    {"version", "rows", "header", "chunk_column", "chunks": [{"key", "rows", "offset", "length"}]},
+    offset and length giving the bytes of every chunk, so that a client can fetch a single
+    chunk with an HTTP Range request. The whole file is chunked as one chunk if chunk_column
+    is not in the header.
+
+    Args:
+        output_file_path (str): Path to the output files (without the extensions).
+        columns (list[np.ndarray]): The columns to write, all of the same length.
+        header (list[str]): The names of the columns.
+        chunk_column (str): The column whose values define the chunks.
+    Returns:
+        dict: The manifest.
+    """
+    rows = len(columns[0]) if columns else 0
+    if chunk_column in header:
+        keys = np.asarray(columns[header.index(chunk_column)])
+    else:
+        chunk_column = None
+        keys = np.zeros(rows, dtype=np.int64)
+
+    chunks = []
+    offset = 0
+    with open(output_file_path+".chunks", mode='wb') as output_file:
+        for key in np.unique(keys):
+            selected = keys == key
+            content = gzip.compress(columnar_bytes([np.asarray(column)[selected] for column in columns], header), mtime=0)
+            output_file.write(content)
+            chunks.append({"key": key.item(), "rows": int(np.count_nonzero(selected)), "offset": offset, "length": len(content)})
+            offset += len(content)
+
+    manifest = {"version": VERSION, "rows": rows, "header": header, "chunk_column": chunk_column, "chunks": chunks}
+    with open(output_file_path+".chunks.json", mode='w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False)
+    return manifest
+
+
+def decode_chunk(content:bytes) -> dict[str, np.ndarray]:
+    """
+    Decodes the bytes of one chunk.
+
+    Args:
+        content (bytes): The gzipped chunk.
+    Returns:
+        dict: The columns of the chunk by name.
+    """
+    return parse_columnar(np.frombuffer(gzip.decompress(content), dtype=np.uint8), "chunk")
+
+
+def read_chunk(input_file_path:str, chunk:dict) -> dict[str, np.ndarray]:
+    """
+    Reads one chunk of a chunked file, without reading the others.
+
+    Args:
+        input_file_path (str): Path to the files (without the extensions).
+        chunk (dict): The entry of the chunk in the manifest.
+    Returns:
+        dict: The columns of the chunk by name.
+    """
+    with open(input_file_path+".chunks", mode='rb') as input_file:
+        input_file.seek(chunk["offset"])
+        return decode_chunk(input_file.read(chunk["length"]))
+
+
+def read_manifest(input_file_path:str) -> dict:
+    with open(input_file_path+".chunks.json", mode='r', encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
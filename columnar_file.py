@@ -0,0 +1,148 @@
+import gzip
+import io
+import json
+import numpy as np
+
+MAGIC = b"WOOD"
+VERSION = 1
+ALIGNMENT = 8
+
+# dtypes a browser can wrap as a TypedArray view
+INTEGER_DTYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32]
+
+
+def narrowest_dtype(values:np.ndarray) -> np.dtype:
+    """
+    Finds the narrowest dtype able to store the values without loss.
+
+    Integers get the smallest unsigned or signed integer type of up to 32 bits containing
+    their range. Other values, or integers that do not fit in 32 bits, are stored as
+    float32 if that is exact and as float64 otherwise.
+
+    Args:
+        values (np.ndarray): The values of a column.
+    Returns:
+        np.dtype: The dtype to store the column with.
+    """
+    if len(values) == 0:
+        return np.dtype(np.uint8)
+    if np.issubdtype(values.dtype, np.integer) or np.array_equal(values, np.round(values)):
+        minimum = int(values.min())
+        maximum = int(values.max())
+        for dtype in INTEGER_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= minimum and maximum <= info.max:
+                return np.dtype(dtype)
+    if np.array_equal(values.astype(np.float32).astype(values.dtype), values):
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def _aligned(offset:int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def columnar_bytes(columns:list[np.ndarray], header:list[str]) -> bytes:
+    """
+    Serializes columns in the layout of write_columnar_file, uncompressed.
+
+    Args:
+        columns (list[np.ndarray]): The columns to write, all of the same length.
+        header (list[str]): The names of the columns.
+    Returns:
+        bytes: The content of the file.
+    """
+    typed_columns = [np.ascontiguousarray(column, dtype=narrowest_dtype(column).newbyteorder("<")) for column in columns]
+    rows = len(typed_columns[0]) if typed_columns else 0
+
+    # The header size depends on the offsets it contains, grow it until it is stable
+    header_size = 0
+    while True:
+        offset = _aligned(8 + header_size)
+        descriptions = []
+        for name, column in zip(header, typed_columns):
+            descriptions.append({"name": name, "dtype": column.dtype.name, "offset": offset, "length": column.nbytes})
+            offset = _aligned(offset + column.nbytes)
+        json_header = json.dumps({"version": VERSION, "rows": rows, "columns": descriptions}, ensure_ascii=False).encode("utf-8")
+        if _aligned(8 + len(json_header)) - 8 == header_size:
+            break
+        header_size = _aligned(8 + len(json_header)) - 8
+
+    content = io.BytesIO()
+    content.write(MAGIC)
+    content.write(np.uint32(header_size).tobytes())
+    content.write(json_header.ljust(header_size, b" "))
+    for description, column in zip(descriptions, typed_columns):
+        content.write(b"\0" * (description["offset"] - content.tell()))
+        content.write(column.tobytes())
+    return content.getvalue()
+
+
+def parse_columnar(buffer:np.ndarray, name:str="buffer") -> dict[str, np.ndarray]:
+    """
+    Parses the uncompressed content of a columnar file into views over the buffer.
+
+    Args:
+        buffer (np.ndarray): The uint8 content of the file.
+        name (str): The name of the content in the error message.
+    Returns:
+        dict: The columns by name, with their stored dtype.
+    """
+    if bytes(buffer[:4]) != MAGIC:
+        raise ValueError(f"{name} is not a columnar file.")
+    header_size = int(buffer[4:8].view("<u4")[0])
+    description = json.loads(bytes(buffer[8:8 + header_size]).decode("utf-8"))
+    columns = {}
+    for column in description["columns"]:
+        dtype = np.dtype(column["dtype"]).newbyteorder("<")
+        columns[column["name"]] = buffer[column["offset"]:column["offset"] + column["length"]].view(dtype)
+    return columns
+
+
+def write_columnar_file(output_file_path:str, columns:list[np.ndarray], header:list[str], compress:bool=False) -> None:
+    """
+    Writes columns to a binary file readable as zero-copy TypedArray views.
+
+    Layout (little-endian):
+        - 4 bytes: the magic "WOOD".
+        - 4 bytes: uint32 length of the JSON header.
+        - The UTF-8 JSON header, padded with spaces up to a multiple of 8 bytes:
+          {"version", "rows", "columns": [{"name", "dtype", "offset", "length"}]}.
+          offset is the position of the column from the start of the file, length its size in bytes.
+        - The columns one after the other, each starting on a multiple of 8 bytes.
+
+    Every column is stored with its narrowest dtype, see narrowest_dtype. When compressed,
+    the whole file is gzipped (without timestamp, so the output only depends on the data),
+    browsers can inflate it natively with DecompressionStream before wrapping the columns.
+
+    Args:
+        output_file_path (str): Path to the output file (with the extension).
+        columns (list[np.ndarray]): The columns to write, all of the same length.
+        header (list[str]): The names of the columns.
+        compress (bool): Whether to gzip the file.
+    """
+    content = columnar_bytes(columns, header)
+    with open(output_file_path, mode='wb') as output_file:
+        output_file.write(gzip.compress(content, mtime=0) if compress else content)
+
+
+def read_columnar_file(input_file_path:str, mmap:bool=False) -> dict[str, np.ndarray]:
+    """
+    Reads a file written by write_columnar_file.
+
+    Args:
+        input_file_path (str): Path to the file (with the extension).
+        mmap (bool): Whether to memory-map the file instead of reading it, ignored for gzipped files.
+    Returns:
+        dict: The columns by name, with their stored dtype.
+    """
+    with open(input_file_path, mode='rb') as input_file:
+        compressed = input_file.read(2) == b"\x1f\x8b"
+    if compressed:
+        with gzip.open(input_file_path, mode='rb') as input_file:
+            buffer = np.frombuffer(input_file.read(), dtype=np.uint8)
+    elif mmap:
+        buffer = np.memmap(input_file_path, dtype=np.uint8, mode='r')
+    else:
+        buffer = np.fromfile(input_file_path, dtype=np.uint8)
+    return parse_columnar(buffer, input_file_path)
@@ -1,9 +1,31 @@
+import argparse
 import csv
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 import json
-
-
-def open_files(input_file_path:str, start:int|None, end:int|None, delimiter:str=";") -> tuple[list[list[str]], list[str]]:
+import metrics
+import sys
+import zipfile
+from collections.abc import Iterable, Iterator
+from cache import DEFAULT_MAX_BYTES, cached_json, configure_cache
+from chunked_file import write_chunked_file
+from columnar_file import write_columnar_file
+from encoded_file import write_encoded_file
+from profiling import profile_batches
+from readers import ENGINES, prefetch_files, read_csv
+from schema import matrix_dtype
+from store import write_store
+from table import Table, as_table
+from validation import DEFAULT_THRESHOLDS, VALIDATED_COLUMNS, DataValidator
+
+# Files waiting to be written in the background by the streaming build, bounding its memory
+MAX_PENDING_WRITES = 2
+
+# Columns read by correcter_N890
+CORRECTION_COLUMNS = ["N890_LIB", "N890_MOD"]
+
+
+def open_files(input_file_path:str, start:int|None, end:int|None, delimiter:str=";", engine:str="block") -> tuple[Table, list[str]]:
     """
     Opens the input and output files for processing.
 
@@ -12,58 +34,136 @@ def open_files(input_file_path:str, start:int|None, end:int|None, delimiter:str=
         start (int|None): The start value for processing if put.
         end (int|None): The end value for processing if put.
         delimiter (str): The delimiter used in the csv files.
+        engine (str): The csv reader, see readers.read_csv.
     Returns:
-        tuple: the values and the headers
+        tuple: the values as a columnar table and the headers
     """
-    read_files = []
+    read_files:list[Table] = []
     headers = []
-    try: 
-        if start is None or end is None:
-            input_file = open(f"{input_file_path}.csv", mode='r', newline='', encoding='utf-8', errors='ignore')
-            reader = csv.reader(input_file, delimiter=delimiter)
-            headers = next(reader)  # Read header only in headers variable
-            for line in reader:
-                read_files.append(line)
-            input_file.close()
-            print(f"Successfully opened file {input_file_path}.csv.")
-
-        else:
-            for i in range(start, end + 1):
-                input_file = open(f"{input_file_path}_{i}.csv", mode='r', newline='', encoding='utf-8', errors='ignore')
-                reader = csv.reader(input_file, delimiter=delimiter)
-                headers = next(reader)  # Read header only in headers variable
-                for line in reader:
-                    read_files.append(line)
-                input_file.close()
-                print(f"Successfully opened file {input_file_path}_{i}.csv.")
+    if start is None or end is None:
+        file_names = [f"{input_file_path}.csv"]
+    else:
+        file_names = [f"{input_file_path}_{i}.csv" for i in range(start, end + 1)]
+    try:
+        # The next file is read by a background thread while the current one is parsed
+        for file_name, content in prefetch_files(file_names):
+            read_files.append(read_csv(file_name, delimiter, engine, content))
+            print(f"Successfully opened file {file_name}.")
 
     except Exception as e:
+        metrics.error("open_files", e)
         print(f"Error opening files: {e}")
 
-    return read_files, headers
+    if read_files:
+        headers = read_files[-1].header
+    return Table.concat(read_files), headers
+
+def open_header(input_file_path:str, start:int|None, delimiter:str=";") -> list[str]:
+    """
+    Reads only the header line of the first input file.
+
+    Args:
+        input_file_path (str): Path to the csv input file (without the file extension).
+        start (int|None): The first year of the files if put.
+        delimiter (str): The delimiter used in the csv files.
+    Returns:
+        list[str]: The header of the file.
+    """
+    file_name = f"{input_file_path}.csv" if start is None else f"{input_file_path}_{start}.csv"
+    with open(file_name, mode='r', newline='', encoding='utf-8', errors='ignore') as input_file:
+        return next(csv.reader(input_file, delimiter=delimiter))
+
+def stream_files(
+        input_file_path:str,
+        start:int|None,
+        end:int|None,
+        delimiter:str=";",
+        batch_size:int=10000,
+    ) -> Iterator[Table]:
+    """
+    Streams the rows of the input files as fixed-size batches, one file after the other.
+
+    Unlike open_files, only one batch of rows is held in memory at a time. The header
+    of every file is also available with open_header.
+
+    Args:
+        input_file_path (str): Path to the csv input file (without the file extension).
+        start (int|None): The start value for processing if put.
+        end (int|None): The end value for processing if put.
+        delimiter (str): The delimiter used in the csv files.
+        batch_size (int): The maximum number of rows per batch.
+    Yields:
+        Table: A batch of rows. A batch never spans two files.
+    """
+    if start is None or end is None:
+        file_names = [f"{input_file_path}.csv"]
+    else:
+        file_names = [f"{input_file_path}_{i}.csv" for i in range(start, end + 1)]
 
-def open_json_file(input_file_path:str) -> dict:
+    for file_name in file_names:
+        with open(file_name, mode='r', newline='', encoding='utf-8', errors='ignore') as input_file:
+            reader = csv.reader(input_file, delimiter=delimiter)
+            header = next(reader)
+            batch = []
+            for line in reader:
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    yield Table.from_rows(batch, header)
+                    batch = []
+            if batch:
+                yield Table.from_rows(batch, header)
+        print(f"Successfully streamed file {file_name}.")
+
+def open_json_file(input_file_path:str, cache:bool=True, quiet:bool=False) -> dict:
     """
     Opens a JSON file and returns its content as a dictionary.
 
     Args:
         input_file_path (str): Path to the JSON input file (without the file extension).
+        cache (bool): Whether to go through the shared cache (see cache), the content is then
+            shared with the other callers and must not be modified.
+        quiet (bool): Whether to only print the errors, to stderr, for the tools writing their result to stdout.
     Returns:
         dict: The content of the JSON file as a dictionary.
     """
     try:
-        with open(f"{input_file_path}.json", mode='r', encoding='utf-8') as input_file:
-            data = json.load(input_file)
-        print(f"Successfully opened file {input_file_path}.json.")
+        if cache:
+            data = cached_json(f"{input_file_path}.json")
+        else:
+            with open(f"{input_file_path}.json", mode='r', encoding='utf-8') as input_file:
+                data = json.load(input_file)
+        if not quiet:
+            print(f"Successfully opened file {input_file_path}.json.")
         return data
     except Exception as e:
-        print(f"Error opening JSON file: {e}")
+        metrics.error("open_json_file", e)
+        print(f"Error opening JSON file: {e}", file=sys.stderr if quiet else sys.stdout)
         return {}
 
 
+def save_npz(output_file_path:str, **arrays:np.ndarray) -> None:
+    """
+    Writes arrays to a compressed npz file like np.savez_compressed, but with fixed timestamps.
+
+    np.savez_compressed stamps every zip entry with the current time, the same data would
+    give a different file on every build. Here the file only depends on the arrays.
+
+    Args:
+        output_file_path (str): Path to the npz file (with the extension).
+        arrays (np.ndarray): The arrays to write, by name.
+    """
+    with zipfile.ZipFile(output_file_path, mode='w', compression=zipfile.ZIP_DEFLATED) as npz:
+        for name, array in arrays.items():
+            entry = zipfile.ZipInfo(name+".npy", date_time=(1980, 1, 1, 0, 0, 0))
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            entry.external_attr = 0o600 << 16
+            with npz.open(entry, mode='w', force_zip64=True) as npy_file:
+                np.lib.format.write_array(npy_file, np.asanyarray(array), allow_pickle=False)
+
+
 def output_file(
         output_file_path:str,
-        data:list[list[str]],
+        data:list[list[str]]|np.ndarray,
         header:list[str],
         delimiter:str=";",
         file_extensions=["csv", "npz"],
@@ -73,9 +173,16 @@ def output_file(
 
     Args:
         output_file_path (str): Path to the output file (without the extension).
-        data (list): The data to write.
+        data (list|np.ndarray): The data to write, see encode_columns. It is converted once and
+            written with its dtype, int32 unless its values need int64 or float64.
         header (list): The header to write.
-        file_extensions (list): List of file extensions to output (e.g., ["csv", "npz"]).
+        file_extensions (list): List of file extensions to output (e.g., ["csv", "npz", "bin"]).
+            "bin" is the columnar binary format of columnar_file, every column with its narrowest dtype,
+            "bin.gz" the same file gzipped,
+            "npy" a folder of memory-mappable .npy files, one per column (see store),
+            "rle" the rows sorted with run-length, delta and varint encoded columns (see encoded_file),
+            "rle.gz" the same file gzipped,
+            "chunks" one gzipped columnar chunk per month and a manifest of their byte ranges (see chunked_file).
         delimiter (str): The delimiter used in the csv file.
     """
     try:
@@ -84,28 +191,73 @@ def output_file(
                 writer = csv.writer(output_file, delimiter=delimiter)
                 writer.writerow(header)
                 writer.writerows(data)
+
+        if "csv" in file_extensions:
+            metrics.add_bytes("written", metrics.path_size(output_file_path+".csv"))
+        if set(file_extensions) <= {"csv"}:
+            print(f"Successfully wrote to {output_file_path}.")
+            return
+
+        matrix = (data if isinstance(data, np.ndarray) else np.array(data, dtype=np.int64)).reshape(-1, len(header))
+        matrix = matrix.astype(matrix_dtype([matrix.ravel()]), copy=False)
+        columns = [matrix[:, i] for i in range(len(header))]
         
         if "npz" in file_extensions:
-            np.savez_compressed(output_file_path+'.npz', data=np.array(data, dtype=np.int32))
+            save_npz(output_file_path+'.npz', data=matrix)
+
+        for extension in ["bin", "bin.gz"]:
+            if extension in file_extensions:
+                write_columnar_file(output_file_path+'.'+extension, columns, header, compress=extension == "bin.gz")
 
+        if "chunks" in file_extensions:
+            write_chunked_file(output_file_path, columns, header)
+
+        if "npy" in file_extensions:
+            write_store(output_file_path, columns, header)
+
+        for extension in ["rle", "rle.gz"]:
+            if extension in file_extensions:
+                write_encoded_file(output_file_path+'.'+extension, columns, header, compress=extension == "rle.gz")
+
+        metrics.add_bytes("written", sum(metrics.path_size(output_path(output_file_path, extension)) for extension in file_extensions if extension != "csv"))
         print(f"Successfully wrote to {output_file_path}.")
     except Exception as e:
+        metrics.error("output_file", e)
         print(f"Error writing to file: {e}")
 
 
-def json_output_file(output_file_path:str, data:dict) -> None:
+def output_path(output_file_path:str, extension:str) -> str:
+    """
+    Returns the path written by output_file for one format.
+
+    Args:
+        output_file_path (str): Path to the output file (without the extension).
+        extension (str): The format, see output_file.
+    Returns:
+        str: The path of the file, or of the folder for the npy store.
+    """
+    return output_file_path if extension == "npy" else output_file_path+"."+extension
+
+
+def json_output_file(output_file_path:str, data:dict, compact:bool=False) -> None:
     """
     Outputs the processed data to a specified JSON file.
 
     Args:
         output_file_path (str): Path to the output file (without the extension).
         data (list): The data to write.
+        compact (bool): Whether to write the JSON without indentation nor spaces, for the files fetched by the charts.
     """
     try:
         with open(output_file_path+".json", mode='w', encoding='utf-8') as output_file:
-            json.dump(data, output_file, ensure_ascii=False, indent=4)
+            if compact:
+                json.dump(data, output_file, ensure_ascii=False, separators=(",", ":"))
+            else:
+                json.dump(data, output_file, ensure_ascii=False, indent=4)
+        metrics.add_bytes("written", metrics.path_size(output_file_path+".json"))
         print(f"Successfully wrote to {output_file_path}.")
     except Exception as e:
+        metrics.error("json_output_file", e)
         print(f"Error writing to file: {e}")
 
 def json_list_output_file(output_file_path:str, data:list) -> None:
@@ -119,8 +271,10 @@ def json_list_output_file(output_file_path:str, data:list) -> None:
     try:
         with open(output_file_path+".json", mode='w', encoding='utf-8') as output_file:
             json.dump(data, output_file, ensure_ascii=False, indent=4)
+        metrics.add_bytes("written", metrics.path_size(output_file_path+".json"))
         print(f"Successfully wrote to {output_file_path}.")
     except Exception as e:
+        metrics.error("json_list_output_file", e)
         print(f"Error writing to file: {e}")
 
 
@@ -139,169 +293,169 @@ def revert_dict(dico:dict) -> dict:
     return revert_dico
 
 
-def count_distinct_elements(data:list[list[str]], column_index:int) -> tuple[set, int]:
+def count_distinct_elements(data:Table, column_index:int) -> tuple[set, int]:
     """
     Counts distinct elements in a specified column of the data.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         column_index (int): The index of the column to count distinct elements from.
 
     Returns:
         tuple: A set of distinct elements and their count.
     """
-    distinct_elements = set()
-    for row in data:
-        if len(row) > column_index:
-            distinct_elements.add(row[column_index])
+    distinct_elements = set(data.categories[column_index])
     return distinct_elements, len(distinct_elements)
 
-def count_all_columns(data:list[list[str]])->list[int]:
+def count_all_columns(data:Table)->list[int]:
     """
     Counts occurrences of elements in all columns of the data.
 
+    The counts come from the profile of the table, which is computed once and shared by
+    the later stages.
+
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
     Returns:
         list: A list with counts of distinct elements for each column.
     """
-    if not data:
+    if not len(data):
         return []
 
-    count_columns = []
-
-    for col_index in range(len(data[0])):
-        count_columns.append(count_distinct_elements(data, col_index)[1])
+    return [column_profile.distinct_count for column_profile in data.profile()]
 
-    return count_columns
-
-def count_element_in_column(data:list[list[str]], column_index:int, element:str)->int:
+def count_element_in_column(data:Table, column_index:int, element:str)->int:
     """
     Counts occurrences of a specific element in a specified column of the data.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         column_index (int): The index of the column to search.
         element (str): The element to count.
     Returns:
         int: The count of occurrences of the element.
     """
-    count = 0
-    for row in data:
-        if len(row) > column_index and row[column_index] == element:
-            count += 1
-    return count
+    matches = np.flatnonzero(data.categories[column_index] == element)
+    if len(matches) == 0:
+        return 0
+    return int(np.count_nonzero(data.codes[column_index] == matches[0]))
 
-def erased_specific_column(data:list[list[str]], header:list[str], column_value:str|list[str])->tuple[list[list[str]], list[str]]:
+def erased_specific_column(data:Table, header:list[str], column_value:str|list[str])->tuple[Table, list[str]]:
     """
     Erases a specified column.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
+        header (list[str]): The header of the data.
         column_value (str|list[str]): The column name(s) to erase.
 
     Returns:
-        list: The modified data with rows containing the value removed.
+        tuple: The data without the column(s) and the new header.
     """
-    column_indexes:list[int] = []
-    if isinstance(column_value, str):
-        column_index = header.index(column_value)
-        column_indexes.append(column_index)
-    else:
-        for col_value in column_value:
-            column_index = header.index(col_value)
-            column_indexes.append(column_index)
-
-    new_data = []
-    for element in data:
-        sub_element = []
-        for i, value in enumerate(element):
-            if i not in column_indexes:
-                sub_element.append(value)
-        new_data.append(sub_element)
-
-    new_header = []
-    for i, hd in enumerate(header):
-        if i not in column_indexes:
-            new_header.append(hd)
-    return new_data, new_header
-
-def erased_one_value_column(data:list[list[str]], header:list[str], column_indexes:list[int])->tuple[list[list[str]], list[str]]:
+    data = as_table(data, header)
+    column_values = [column_value] if isinstance(column_value, str) else column_value
+    column_indexes = [header.index(col_value) for col_value in column_values]
+
+    new_data = data.drop(column_indexes)
+    return new_data, new_data.header
+
+def erased_one_value_column(data:Table, header:list[str], column_indexes:list[int])->tuple[Table, list[str]]:
     """
     Erases columns with distinct elements less than or equal to 1.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         header (list[str]): The header of the data.
         column_indexes (list[int]): The list of distinct element counts for each column.
 
     Returns:
-        list: The modified data with rows containing the value removed.
-    """
-    new_data = []
-    for element in data:
-        sub_element = []
-        for i, value in enumerate(element):
-            if column_indexes[i] > 1:
-                sub_element.append(value)
-        new_data.append(sub_element)
-
-    new_header = []
-    for i, hd in enumerate(header):
-        if column_indexes[i] > 1:
-            new_header.append(hd)
-    
-    return new_data, new_header
+        tuple: The data without the constant columns and the new header.
+    """
+    data = as_table(data, header)
+    new_data = data.select([i for i in range(len(header)) if column_indexes[i] > 1])
+    return new_data, new_data.header
+
+def encode_columns(
+        data:Table,
+        columns:list[str],
+        indexed:list[str],
+        dicos:dict[str, dict[str, int]]|None=None,
+    ) -> np.ndarray:
+    """
+    Encodes columns of a table into a numeric matrix, with one vectorized lookup per column.
+
+    Indexed columns are replaced by dictionary codes: the codes of the table itself (in order
+    of first appearance) when no dictionaries are given, otherwise the codes of dicos[name],
+    to which new values are appended. Other columns are parsed as numbers, once per distinct
+    value (see Table.numbers). Columns and dictionaries are always matched by name, never by position.
+
+    Args:
+        data (Table): The data to encode.
+        columns (list[str]): The names of the columns to encode, in output order.
+        indexed (list[str]): The names of the columns to replace by dictionary codes.
+        dicos (dict|None): The value to code dictionary of every indexed column, updated in place.
+    Returns:
+        np.ndarray: The encoded data, one row per input row, int32 unless the values need
+            int64 or float64 (see schema.matrix_dtype).
+    """
+    lookups = []
+    for name in columns:
+        col_index = data.header.index(name)
+        if name not in indexed:
+            lut = data.numbers(col_index)
+            if np.issubdtype(lut.dtype, np.floating) and np.isnan(lut).any():
+                raise ValueError(f"Column {name} has values that are not numbers: {list(data.categories[col_index][np.isnan(lut)][:5])}")
+        elif dicos is None:
+            lut = None
+        else:
+            dico = dicos.setdefault(name, {})
+            lut = np.array([dico.setdefault(value, len(dico)) for value in data.categories[col_index]], dtype=np.int64)
+        lookups.append(lut if lut is not None else np.arange(len(data.categories[col_index])))
+
+    encoded = np.empty((len(data), len(columns)), dtype=matrix_dtype(lookups))
+    for out_index, (name, lut) in enumerate(zip(columns, lookups)):
+        col_index = data.header.index(name)
+        encoded[:, out_index] = lut[data.codes[col_index]]
+    return encoded
+
+def _dictionary(categories:np.ndarray) -> dict[int, str]:
+    """
+    Returns the code to value dictionary of a column, as exported in the JSON files.
+    """
+    return {code: value for code, value in enumerate(categories)}
 
 def indexation_columns(
-        data:list[list[str]],
+        data:Table,
         header:list[str],
         output_file_name:str,
         dico_folder:str="",
         max_limit=250,
-    )->list[list[str]]:
+    )->np.ndarray:
     """
     Indexes columns with distinct elements exceeding a maximum limit.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         header (list): The header of the data.
         output_file_name (str): The base name for output files.
         max_limit (int): The maximum limit for distinct elements.
 
     Returns:
-        list: The modified data with indexed columns.
+        np.ndarray: The indexed data, one row per input row (see encode_columns).
     """
-    if not data:
-        return data
+    data = as_table(data, header)
+    if not len(data):
+        return np.empty((0, len(header)), dtype=np.int32)
 
-    num_columns = len(data[0])
     count_colum = count_all_columns(data)
-    indexes = [col_index for col_index in range(num_columns) if count_colum[col_index] < max_limit]
-    dicos: list[dict[str, int]] = [{} for _ in range(num_columns)]
-
-    indexed_data = []
-    for row in data:
-        new_row = []
-        for col_index, value in enumerate(row):
-            if col_index in indexes:
-                if value not in dicos[col_index]:
-                    L = len(dicos[col_index])
-                    dicos[col_index][value] = L
-                    new_row.append(str(L))
-                else:
-                    new_row.append(str(dicos[col_index][value]))
-            else:
-                new_row.append(value)
-        indexed_data.append(new_row)
+    indexes = [col_index for col_index in range(len(header)) if count_colum[col_index] < max_limit]
+    indexed_data = encode_columns(data, header, [header[i] for i in indexes])
 
     json_list_output_file(dico_folder+"header", header)
-    for i, dico in enumerate(dicos):
-        if len(dico) > 0:
-            revert_dico = revert_dict(dico)
-            output_file_name_dico = header[i]
-            json_output_file(output_file_name_dico, revert_dico)
-            print(f"Output dictionary for column {i} to {output_file_name_dico}.json")
+    for i in indexes:
+        output_file_name_dico = header[i]
+        json_output_file(output_file_name_dico, _dictionary(data.categories[i]))
+        print(f"Output dictionary for column {i} to {output_file_name_dico}.json")
 
     output_file(output_file_name, indexed_data, header)
     return indexed_data
@@ -309,226 +463,690 @@ def indexation_columns(
 
 
 def multiple_indexation_columns(
-        data:list[list[str]],
+        data:Table,
         header:list[str],
         output_file_name:str,
         dico_folder:str="",
         col_multiple:str = "ANNREF",
         export_dico:bool=True,
         max_limit=250,
-    )->list[list[list[str]]]:
+        executor:Executor|None=None,
+        file_extensions:list[str]=["npz"],
+    )->list[np.ndarray]:
     """
     Indexes columns with distinct elements exceeding a maximum limit.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         header (list): The header of the data.
         output_file_name (str): The base name for output files.
         dico_folder (str): The folder to save dictionaries.
         col_multiple (str): The column name used for multiple indexing.
         max_limit (int): The maximum limit for distinct elements.
+        executor (Executor|None): If given, the indexed files and the dictionaries are compressed and
+            written by this executor, a thread pool for instance (zlib releases the GIL). The
+            function returns once every file is written, the files are the same as without it.
+        file_extensions (list): The formats of the indexed files, see output_file.
 
     Returns:
-        list: The modified data with indexed columns.
+        list: The indexed data, one matrix per value of col_multiple (see encode_columns).
     """
-    if not data:
-        return [data]
+    data = as_table(data, header)
+    if not len(data):
+        return []
 
     # Initialisation des valeurs
-    num_columns = len(data[0])
     count_colum = count_all_columns(data)
-    indexes = [col_index for col_index in range(num_columns) if count_colum[col_index] < max_limit]
-    dicos: list[dict[str, int]] = [{} for _ in range(num_columns)]
-
-    iter = 0
     col_multiple_index = header.index(col_multiple)
-    first_file_number = int(data[0][col_multiple_index])
-    file_number = int(data[0][col_multiple_index])
-
-    indexed_data:list[list[list[str]]] = []
-    new_file:list[list[str]] = []
-    while iter < len(data):
-        new_row = []
-        row = data[iter]
+    out_indexes = [col_index for col_index in range(len(header)) if col_index != col_multiple_index]
+    indexes = [col_index for col_index in out_indexes if count_colum[col_index] < max_limit]
 
-        # Check if we need to start a new file
-        first_value = int(row[0])
-        if first_value != file_number:
-            indexed_data.append(new_file)
-            new_file = []
-            file_number += 1
-
-        for col_index, value in enumerate(row):
-            # Skip the multiple index column
-            if col_index != col_multiple_index:
-                if col_index in indexes:
-                    if value not in dicos[col_index-1]:
-                        L = len(dicos[col_index-1])
-                        dicos[col_index-1][value] = L
-                        new_row.append(str(L))
-                    else:
-                        new_row.append(str(dicos[col_index-1][value]))
-                else:
-                    new_row.append(value)
-        new_file.append(new_row)
-        iter += 1
-    indexed_data.append(new_file)
+    out_header = [header[col_index] for col_index in out_indexes]
+    encoded = encode_columns(data, out_header, [header[col_index] for col_index in indexes])
+    file_numbers = data.categories[col_multiple_index].astype(np.int64)[data.codes[col_multiple_index]]
 
     # Output dictionaries
-    header = header[:col_multiple_index] + header[col_multiple_index+1:]
-    json_list_output_file(dico_folder+"header", header)
+    pending_writes:list[Future] = []
+
+    def write(function, *args) -> None:
+        if executor is None:
+            function(*args)
+        elif isinstance(executor, ProcessPoolExecutor):
+            # The bytes and errors of the worker processes are counted by this one
+            pending_writes.append(executor.submit(metrics.run_measured, function, *args))
+        else:
+            pending_writes.append(executor.submit(function, *args))
+
+    write(json_list_output_file, dico_folder+"header", out_header)
 
     if export_dico:
-        for i, dico in enumerate(dicos):
-            if len(dico) > 0:
-                revert_dico = revert_dict(dico)
-                output_file_name_dico = header[i]
-                json_output_file(dico_folder+output_file_name_dico, revert_dico)
-                print(f"Output dictionary for column {i} to {output_file_name_dico}.json")
+        for col_index in indexes:
+            output_file_name_dico = header[col_index]
+            write(json_output_file, dico_folder+output_file_name_dico, _dictionary(data.categories[col_index]))
+            print(f"Output dictionary for column {out_header.index(output_file_name_dico)} to {output_file_name_dico}.json")
 
     # Output indexed files
-    for index, file_data in enumerate(indexed_data):
-        output_file(output_file_name+"_"+str(first_file_number+index), file_data, header, file_extensions=["npz"])
+    indexed_data:list[np.ndarray] = []
+    for file_number in np.unique(file_numbers):
+        file_data = encoded[file_numbers == file_number]
+        write(output_file, output_file_name+"_"+str(file_number), file_data, out_header, ";", file_extensions)
+        indexed_data.append(file_data)
+    for pending_write in pending_writes:
+        if isinstance(executor, ProcessPoolExecutor):
+            metrics.collect(pending_write.result())
+        else:
+            pending_write.result()
     return indexed_data
 
-def count_distinct_tuples(data:list[list[str]], header:list[str], column_names:list[str]) -> tuple[set, int]:
+def count_distinct_tuples(data:Table, header:list[str], column_names:list[str]) -> tuple[set, int]:
     """
     Counts distinct tuples of values across specified columns.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         header (list[str]): The header of the data.
         column_names (list[str]): The list of column names to consider for tuple counting.
 
     Returns:
         tuple: A set of distinct tuples and their count.
     """
-    distinct_tuples = set()
+    data = as_table(data, header)
     column_indexes = [header.index(col_name) for col_name in column_names]
-    for row in data:
-        if all(len(row) > col_index for col_index in column_indexes):
-            tuple_values = tuple(row[col_index] for col_index in column_indexes)
-            distinct_tuples.add(tuple_values)
+    if not len(data):
+        return set(), 0
+    distinct_codes = np.unique(np.column_stack([data.codes[col_index] for col_index in column_indexes]), axis=0)
+    distinct_tuples = {
+        tuple(data.categories[col_index][code] for col_index, code in zip(column_indexes, codes))
+        for codes in distinct_codes
+    }
     return distinct_tuples, len(distinct_tuples)
 
-def is_similar_columns(data:list[list[str]], header:list[str], column_index1:int, column_index2:int) -> bool:
+def is_similar_columns(data:Table, header:list[str], column_index1:int, column_index2:int) -> bool:
     """
-    Determines if two columns are similar based on the proportion of matching values.
+    Determines if every value of the first column always maps to the same value of the second column.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         header (list[str]): The header of the data.
         column_index1 (int): The index of the first column to compare.
         column_index2 (int): The index of the second column to compare.
-        threshold (float): The similarity threshold (between 0 and 1).
 
     Returns:
         bool: True if the columns are similar, False otherwise.
     """
-    if not data:
+    data = as_table(data, header)
+    if not len(data):
         return False
 
-    matching_dico: dict[str, str] = {}
-    for row in data:
-        if len(row) > max(column_index1, column_index2):
-            value1 = row[column_index1]
-            value2 = row[column_index2]
-            if matching_dico.get(value1) is not None and matching_dico[value1] != value2:
-                print(f"Mismatch found: {value1} maps to both {matching_dico[value1]} and {value2}")
-                return False  # Found a mismatch for the same value in column 1
-            matching_dico[value1] = value2
+    pairs = np.unique(np.column_stack([data.codes[column_index1], data.codes[column_index2]]), axis=0)
+    mismatches = np.flatnonzero(pairs[1:, 0] == pairs[:-1, 0])
+    if len(mismatches) > 0:
+        code1, code2 = pairs[mismatches[0]]
+        other_code2 = pairs[mismatches[0] + 1][1]
+        value1 = data.categories[column_index1][code1]
+        print(f"Mismatch found: {value1} maps to both {data.categories[column_index2][code2]} and {data.categories[column_index2][other_code2]}")
+        return False  # Found a mismatch for the same value in column 1
 
     return True  # All values in column 1 map to the same value in column 2
 
-def correcter_N890(data:list[list[str]], header:list[str]) -> list[list[str]]:
+def correcter_N890(data:Table, header:list[str], dico_N890:dict|None=None) -> Table:
     """
-    Corrects values in the N890_MOD column based on a provided dictionary.
+    Corrects values in the N890_LIB column from the N890_MOD column based on a provided dictionary.
 
     Args:
-        data (list): The data to process.
+        data (Table): The data to process.
         header (list[str]): The header of the data.
-        dico_N890 (dict): A dictionary mapping incorrect values to correct values for the N890_MOD column.
+        dico_N890 (dict|None): A dictionary mapping N890_MOD values to their correct N890_LIB values.
+            Loaded from data/LIB_MOD_convert.json if not given.
 
     Returns:
-        list: The modified data with corrected values in the N890_MOD column.
+        Table: The data with corrected values in the N890_LIB column.
     """
-    dico_N890 = json.load(open("data/LIB_MOD_convert.json", mode='r', encoding='utf-8'))
-    
-    col_index_source = header.index("N890_MOD")
-    col_index_modify = header.index("N890_LIB")
-    if col_index_source == -1 or col_index_modify == -1:
+    if dico_N890 is None:
+        dico_N890 = cached_json("data/LIB_MOD_convert.json")
+    data = as_table(data, header)
+
+    if "N890_MOD" not in header or "N890_LIB" not in header:
         print("Error: N890_MOD or N890_LIB column not found in header.")
         return data
-    
-    for row in data:
-        if len(row) > max(col_index_modify, col_index_source) and row[col_index_source] in dico_N890:
-            row[col_index_modify] = dico_N890[row[col_index_source]][0]  # Assuming we want the first correct value
+    col_index_source = header.index("N890_MOD")
+    col_index_modify = header.index("N890_LIB")
+
+    # Codes of the corrected labels, appended after the existing labels
+    lookup = {value: code for code, value in enumerate(data.categories[col_index_modify])}
+    source_lut = np.full(len(data.categories[col_index_source]), -1, dtype=np.int32)
+    for source_code, source_value in enumerate(data.categories[col_index_source]):
+        if source_value in dico_N890:
+            source_lut[source_code] = lookup.setdefault(dico_N890[source_value][0], len(lookup))  # Assuming we want the first correct value
+
+    corrected = source_lut[data.codes[col_index_source]]
+    codes = np.where(corrected >= 0, corrected, data.codes[col_index_modify])
+    categories = np.empty(len(lookup), dtype=object)
+    categories[:] = list(lookup)
+    return data.with_column(col_index_modify, codes, categories)
+
+def prepare_file(
+        file_name:str,
+        erased_columns:list[str],
+        dico_N890:dict|None=None,
+        delimiter:str=";",
+        engine:str="block",
+        content:bytes|None=None,
+    ) -> Table:
+    """
+    Reads one csv file, corrects its N890_LIB column and erases the given columns.
+
+    The stages that only need one file at a time, used by the parallel and incremental builds.
+    The erased columns that the correction does not read are never decoded.
+
+    Args:
+        file_name (str): Path to the csv file.
+        erased_columns (list[str]): The column names to erase.
+        dico_N890 (dict|None): The N890 correction dictionary, loaded if not given.
+        delimiter (str): The delimiter used in the csv file.
+        engine (str): The csv reader, see readers.read_csv.
+        content (bytes|None): The content of the file if already read, see readers.prefetch_files.
+    Returns:
+        Table: The corrected and pruned data of the file.
+    """
+    skipped_columns = [name for name in erased_columns if name not in CORRECTION_COLUMNS]
+    with metrics.span("prepare_file", file=file_name) as record:
+        data = read_csv(file_name, delimiter, engine, content, skipped_columns)
+        data = correcter_N890(data, data.header, dico_N890)
+        data, _ = erased_specific_column(data, data.header, [name for name in erased_columns if name not in skipped_columns])
+        record["rows_out"] = len(data)
     return data
 
+def prepare_validated_file(
+        file_name:str,
+        erased_columns:list[str],
+        dico_N890:dict|None=None,
+        delimiter:str=";",
+        engine:str="block",
+        content:bytes|None=None,
+    ) -> tuple[Table, DataValidator]:
+    """
+    Same as prepare_file, also checking the corrected rows before the columns are erased.
 
+    Returns:
+        tuple: The corrected and pruned data of the file and the validator of its rows, to merge with the other files.
+    """
+    skipped_columns = [name for name in erased_columns if name not in CORRECTION_COLUMNS + VALIDATED_COLUMNS]
+    with metrics.span("prepare_file", file=file_name) as record:
+        data = read_csv(file_name, delimiter, engine, content, skipped_columns)
+        data = correcter_N890(data, data.header, dico_N890)
+        validator = DataValidator()
+        validator.update(data)
+        data, _ = erased_specific_column(data, data.header, [name for name in erased_columns if name not in skipped_columns])
+        record["rows_out"] = len(data)
+    return data, validator
+
+
+def stream_correcter_N890(batches:Iterable[Table], header:list[str]) -> Iterator[Table]:
+    """
+    Streaming version of correcter_N890, the dictionary is only loaded once.
 
-if __name__ == "__main__":
-    input_path = "data/FDS_COMEXTBOIS"
-    output_folder_data = "visualization/public/data/"
-    output_folder_dico = "test_result/"
-    start_year = 2012
-    end_year = 2025
+    Args:
+        batches (Iterable[Table]): The batches of rows to process.
+        header (list[str]): The header of the data.
+    Yields:
+        Table: The batches with corrected values in the N890_LIB column.
+    """
+    dico_N890 = cached_json("data/LIB_MOD_convert.json")
+    for batch in batches:
+        yield correcter_N890(batch, header, dico_N890)
+
+def stream_validate(batches:Iterable[Table], validator:DataValidator) -> Iterator[Table]:
+    """
+    Adds every batch to the checks of a validator and yields it unchanged.
+    """
+    for batch in batches:
+        validator.update(batch)
+        yield batch
 
-    data, header = open_files(input_path, start_year, end_year)
-    print(data[0], header)
+def _project_batches(batches:Iterable[Table], kept_indexes:list[int]) -> Iterator[Table]:
+    for batch in batches:
+        yield batch.select(kept_indexes)
 
+def stream_erased_specific_column(
+        batches:Iterable[Table],
+        header:list[str],
+        column_value:str|list[str],
+    ) -> tuple[Iterator[Table], list[str]]:
     """
-    distinct_elements, distinct_count = count_distinct_elements(data, 2)
-    print(f"Distinct elements in column 2: {distinct_elements} in total {distinct_count}")
-    specific_count = count_element_in_column(data, 0, "NOM")
-    print(f"Occurrences of 'NOM' in column 0: {specific_count}")
+    Streaming version of erased_specific_column.
 
-    similar_columns = [["N027_LIB", "N027_MOD"], ["N053_LIB", "N053_MOD"], ["N890_LIB", "N890_MOD"]]
-    for col1, col2 in similar_columns:
-        col_index1 = header.index(col1)
-        col_index2 = header.index(col2)
-        if is_similar_columns(data, header, col_index1, col_index2):
-            print(f"Columns {col1} and {col2} are similar.")
-        else:
-            print(f"Columns {col1} and {col2} are not similar.")
+    Args:
+        batches (Iterable[Table]): The batches of rows to process.
+        header (list[str]): The header of the data.
+        column_value (str|list[str]): The column name(s) to erase.
 
-    distinct_tuple = count_distinct_tuples(new_data, header, ["N890_LIB", "N890_MOD"])
-    print(f"Distinct tuples for columns 'N053_N890_LIBLIB' and 'N890_MOD': {distinct_tuple[0]} in total {distinct_tuple[1]}")
+    Returns:
+        tuple: The lazily projected batches and the new header.
+    """
+    column_values = [column_value] if isinstance(column_value, str) else column_value
+    column_indexes = [header.index(col_value) for col_value in column_values]
+    kept_indexes = [i for i in range(len(header)) if i not in column_indexes]
+    return _project_batches(batches, kept_indexes), [header[i] for i in kept_indexes]
 
-    new_data = correcter_N890(data, header)
-    print(f"Data after correction: {new_data[0:500]}, Header: {header}")
+def stream_count_all_columns(batches:Iterable[Table], max_limit:int|None=None) -> list[int]:
+    """
+    Streaming version of count_all_columns, the batches are consumed in one pass.
 
-    similar_columns = [["N027_LIB", "N027_MOD"], ["N053_LIB", "N053_MOD"], ["N890_LIB", "N890_MOD"]]
-    for col1, col2 in similar_columns:
-        col_index1 = header.index(col1)
-        col_index2 = header.index(col2)
-        if is_similar_columns(new_data, header, col_index1, col_index2):
-            print(f"Columns {col1} and {col2} are similar.")
-        else:
-            print(f"Columns {col1} and {col2} are not similar.")
+    When max_limit is given, a column stops collecting values once it reaches max_limit
+    distinct elements and its count is estimated with a HyperLogLog sketch instead, so that
+    memory stays bounded on high cardinality columns. Such a count is never below max_limit.
 
-    
-    distinct_tuple = count_distinct_tuples(new_data, header, ["N890_LIB", "N890_MOD"])
-    print(f"Distinct tuples for columns 'N053_N890_LIBLIB' and 'N890_MOD': {distinct_tuple[0]} in total {distinct_tuple[1]}")
+    Args:
+        batches (Iterable[Table]): The batches of rows to process.
+        max_limit (int|None): The count at which a column stops being tracked exactly.
+    Returns:
+        list: A list with counts of distinct elements for each column.
     """
+    return [column_profile.distinct_count for column_profile in profile_batches(batches, exact_limit=max_limit)]
 
-    new_data = correcter_N890(data, header)
-    print(f"Data after correction: {new_data[0:500]}, Header: {header}")
+def stream_erased_one_value_column(
+        batches:Iterable[Table],
+        header:list[str],
+        column_indexes:list[int],
+    ) -> tuple[Iterator[Table], list[str]]:
+    """
+    Streaming version of erased_one_value_column.
 
-    new_data, new_header = erased_specific_column(new_data, header, ["GEOGRAPHIE_LIB", "N027_MOD", "N053_MOD", "N890_MOD"])
-    print(f"Data after erasing column 3: {new_data[0]}, New Header: {new_header}")
+    Args:
+        batches (Iterable[Table]): The batches of rows to process.
+        header (list[str]): The header of the data.
+        column_indexes (list[int]): The list of distinct element counts for each column.
 
-    all_count = count_all_columns(new_data)
-    print(f"Distinct counts for all columns: {all_count}")
+    Returns:
+        tuple: The lazily projected batches and the new header.
+    """
+    kept_indexes = [i for i in range(len(header)) if column_indexes[i] > 1]
+    return _project_batches(batches, kept_indexes), [header[i] for i in kept_indexes]
 
-    new_data, new_header = erased_one_value_column(new_data, new_header, all_count)
-    print(f"Data after erasing values in columns with <=1 distinct elements: {new_data[0]}, New Header: {new_header}")
+def stream_multiple_indexation_columns(
+        batches:Iterable[Table],
+        header:list[str],
+        count_colum:list[int],
+        output_file_name:str,
+        dico_folder:str="",
+        col_multiple:str = "ANNREF",
+        export_dico:bool=True,
+        max_limit=250,
+        file_extensions:list[str]=["npz"],
+        executor:Executor|None=None,
+    )->list[int]:
+    """
+    Streaming version of multiple_indexation_columns.
+
+    The rows must be grouped by col_multiple, as they are when streaming the yearly files
+    in order. Only the encoded rows of the current file are kept in memory, the file
+    is written as soon as the next one starts. With an executor, the file is written in the
+    background while the next one is encoded, at most MAX_PENDING_WRITES files waiting.
+
+    Args:
+        batches (Iterable[Table]): The batches of rows to process.
+        header (list): The header of the data.
+        count_colum (list[int]): The distinct element counts for each column, see stream_count_all_columns.
+        output_file_name (str): The base name for output files.
+        dico_folder (str): The folder to save dictionaries.
+        col_multiple (str): The column name used for multiple indexing.
+        export_dico (bool): Whether to output the dictionaries.
+        max_limit (int): The maximum limit for distinct elements.
+        file_extensions (list): The formats of the indexed files, see output_file.
+        executor (Executor|None): If given, the indexed files are compressed and written by this executor.
+
+    Returns:
+        list: The values of col_multiple for which a file was written.
+    """
+    col_multiple_index = header.index(col_multiple)
+    out_indexes = [i for i in range(len(header)) if i != col_multiple_index]
+    out_header = [header[i] for i in out_indexes]
+    dicos: dict[str, dict[str, int]] = {header[i]: {} for i in out_indexes if count_colum[i] < max_limit}
+
+    written_files:list[int] = []
+    file_number:int|None = None
+    file_batches:list[np.ndarray] = []
+    pending_writes:list[Future] = []
+
+    def flush() -> None:
+        if file_number is not None:
+            file_data = np.concatenate(file_batches) if file_batches else np.empty((0, len(out_indexes)), dtype=np.int32)
+            if executor is None:
+                output_file(output_file_name+"_"+str(file_number), file_data, out_header, file_extensions=file_extensions)
+            else:
+                pending_writes.append(executor.submit(output_file, output_file_name+"_"+str(file_number), file_data, out_header, file_extensions=file_extensions))
+                while len(pending_writes) > MAX_PENDING_WRITES:
+                    pending_writes.pop(0).result()
+            written_files.append(file_number)
+
+    for batch in batches:
+        # Map the local codes of the batch to the global dictionaries
+        encoded = encode_columns(batch, out_header, list(dicos), dicos)
+
+        # Check if we need to start a new file
+        row_numbers = batch.categories[col_multiple_index].astype(np.int64)[batch.codes[col_multiple_index]]
+        bounds = [0, *(np.flatnonzero(np.diff(row_numbers)) + 1), len(row_numbers)]
+        for lower, upper in zip(bounds[:-1], bounds[1:]):
+            if row_numbers[lower] != file_number:
+                flush()
+                file_batches = []
+                file_number = int(row_numbers[lower])
+            file_batches.append(encoded[lower:upper])
+    flush()
+    for pending_write in pending_writes:
+        pending_write.result()
+
+    # Output dictionaries
+    json_list_output_file(dico_folder+"header", out_header)
+    if export_dico:
+        for output_file_name_dico, dico in dicos.items():
+            if len(dico) > 0:
+                json_output_file(dico_folder+output_file_name_dico, revert_dict(dico))
+                print(f"Output dictionary for column {out_header.index(output_file_name_dico)} to {output_file_name_dico}.json")
 
-    multiple_indexation_columns(
-        new_data,
-        new_header,
-        output_folder_data+"data",
-        dico_folder=output_folder_dico,
-        col_multiple="ANNREF",
-        max_limit=250
+    return written_files
+
+def stream_build(
+        input_file_path:str,
+        start:int|None,
+        end:int|None,
+        output_file_name:str,
+        erased_columns:list[str],
+        dico_folder:str="",
+        col_multiple:str="ANNREF",
+        max_limit:int=250,
+        batch_size:int=10000,
+        delimiter:str=";",
+        file_extensions:list[str]=["npz"],
+        validation_thresholds:dict|None=None,
+        executor:Executor|None=None,
+    ) -> list[int]:
+    """
+    Runs the whole compression pipeline in streaming mode.
+
+    The input files are read twice: a first pass counts the distinct elements of every
+    column, a second pass corrects, prunes and encodes the rows and writes one file per
+    value of col_multiple. Peak memory is bounded by one batch of rows and one encoded file.
+
+    Args:
+        input_file_path (str): Path to the csv input file (without the file extension).
+        start (int|None): The start value for processing if put.
+        end (int|None): The end value for processing if put.
+        output_file_name (str): The base name for output files.
+        erased_columns (list[str]): The column names to erase.
+        dico_folder (str): The folder to save dictionaries.
+        col_multiple (str): The column name used for multiple indexing.
+        max_limit (int): The maximum limit for distinct elements.
+        batch_size (int): The maximum number of rows per batch.
+        delimiter (str): The delimiter used in the csv files.
+        file_extensions (list): The formats of the indexed files, see output_file.
+        validation_thresholds (dict|None): If given, the rows are checked during the first pass and
+            nothing is written when a check exceeds its threshold, see validation.DataValidator.
+        executor (Executor|None): If given, the indexed files are written by this executor while the next ones are encoded.
+
+    Returns:
+        list: The values of col_multiple for which a file was written.
+    """
+    header = open_header(input_file_path, start, delimiter)
+
+    def pruned_batches(validator:DataValidator|None=None) -> tuple[Iterator[Table], list[str]]:
+        batches = stream_correcter_N890(stream_files(input_file_path, start, end, delimiter, batch_size), header)
+        if validator is not None:
+            batches = stream_validate(batches, validator)
+        return stream_erased_specific_column(batches, header, erased_columns)
+
+    validator = DataValidator(keys_by_year=True) if validation_thresholds is not None else None
+    batches, new_header = pruned_batches(validator)
+    all_count = stream_count_all_columns(batches, max_limit=max_limit)
+    print(f"Distinct counts for all columns: {all_count}")
+    if validator is not None and not validator.validate(dico_folder, validation_thresholds):
+        metrics.error("validate", "build stopped")
+        print("Build stopped by the validation, no file was written.")
+        return []
+
+    batches, new_header = pruned_batches()
+    batches, one_value_header = stream_erased_one_value_column(batches, new_header, all_count)
+    kept_count = [count for count in all_count if count > 1]
+    return stream_multiple_indexation_columns(
+        batches,
+        one_value_header,
+        kept_count,
+        output_file_name,
+        dico_folder=dico_folder,
+        col_multiple=col_multiple,
+        max_limit=max_limit,
+        file_extensions=file_extensions,
+        executor=executor,
     )
+
+
+def parallel_build(
+        input_file_path:str,
+        start:int,
+        end:int,
+        output_file_name:str,
+        erased_columns:list[str],
+        dico_folder:str="",
+        col_multiple:str="ANNREF",
+        max_limit:int=250,
+        workers:int=4,
+        delimiter:str=";",
+        file_extensions:list[str]=["npz"],
+        validation_thresholds:dict|None=None,
+        engine:str="block",
+    ) -> list[np.ndarray]:
+    """
+    Runs the whole compression pipeline with one process per yearly file.
+
+    Every file is read, corrected and pruned in a worker process with its own dictionaries.
+    The tables are then concatenated in year order, which merges the local dictionaries
+    into the global ones and remaps the codes, so the output is identical to the serial
+    pipeline. The yearly npz files are compressed and written by the workers as well.
+
+    Args:
+        input_file_path (str): Path to the csv input files (without the year and extension).
+        start (int): The first year to build.
+        end (int): The last year to build.
+        output_file_name (str): The base name for output files.
+        erased_columns (list[str]): The column names to erase.
+        dico_folder (str): The folder to save dictionaries.
+        col_multiple (str): The column name used for multiple indexing.
+        max_limit (int): The maximum limit for distinct elements.
+        workers (int): The number of worker processes.
+        delimiter (str): The delimiter used in the csv files.
+        file_extensions (list): The formats of the indexed files, see output_file.
+        validation_thresholds (dict|None): If given, every file is checked by its worker and nothing
+            is written when a check exceeds its threshold, see validation.DataValidator.
+        engine (str): The csv reader of the workers, see readers.read_csv.
+
+    Returns:
+        list: The indexed data, one matrix per value of col_multiple (see encode_columns).
+    """
+    dico_N890 = cached_json("data/LIB_MOD_convert.json")
+    file_names = [f"{input_file_path}_{i}.csv" for i in range(start, end + 1)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        prepared = [metrics.collect(measured) for measured in executor.map(
+            metrics.run_measured,
+            [prepare_file if validation_thresholds is None else prepare_validated_file] * len(file_names),
+            file_names,
+            [erased_columns] * len(file_names),
+            [dico_N890] * len(file_names),
+            [delimiter] * len(file_names),
+            [engine] * len(file_names),
+        )]
+        print(f"Successfully prepared {len(prepared)} files with {workers} workers.")
+
+        if validation_thresholds is None:
+            tables = prepared
+        else:
+            tables = [table for table, _ in prepared]
+            validator = DataValidator()
+            for _, file_validator in prepared:
+                validator.merge(file_validator)
+            if not validator.validate(dico_folder, validation_thresholds):
+                metrics.error("validate", "build stopped")
+                print("Build stopped by the validation, no file was written.")
+                return []
+
+        data = Table.concat(tables)
+        all_count = count_all_columns(data)
+        print(f"Distinct counts for all columns: {all_count}")
+        data, header = erased_one_value_column(data, data.header, all_count)
+        return multiple_indexation_columns(
+            data,
+            header,
+            output_file_name,
+            dico_folder=dico_folder,
+            col_multiple=col_multiple,
+            max_limit=max_limit,
+            executor=executor,
+            file_extensions=file_extensions,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compresses the COMEXTBOIS csv files into indexed npz files.")
+    parser.add_argument("--stream", action="store_true", help="stream the files batch by batch instead of loading them in memory")
+    parser.add_argument("--batch-size", type=int, default=10000, help="number of rows per batch in streaming mode")
+    parser.add_argument("--incremental", action="store_true", help="only rebuild the years whose source file changed, keeping the dictionary codes stable")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes, the yearly files are processed in parallel when above 1")
+    parser.add_argument("--rollups", action="store_true", help="also precompute the rollup cubes used by the charts")
+    parser.add_argument("--derived", action="store_true", help="also precompute the trade balances, deltas and rolling sums")
+    parser.add_argument("--hashed-names", action="store_true", help="also publish the yearly files under content-hashed names listed in manifest.json")
+    parser.add_argument("--skip-validation", action="store_true", help="do not check the corrected rows before writing the files")
+    parser.add_argument("--validation-thresholds", help="JSON file of the maximum number of violations of some checks, replacing the ones of validation.DEFAULT_THRESHOLDS")
+    parser.add_argument("--io-threads", type=int, default=4, help="threads compressing and writing the yearly files in the background, 0 to write them in turn")
+    parser.add_argument("--reader", default="block", choices=ENGINES, help="csv reader of the in-memory, parallel and incremental builds")
+    parser.add_argument("--pipeline", help="JSON file of the stages of the in-memory build, see pipeline.DEFAULT_PIPELINE")
+    parser.add_argument("--metrics", nargs="+", default=[], help="files to write the timings, rows, bytes, memory and errors of the build to, in the Prometheus text format for .prom files, as JSON otherwise")
+    parser.add_argument("--metrics-log", help="file to append the structured logs of the stages to, one JSON object per line")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="STAGE=PROFILER", help="stages to run under a profiler, cprofile (profile_<stage>.prof) or tracemalloc (largest allocations in the metrics)")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="memory budget of the cache of the dictionaries and yearly files, in MB")
+    parser.add_argument("--formats", nargs="+", default=["npz"], choices=["npz", "bin", "bin.gz", "npy", "rle", "rle.gz", "chunks"], help="formats of the yearly files")
+    args = parser.parse_args()
+    configure_cache(args.cache_mb * 1024 * 1024)
+
+    input_path = "data/FDS_COMEXTBOIS"
+    output_folder_data = "visualization/public/data/"
+    output_folder_dico = "test_result/"
+    start_year = 2012
+    end_year = 2025
+    # With hashed names only the hashed copies are published, the yearly files stay next to the dictionaries
+    output_file_name = (output_folder_dico if args.hashed_names else output_folder_data) + "data"
+
+    validation_thresholds = None
+    if not args.skip_validation:
+        validation_thresholds = DEFAULT_THRESHOLDS | (open_json_file(args.validation_thresholds.removesuffix(".json"), cache=False) if args.validation_thresholds else {})
+
+    mode = "incremental" if args.incremental else "parallel" if args.workers > 1 else "stream" if args.stream else "pipeline"
+    if mode == "pipeline":
+        from pipeline import DEFAULT_PIPELINE, Pipeline
+        pipeline = Pipeline.from_config(open_json_file(args.pipeline.removesuffix(".json"), cache=False) if args.pipeline else DEFAULT_PIPELINE)
+        if validation_thresholds is None:
+            pipeline = pipeline.without("validate")
+
+    if args.metrics_log:
+        metrics.log_to(args.metrics_log)
+    if args.profile:
+        # Only the spans of the chosen mode can be profiled
+        span_names = {
+            "pipeline": pipeline.span_names() if mode == "pipeline" else [],
+            "parallel": ["prepare_file"],
+            "incremental": ["prepare_file"],
+            "stream": [],
+        }[mode] + ["build", "rollups", "derived", "manifest"]
+        try:
+            metrics.configure(dict(stage.split("=", 1) for stage in args.profile), stages=span_names)
+        except ValueError as e:
+            parser.error(str(e))
+
+    io_executor = ThreadPoolExecutor(max_workers=args.io_threads) if args.io_threads > 0 else None
+    try:
+        with metrics.span("build", mode=mode):
+            if args.incremental:
+                from incremental import incremental_build
+                incremental_build(
+                    input_path,
+                    start_year,
+                    end_year,
+                    output_file_name,
+                    ["GEOGRAPHIE_LIB", "N027_MOD", "N053_MOD", "N890_MOD"],
+                    dico_folder=output_folder_dico,
+                    col_multiple="ANNREF",
+                    max_limit=250,
+                    workers=args.workers,
+                    file_extensions=args.formats,
+                    validation_thresholds=validation_thresholds,
+                    engine=args.reader,
+                    executor=io_executor,
+                )
+            elif args.workers > 1:
+                parallel_build(
+                    input_path,
+                    start_year,
+                    end_year,
+                    output_file_name,
+                    ["GEOGRAPHIE_LIB", "N027_MOD", "N053_MOD", "N890_MOD"],
+                    dico_folder=output_folder_dico,
+                    col_multiple="ANNREF",
+                    max_limit=250,
+                    workers=args.workers,
+                    file_extensions=args.formats,
+                    validation_thresholds=validation_thresholds,
+                    engine=args.reader,
+                )
+            elif args.stream:
+                stream_build(
+                    input_path,
+                    start_year,
+                    end_year,
+                    output_file_name,
+                    ["GEOGRAPHIE_LIB", "N027_MOD", "N053_MOD", "N890_MOD"],
+                    dico_folder=output_folder_dico,
+                    col_multiple="ANNREF",
+                    max_limit=250,
+                    batch_size=args.batch_size,
+                    file_extensions=args.formats,
+                    validation_thresholds=validation_thresholds,
+                    executor=io_executor,
+                )
+            else:
+                pipeline.run(
+                    input_path,
+                    start_year,
+                    end_year,
+                    output_file_name,
+                    dico_folder=output_folder_dico,
+                    engine=args.reader,
+                    executor=io_executor,
+                    file_extensions=args.formats,
+                    validation_thresholds=validation_thresholds,
+                )
+
+            if io_executor is not None:
+                io_executor.shutdown()
+
+        if args.rollups:
+            from aggregation import build_rollups
+            with metrics.span("rollups"):
+                build_rollups(output_file_name, start_year, end_year, output_folder_dico, output_folder_data)
+
+        if args.derived:
+            from aggregation import build_derived
+            with metrics.span("derived"):
+                build_derived(output_file_name, start_year, end_year, output_folder_dico, output_folder_data)
+
+        if args.hashed_names:
+            from manifest import write_build_manifest
+            with metrics.span("manifest"):
+                write_build_manifest(output_file_name, start_year, end_year, output_folder_dico, args.formats, output_folder_data)
+    finally:
+        for metrics_path in args.metrics:
+            metrics.METRICS.write(metrics_path)
+
+    # The errors that were only printed fail the build too, for the scheduler running it
+    if metrics.METRICS.errors:
+        print(f"Build failed, errors by stage: {metrics.METRICS.errors}")
+        sys.exit(1)
@@ -1,5 +1,10 @@
 import compresser as compresser
 import json
+import metrics
+import unicodedata
+
+# Ligatures that the Unicode decomposition keeps
+LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
 
 def dico_columns_tuple(data: list[list[str]], header: list[str], column_names: list[str]) -> dict[str, list[str]]:
     """
@@ -27,7 +32,74 @@ def dico_columns_tuple(data: list[list[str]], header: list[str], column_names: l
     return tuple_counts
 
 
-def merger(input_file_path_name: str, input_file_path_code: str, output_file_path: str) -> None:
+def normalize_label(label: str) -> str:
+    """
+    Normalizes a label for comparisons: case folded, accents and ligatures removed, blanks collapsed.
+
+    Args:
+        label (str): The label to normalize.
+    Returns:
+        str: The normalized label.
+    """
+    decomposed = unicodedata.normalize("NFKD", label.casefold())
+    without_accents = "".join(character for character in decomposed if not unicodedata.combining(character))
+    return " ".join(without_accents.translate(LIGATURES).split())
+
+
+def build_label_index(code_dico: dict[str, list[str]], normalize: bool = False) -> dict[str, list[str]]:
+    """
+    Builds the reverse index of a code dictionary on the first label of every code.
+
+    Args:
+        code_dico (dict[str, list[str]]): The labels of every code, the first one being the reference label.
+        normalize (bool): Whether to index the normalized labels, see normalize_label.
+    Returns:
+        dict[str, list[str]]: The codes of every label, in the order of code_dico.
+    """
+    label_index: dict[str, list[str]] = {}
+    for code, labels in code_dico.items():
+        if not labels:
+            continue
+        label = normalize_label(labels[0]) if normalize else labels[0]
+        label_index.setdefault(label, []).append(code)
+    return label_index
+
+
+def join_labels(
+        name_dico: dict[str, str],
+        code_dico: dict[str, list[str]],
+        normalize: bool = False,
+    ) -> tuple[dict[str, list[str]], list[str]]:
+    """
+    Finds the codes of every name by their first label, in a single pass over both dictionaries.
+
+    Args:
+        name_dico (dict[str, str]): The name of every element.
+        code_dico (dict[str, list[str]]): The labels of every code, the first one being the reference label.
+        normalize (bool): Whether to compare the labels without accents, case and extra blanks.
+    Returns:
+        tuple: The codes matching every matched element (in the order of code_dico), and the unmatched elements.
+    """
+    label_index = build_label_index(code_dico, normalize)
+    matches: dict[str, list[str]] = {}
+    unmatched: list[str] = []
+    for element, name in name_dico.items():
+        codes = label_index.get(normalize_label(name) if normalize else name)
+        if codes:
+            matches[element] = codes
+        else:
+            unmatched.append(element)
+    return matches, unmatched
+
+
+def merger(
+        input_file_path_name: str,
+        input_file_path_code: str,
+        output_file_path: str,
+        normalize: bool = False,
+        all_matches: bool = False,
+        unmatched_file_path: str | None = None,
+    ) -> None:
     """
     Merges two files based on a common key and outputs the merged data.
 
@@ -35,6 +107,9 @@ def merger(input_file_path_name: str, input_file_path_code: str, output_file_pat
         input_file_path_name (str): Path to the first json input file containing names.
         input_file_path_code (str): Path to the second json input file containing codes.
         output_file_path (str): Path to the output file for the merged data.
+        normalize (bool): Whether to match the names without accents, case and extra blanks.
+        all_matches (bool): Whether to output every matching code ("codes") instead of the first one ("code").
+        unmatched_file_path (str | None): If given, path to a json file listing the unmatched names.
     """
     try:
         name_dico = compresser.open_json_file(input_file_path_name)
@@ -42,28 +117,34 @@ def merger(input_file_path_name: str, input_file_path_code: str, output_file_pat
     except Exception as e:
         name_dico = {}
         code_dico = {}
+        metrics.error("merger", e)
         print(f"Error opening files: {e}")
 
     if not name_dico or not code_dico:
+        metrics.error("merger", "empty input dictionaries")
         print("One or both of the input dictionaries are empty. Cannot perform merge.")
         return
-    
+
+    matches, unmatched = join_labels(name_dico, code_dico, normalize)
     correct_dico = {}
-    for element in name_dico:
-        name = name_dico[element]
-        for code in code_dico:
-            if code_dico[code][0] == name:
-                correct_dico[element] = {
-                    "name": name,
-                    "code": code
-                }
-                break
-    
+    for element, codes in matches.items():
+        if all_matches:
+            correct_dico[element] = {"name": name_dico[element], "codes": codes}
+        else:
+            correct_dico[element] = {"name": name_dico[element], "code": codes[0]}
+    print(f"{len(matches)} names matched, {len(unmatched)} unmatched.")
+
     try:
         with open(output_file_path, 'w', encoding='utf-8') as f:
             json.dump(correct_dico, f, ensure_ascii=False, indent=4)
+        metrics.add_bytes("written", metrics.path_size(output_file_path))
         print(f"Merged dictionary successfully written to {output_file_path}")
+        if unmatched_file_path is not None:
+            with open(unmatched_file_path, 'w', encoding='utf-8') as f:
+                json.dump({element: name_dico[element] for element in unmatched}, f, ensure_ascii=False, indent=4)
+            print(f"Unmatched names successfully written to {unmatched_file_path}")
     except Exception as e:
+        metrics.error("merger", e)
         print(f"Error writing merged dictionary to file: {e}")
 
 if __name__ == "__main__":
@@ -0,0 +1,247 @@
+import gzip
+import json
+import numpy as np
+
+MAGIC = b"WDRL"
+VERSION = 1
+ALIGNMENT = 8
+
+
+def zigzag(values:np.ndarray) -> np.ndarray:
+    """
+    Maps signed integers to unsigned ones, small magnitudes staying small (0, -1, 1, -2... to 0, 1, 2, 3...).
+    """
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def unzigzag(values:np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def encode_varint(values:np.ndarray) -> bytes:
+    """
+    Encodes unsigned integers as LEB128 varints: 7 bits per byte, the high bit set on every byte but the last.
+
+    Args:
+        values (np.ndarray): The unsigned integers.
+    Returns:
+        bytes: The varints one after the other.
+    """
+    values = values.astype(np.uint64)
+    if not len(values):
+        return b""
+    lengths = np.ones(len(values), dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        lengths += remaining > 0
+        remaining >>= np.uint64(7)
+    positions = np.arange(lengths.max())
+    groups = (values[:, None] >> (positions * 7).astype(np.uint64)) & np.uint64(0x7F)
+    groups |= (positions < lengths[:, None] - 1).astype(np.uint64) << np.uint64(7)
+    return groups[positions < lengths[:, None]].astype(np.uint8).tobytes()
+
+
+def decode_varint(buffer:np.ndarray, count:int) -> np.ndarray:
+    """
+    Decodes the first count varints of a buffer written by encode_varint.
+
+    Args:
+        buffer (np.ndarray): The uint8 buffer.
+        count (int): The number of varints to decode.
+    Returns:
+        np.ndarray: The uint64 values.
+    """
+    if not count:
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(buffer < 0x80)[:count]
+    data = buffer[:ends[-1] + 1]
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    positions = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.uint64) << (positions * 7).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def encode_column(column:np.ndarray, encoding:str) -> tuple[bytes, dict]:
+    """
+    Encodes one column.
+
+    Encodings:
+        - "rle": the value (zigzag varint) then the length (varint) of every run,
+          {"runs", "values_length"} giving the number of runs and the size of the values.
+        - "delta": the zigzag varint of the difference with the previous value (the first with 0).
+        - "for": frame of reference, the difference with the minimum {"reference"} stored as
+          varints ({"width": 0}) or as fixed-width little-endian unsigned integers of {"width"}
+          bytes, whichever is smaller.
+
+    Args:
+        column (np.ndarray): The integer column.
+        encoding (str): One of "rle", "delta" and "for".
+    Returns:
+        tuple: The encoded bytes and the parameters to store in the header.
+    """
+    if np.issubdtype(column.dtype, np.floating) and not np.array_equal(column, np.round(column)):
+        raise ValueError("Only integer columns can be encoded, write decimal values in another format.")
+    column = column.astype(np.int64)
+    if encoding == "rle":
+        starts = np.flatnonzero(np.diff(column, prepend=column[:1] - 1)) if len(column) else np.empty(0, dtype=np.int64)
+        run_values = encode_varint(zigzag(column[starts]))
+        run_lengths = encode_varint(np.diff(np.append(starts, len(column))))
+        return run_values + run_lengths, {"runs": len(starts), "values_length": len(run_values)}
+    if encoding == "delta":
+        return encode_varint(zigzag(np.diff(column, prepend=0))), {}
+    if encoding == "for":
+        reference = int(column.min()) if len(column) else 0
+        offsets = (column - reference).astype(np.uint64)
+        width = next(width for width in [1, 2, 4, 8] if not len(offsets) or int(offsets.max()) < 1 << (8 * width))
+        varints = encode_varint(offsets)
+        if len(varints) <= width * len(offsets):
+            return varints, {"reference": reference, "width": 0}
+        return offsets.astype(f"<u{width}").tobytes(), {"reference": reference, "width": width}
+    raise ValueError(f"Unknown encoding {encoding}.")
+
+
+def decode_column(buffer:np.ndarray, description:dict, rows:int) -> np.ndarray:
+    """
+    Decodes one column encoded by encode_column.
+
+    Args:
+        buffer (np.ndarray): The uint8 bytes of the column.
+        description (dict): The description of the column in the header.
+        rows (int): The number of rows.
+    Returns:
+        np.ndarray: The int64 column.
+    """
+    encoding = description["encoding"]
+    if encoding == "rle":
+        run_values = unzigzag(decode_varint(buffer, description["runs"]))
+        run_lengths = decode_varint(buffer[description["values_length"]:], description["runs"]).astype(np.int64)
+        return np.repeat(run_values, run_lengths)
+    if encoding == "delta":
+        return np.cumsum(unzigzag(decode_varint(buffer, rows)))
+    if encoding == "for":
+        if description["width"]:
+            offsets = buffer[:rows * description["width"]].view(f"<u{description['width']}")
+        else:
+            offsets = decode_varint(buffer, rows)
+        return offsets.astype(np.int64) + description["reference"]
+    raise ValueError(f"Unknown encoding {encoding}.")
+
+
+def _aligned(offset:int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _smallest_encoding(column:np.ndarray, encodings:list[str]) -> tuple[bytes, dict, str]:
+    best = None
+    for encoding in encodings:
+        blob, parameters = encode_column(column, encoding)
+        if best is None or len(blob) < len(best[0]):
+            best = (blob, parameters, encoding)
+    return best
+
+
+def write_encoded_file(
+        output_file_path:str,
+        columns:list[np.ndarray],
+        header:list[str],
+        sort_key:list[str]|None=None,
+        compress:bool=False,
+    ) -> None:
+    """
+    Sorts the rows by a key and writes the columns with integer encodings.
+
+    The rows are sorted by the columns of sort_key (every column but the last one if None),
+    so that the key columns form long runs. Each key column is run-length or delta encoded,
+    whichever is smaller, the other columns use a frame of reference, all with varints.
+
+    Layout (little-endian):
+        - 4 bytes: the magic "WDRL".
+        - 4 bytes: uint32 length of the JSON header.
+        - The UTF-8 JSON header, padded with spaces up to a multiple of 8 bytes:
+          {"version", "rows", "sort_key", "columns": [{"name", "encoding", "dtype", "offset", "length", ...}]},
+          with the dtype of the written column (int32, or int64 for the years whose values
+          need it, see schema.matrix_dtype) and the parameters of the encoding (see encode_column).
+        - The encoded columns one after the other, each starting on a multiple of 8 bytes.
+
+    Args:
+        output_file_path (str): Path to the output file (with the extension).
+        columns (list[np.ndarray]): The integer columns, all of the same length.
+        header (list[str]): The names of the columns.
+        sort_key (list[str]|None): The columns to sort the rows by.
+        compress (bool): Whether to gzip the file.
+    """
+    sort_key = header[:-1] if sort_key is None else sort_key
+    rows = len(columns[0]) if columns else 0
+    order = np.lexsort([columns[header.index(name)] for name in reversed(sort_key)]) if sort_key and rows else np.arange(rows)
+
+    blobs = []
+    descriptions = []
+    for name, column in zip(header, columns):
+        column = np.asarray(column)[order]
+        if name in sort_key:
+            blob, parameters, encoding = _smallest_encoding(column, ["rle", "delta"])
+        else:
+            blob, parameters = encode_column(column, "for")
+            encoding = "for"
+        blobs.append(blob)
+        descriptions.append({"name": name, "encoding": encoding, "dtype": column.dtype.name, **parameters})
+
+    # The header size depends on the offsets it contains, grow it until it is stable
+    header_size = 0
+    while True:
+        offset = _aligned(8 + header_size)
+        for description, blob in zip(descriptions, blobs):
+            description["offset"] = offset
+            description["length"] = len(blob)
+            offset = _aligned(offset + len(blob))
+        json_header = json.dumps({"version": VERSION, "rows": rows, "sort_key": sort_key, "columns": descriptions}, ensure_ascii=False).encode("utf-8")
+        if _aligned(8 + len(json_header)) - 8 == header_size:
+            break
+        header_size = _aligned(8 + len(json_header)) - 8
+
+    content = bytearray(MAGIC)
+    content += np.uint32(header_size).tobytes()
+    content += json_header.ljust(header_size, b" ")
+    for description, blob in zip(descriptions, blobs):
+        content += b"\0" * (description["offset"] - len(content))
+        content += blob
+
+    with open(output_file_path, mode='wb') as output_file:
+        output_file.write(gzip.compress(bytes(content), mtime=0) if compress else content)
+
+
+def _read_buffer(input_file_path:str) -> tuple[np.ndarray, dict]:
+    with open(input_file_path, mode='rb') as input_file:
+        content = input_file.read()
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    buffer = np.frombuffer(content, dtype=np.uint8)
+    if bytes(buffer[:4]) != MAGIC:
+        raise ValueError(f"{input_file_path} is not an encoded file.")
+    header_size = int(buffer[4:8].view("<u4")[0])
+    return buffer, json.loads(bytes(buffer[8:8 + header_size]).decode("utf-8"))
+
+
+def read_encoded_header(input_file_path:str) -> dict:
+    """
+    Reads the JSON header of a file written by write_encoded_file, without decoding its columns.
+    """
+    return _read_buffer(input_file_path)[1]
+
+
+def read_encoded_file(input_file_path:str) -> dict[str, np.ndarray]:
+    """
+    Reads a file written by write_encoded_file, the rows being in the order of its sort key.
+
+    Args:
+        input_file_path (str): Path to the file (with the extension).
+    Returns:
+        dict: The int64 columns by name.
+    """
+    buffer, description = _read_buffer(input_file_path)
+    return {
+        column["name"]: decode_column(buffer[column["offset"]:column["offset"] + column["length"]], column, description["rows"])
+        for column in description["columns"]
+    }
@@ -0,0 +1,271 @@
+"""
+Compiles the event files of the charts into an interval index, checked and parsed once.
+
+Usage:
+    python events.py                                        # writes visualization/public/data/events.json
+    python events.py --window 2020-01:2020-12 --country 3  # prints the events of a window and country
+"""
+import argparse
+import compresser as compresser
+import csv
+import datetime
+import glob
+import os
+import numpy as np
+
+EVENTS_FILE_NAME = "events"
+REPORT_FILE_NAME = "events_report"
+MAX_EXAMPLES = 5
+# Labels of the events shown whatever the selected countries (see filterevents in graphique.tsx)
+ALWAYS_SHOWN = ["France Bois"]
+
+# The columns of the two layouts of event files, and the separators of their lists
+SOURCE_FORMATS = [
+    {"start": "date_debut", "end": "date_fin", "title": "titre_court", "description": "description_rapide",
+     "categories": "categorie", "countries": "pays", "country_separator": "/"},
+    {"start": "date", "end": None, "title": "titre", "description": "description",
+     "categories": "catégorie", "countries": "pays_concernés", "country_separator": ";"},
+]
+
+
+def event_files(input_folder:str) -> list[str]:
+    """
+    Returns the event files of a folder. The latest revision of all_event_wood (all_event_wood_bis)
+    comes first, its version of an event listed in several files is the one kept.
+    """
+    return sorted(glob.glob(os.path.join(input_folder, "all_event_wood*.csv")), reverse=True) + glob.glob(os.path.join(input_folder, "liste_evenements_allemagne.csv"))
+
+
+def parse_date(text:str) -> tuple[int, int, int]|None:
+    """
+    Parses a YYYY-MM-DD or YYYY-MM date, the first day of the month for the latter.
+
+    Returns:
+        tuple|None: The year, month and day, None if the text is not a valid date.
+    """
+    parts = text.strip().split("-")
+    if len(parts) not in (2, 3) or not all(part.isdigit() for part in parts):
+        return None
+    try:
+        date = datetime.date(int(parts[0]), int(parts[1]), int(parts[2]) if len(parts) == 3 else 1)
+    except ValueError:
+        return None
+    return date.year, date.month, date.day
+
+
+def month_index(year:int, month:int, base_year:int) -> int:
+    """
+    Returns the index of a month on the axis of the yearly files: 0 for January of base_year,
+    so the month of N053 code m (1 to 12) of a year is (year - base_year) * 12 + m - 1.
+    """
+    return (year - base_year) * 12 + month - 1
+
+
+def split_labels(text:str, separator:str) -> list[str]:
+    return [label.strip() for label in (text or "").split(separator) if label.strip()]
+
+
+def read_events(file_name:str) -> list[dict[str, str|list[str]]]:
+    """
+    Reads an event file, whichever of SOURCE_FORMATS its header follows.
+
+    Returns:
+        list: One dict per line: start, end, title, description (text), categories and countries (lists).
+    """
+    with open(file_name, mode='r', encoding='utf-8-sig', newline='') as input_file:
+        reader = csv.DictReader(input_file, delimiter=",")
+        source_format = next((candidate for candidate in SOURCE_FORMATS if candidate["start"] in (reader.fieldnames or [])), None)
+        if source_format is None:
+            raise ValueError(f"Unknown event file layout {reader.fieldnames}.")
+        return [
+            {
+                "start": (row.get(source_format["start"]) or "").strip(),
+                "end": (row.get(source_format["end"]) or "").strip() if source_format["end"] else "",
+                "title": (row.get(source_format["title"]) or "").strip(),
+                "description": (row.get(source_format["description"]) or "").strip(),
+                "categories": split_labels(row.get(source_format["categories"]), "/"),
+                "countries": split_labels(row.get(source_format["countries"]), source_format["country_separator"]),
+            }
+            for row in reader
+        ]
+
+
+def country_ids(countries:dict[str, dict[str, str]]) -> dict[str, list[str]]:
+    """
+    Maps every label an event may use for a country (code, en, fr and event_name of
+    countries.json) to the ids of the countries it designates.
+    """
+    ids:dict[str, list[str]] = {}
+    for country_id, country in countries.items():
+        for key in ["code", "en", "fr", "event_name"]:
+            if country.get(key) and country_id not in ids.setdefault(country[key], []):
+                ids[country[key]].append(country_id)
+    return ids
+
+
+def compile_events(events:list[dict], countries:dict[str, dict[str, str]], base_year:int) -> tuple[dict, dict]:
+    """
+    Checks and parses the events, and builds their interval index.
+
+    The events are sorted by start month, then start day, in the order of the files
+    otherwise. max_end[i] is the last end month of the events 0 to i: it never decreases,
+    so the events overlapping a window are found with two binary searches (see
+    overlapping_events). The posting list of a country holds the sorted indexes of its
+    events, the events listing one of ALWAYS_SHOWN are in the always list.
+    The events with a missing or invalid date, an end before their start or no title are
+    left out, as well as the repeated events (same start date and title, the first one is kept).
+
+    Args:
+        events (list[dict]): The events read by read_events, with their file under "file".
+        countries (dict): The content of countries.json.
+        base_year (int): The first year of the yearly files, whose January is month 0.
+    Returns:
+        tuple: The index and the report {"events", "kept", "checks": [{"check", "violations", "examples"}]}.
+    """
+    violations:dict[str, list] = {name: [] for name in ["dates:invalid", "dates:end_before_start", "title:missing", "duplicates", "countries:unknown"]}
+    ids_of = country_ids(countries)
+    kept = []
+    seen = set()
+    for event in events:
+        example = {"file": os.path.basename(event["file"]), "start": event["start"], "title": event["title"]}
+        start = parse_date(event["start"])
+        end = parse_date(event["end"]) if event["end"] else start
+        if start is None or end is None:
+            violations["dates:invalid"].append({**example, "end": event["end"]})
+            continue
+        if end < start:
+            violations["dates:end_before_start"].append({**example, "end": event["end"]})
+            continue
+        if not event["title"]:
+            violations["title:missing"].append(example)
+            continue
+        key = (start, event["title"])
+        if key in seen:
+            violations["duplicates"].append(example)
+            continue
+        seen.add(key)
+        unknown = [label for label in event["countries"] if label not in ids_of and label not in ALWAYS_SHOWN]
+        if unknown:
+            violations["countries:unknown"].extend(label for label in unknown if label not in violations["countries:unknown"])
+        kept.append((start, end, event))
+
+    start_months = np.array([month_index(start[0], start[1], base_year) for start, _, _ in kept], dtype=np.int32)
+    end_months = np.array([month_index(end[0], end[1], base_year) for _, end, _ in kept], dtype=np.int32)
+    days = np.array([start[2] for start, _, _ in kept], dtype=np.int32)
+    order = np.lexsort((days, start_months))
+    sorted_events = [kept[i][2] for i in order]
+
+    postings:dict[str, list[int]] = {}
+    always = []
+    for event_index, event in enumerate(sorted_events):
+        for country_id in dict.fromkeys(country_id for label in event["countries"] for country_id in ids_of.get(label, [])):
+            postings.setdefault(country_id, []).append(event_index)
+        if any(label in ALWAYS_SHOWN for label in event["countries"]):
+            always.append(event_index)
+
+    index = {
+        "base_year": base_year,
+        "start": start_months[order].tolist(),
+        "end": end_months[order].tolist(),
+        "max_end": np.maximum.accumulate(end_months[order]).tolist() if len(order) else [],
+        "day": days[order].tolist(),
+        "title": [event["title"] for event in sorted_events],
+        "description": [event["description"] for event in sorted_events],
+        "categories": [event["categories"] for event in sorted_events],
+        "countries": [event["countries"] for event in sorted_events],
+        "postings": {country_id: postings[country_id] for country_id in sorted(postings, key=int)},
+        "always": always,
+    }
+    report = {
+        "events": len(events),
+        "kept": len(sorted_events),
+        "checks": [{"check": name, "violations": len(examples), "examples": examples[:MAX_EXAMPLES]} for name, examples in violations.items()],
+    }
+    return index, report
+
+
+def overlapping_events(index:dict, first:int, last:int, country:str|None=None) -> np.ndarray:
+    """
+    Returns the events overlapping a window of months, with binary searches on the index.
+
+    The events starting after last are cut off on start, the ones ending before first on
+    max_end, and only the remaining range is checked for the end of every event.
+
+    Args:
+        index (dict): The index written by compile_events.
+        first (int): The first month of the window, see month_index.
+        last (int): The last month of the window, included.
+        country (str|None): The id of a country in countries.json, to only keep its events and
+            the always shown ones. Every event if None.
+    Returns:
+        np.ndarray: The sorted indexes of the events.
+    """
+    lower = int(np.searchsorted(index["max_end"], first, side="left"))
+    upper = int(np.searchsorted(index["start"], last, side="right"))
+    if country is None:
+        candidates = np.arange(lower, upper)
+    else:
+        candidates = np.union1d(index["postings"].get(str(country), []), index["always"]).astype(np.int64)
+        candidates = candidates[np.searchsorted(candidates, lower):np.searchsorted(candidates, upper)]
+    return candidates[np.asarray(index["end"], dtype=np.int64)[candidates] >= first] if len(candidates) else candidates
+
+
+def build_events(
+        input_folder:str,
+        output_folder:str,
+        dico_folder:str,
+        base_year:int,
+        countries_path:str="visualization/src/data/countries",
+    ) -> dict:
+    """
+    Compiles the event files of a folder into <output_folder>events.json and writes the
+    report of the checks to <dico_folder>events_report.json.
+
+    Args:
+        input_folder (str): The folder of the event files, see event_files.
+        output_folder (str): The folder to write the index to.
+        dico_folder (str): The folder to write the report to.
+        base_year (int): The first year of the yearly files, whose January is month 0.
+        countries_path (str): Path to countries.json (without the file extension).
+    Returns:
+        dict: The index, see compile_events.
+    """
+    events = []
+    for file_name in event_files(input_folder):
+        try:
+            events.extend({**event, "file": file_name} for event in read_events(file_name))
+        except Exception as e:
+            print(f"Error reading event file {file_name}: {e}")
+    index, report = compile_events(events, compresser.open_json_file(countries_path), base_year)
+    for result in report["checks"]:
+        if result["violations"]:
+            print(f"Events: {result['check']} has {result['violations']} violations, e.g. {result['examples'][:2]}")
+    compresser.json_output_file(dico_folder+REPORT_FILE_NAME, report)
+    compresser.json_output_file(output_folder+EVENTS_FILE_NAME, index, compact=True)
+    print(f"Compiled {report['kept']} of {report['events']} events.")
+    return index
+
+
+def _parse_window(window:str, base_year:int) -> tuple[int, int]:
+    first, last = [parse_date(bound) for bound in window.split(":", 1)]
+    if first is None or last is None:
+        raise ValueError(f"Invalid window {window}, expected YYYY-MM:YYYY-MM.")
+    return month_index(first[0], first[1], base_year), month_index(last[0], last[1], base_year)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compiles the event files into an interval index.")
+    parser.add_argument("--input", default="visualization/public/data/", help="folder of the event files")
+    parser.add_argument("--output", default="visualization/public/data/", help="folder to write events.json to")
+    parser.add_argument("--dico-folder", default="test_result/", help="folder to write the report of the checks to")
+    parser.add_argument("--base-year", type=int, default=2012, help="first year of the yearly files, its January is month 0")
+    parser.add_argument("--countries", default="visualization/src/data/countries", help="countries.json, without the file extension")
+    parser.add_argument("--window", help="YYYY-MM:YYYY-MM window to print the events of, after compiling them")
+    parser.add_argument("--country", help="id of countries.json to filter the printed events on")
+    args = parser.parse_args()
+
+    index = build_events(args.input, args.output, args.dico_folder, args.base_year, args.countries)
+    if args.window:
+        for event_index in overlapping_events(index, *_parse_window(args.window, args.base_year), args.country):
+            start, end = index["start"][event_index], index["end"][event_index]
+            print(f"{args.base_year + start // 12}-{start % 12 + 1:02d} to {args.base_year + end // 12}-{end % 12 + 1:02d}: {index['title'][event_index]} ({', '.join(index['countries'][event_index])})")
@@ -0,0 +1,239 @@
+import compresser as compresser
+from concurrent.futures import Executor, ProcessPoolExecutor
+import hashlib
+import metrics
+import numpy as np
+import os
+from cache import cached_json
+from readers import prefetch_files
+from table import Table
+from validation import DataValidator
+
+STATE_FILE_NAME = "build_state"
+CORRECTION_FILE_PATH = "data/LIB_MOD_convert.json"
+
+
+def file_checksum(file_path:str) -> str:
+    """
+    Computes the SHA-256 checksum of a file, or of the names and contents of the files of a folder.
+
+    Args:
+        file_path (str): Path to the file or folder.
+    Returns:
+        str: The hexadecimal checksum, empty if the file does not exist.
+    """
+    if not os.path.exists(file_path):
+        return ""
+    digest = hashlib.sha256()
+    if os.path.isdir(file_path):
+        for name in sorted(os.listdir(file_path)):
+            digest.update(name.encode("utf-8"))
+            digest.update(file_checksum(os.path.join(file_path, name)).encode("ascii"))
+        return digest.hexdigest()
+    with open(file_path, mode='rb') as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_dictionary(input_file_path:str) -> dict[str, int]:
+    """
+    Loads an exported dictionary (code to value) as a value to code dictionary.
+
+    Args:
+        input_file_path (str): Path to the JSON dictionary (without the file extension).
+    Returns:
+        dict: The code of every value, empty if the dictionary does not exist yet.
+    """
+    if not os.path.exists(input_file_path+".json"):
+        return {}
+    dico = compresser.open_json_file(input_file_path)
+    return {value: int(code) for code, value in dico.items()}
+
+
+def incremental_build(
+        input_file_path:str,
+        start:int,
+        end:int,
+        output_file_name:str,
+        erased_columns:list[str],
+        dico_folder:str="",
+        col_multiple:str="ANNREF",
+        max_limit:int=250,
+        delimiter:str=";",
+        workers:int=1,
+        file_extensions:list[str]=["npz"],
+        validation_thresholds:dict|None=None,
+        engine:str="block",
+        executor:Executor|None=None,
+    ) -> list[int]:
+    """
+    Rebuilds only the yearly files whose source changed since the last build.
+
+    The build state (checksum of every source file, kept, indexed and constant columns) is
+    stored in dico_folder next to the dictionaries. The dictionaries are reloaded and new
+    values are appended to them, so existing codes never change. Years whose source file,
+    output file and settings are unchanged are not rewritten and stay byte-identical.
+
+    The first build, or a build whose settings or correction file changed, processes every
+    year and decides which columns to keep and index over all of them, exactly as the
+    in-memory pipeline does. So does a build whose changed years give a second value to a
+    column dropped as constant. The years without a source file are skipped.
+
+    Args:
+        input_file_path (str): Path to the csv input files (without the year and extension).
+        start (int): The first year to build.
+        end (int): The last year to build.
+        output_file_name (str): The base name for output files.
+        erased_columns (list[str]): The column names to erase.
+        dico_folder (str): The folder of the dictionaries and of the build state.
+        col_multiple (str): The column name of the year, removed from the output.
+        max_limit (int): The maximum limit for distinct elements of indexed columns.
+        delimiter (str): The delimiter used in the csv files.
+        workers (int): The number of worker processes reading the changed years.
+        file_extensions (list): The formats of the yearly files, see compresser.output_file.
+        validation_thresholds (dict|None): If given, the changed years are checked and nothing is
+            written when a check exceeds its threshold, see validation.DataValidator.
+        engine (str): The csv reader, see readers.read_csv.
+        executor (Executor|None): If given, the changed years are compressed and written by this executor.
+
+    Returns:
+        list: The years that were rebuilt.
+    """
+    state_path = dico_folder+STATE_FILE_NAME
+    state = compresser.open_json_file(state_path, cache=False) if os.path.exists(state_path+".json") else {}
+    settings = {
+        "erased_columns": list(erased_columns),
+        "col_multiple": col_multiple,
+        "max_limit": max_limit,
+        "corrections": file_checksum(CORRECTION_FILE_PATH),
+        "file_extensions": sorted(file_extensions),
+    }
+    full_build = state.get("settings") != settings or "header" not in state or "constants" not in state
+    sources = {} if full_build else state.get("sources", {})
+
+    # Find the years to rebuild, the years without a source file are left as they are
+    checksums = {}
+    changed_years = []
+    for year in range(start, end + 1):
+        if not os.path.exists(f"{input_file_path}_{year}.csv"):
+            print(f"Missing source file {input_file_path}_{year}.csv, year {year} skipped.")
+            continue
+        checksums[year] = file_checksum(f"{input_file_path}_{year}.csv")
+        source = sources.get(str(year), {})
+        output_unchanged = all(
+            file_checksum(compresser.output_path(f"{output_file_name}_{year}", extension)) == source.get("outputs", {}).get(extension)
+            for extension in file_extensions
+        )
+        if full_build or source.get("source") != checksums[year] or not output_unchanged:
+            changed_years.append(year)
+    if not changed_years:
+        print("All yearly files are up to date.")
+        return []
+
+    dico_N890 = cached_json(CORRECTION_FILE_PATH)
+    prepare = compresser.prepare_file if validation_thresholds is None else compresser.prepare_validated_file
+
+    def prepare_years(years:list[int]) -> dict[int, Table|tuple[Table, DataValidator]]:
+        file_names = [f"{input_file_path}_{year}.csv" for year in years]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                prepared = [metrics.collect(measured) for measured in pool.map(
+                    metrics.run_measured,
+                    [prepare] * len(file_names),
+                    file_names,
+                    [erased_columns] * len(file_names),
+                    [dico_N890] * len(file_names),
+                    [delimiter] * len(file_names),
+                    [engine] * len(file_names),
+                )]
+        else:
+            prepared = [prepare(file_name, erased_columns, dico_N890, delimiter, engine, content) for file_name, content in prefetch_files(file_names)]
+        return dict(zip(years, prepared))
+
+    prepared = prepare_years(changed_years)
+
+    # A column dropped for having one value must be kept as soon as a changed year brings
+    # another one, which only a full build can do
+    if not full_build:
+        for name, constant in state["constants"].items():
+            values = {constant}
+            for table in prepared.values():
+                table = table if validation_thresholds is None else table[0]
+                if name in table.header:
+                    index = table.header.index(name)
+                    values.update(str(value) for value in table.categories[index][np.unique(table.codes[index])])
+            if len(values) > 1:
+                print(f"Warning: column {name} was dropped for its single value {constant!r} but now has {len(values)} values, every year is rebuilt.")
+                full_build = True
+                sources = {}
+                changed_years = sorted(checksums)
+                prepared |= prepare_years([year for year in changed_years if year not in prepared])
+                break
+
+    if validation_thresholds is not None:
+        validator = DataValidator()
+        for year in changed_years:
+            validator.merge(prepared[year][1])
+        if not validator.validate(dico_folder, validation_thresholds):
+            metrics.error("validate", "build stopped")
+            print("Build stopped by the validation, no file was written.")
+            return []
+        prepared = {year: table for year, (table, _) in prepared.items()}
+    tables = {year: prepared[year] for year in changed_years}
+
+    # Decide the kept and indexed columns, only on a full build
+    if full_build:
+        all_data = Table.concat(list(tables.values()))
+        all_count = compresser.count_all_columns(all_data)
+        kept_header = [name for name, count in zip(all_data.header, all_count) if count > 1]
+        constants = {
+            name: str(all_data.categories[i][all_data.codes[i][0]])
+            for i, (name, count) in enumerate(zip(all_data.header, all_count)) if count == 1 and name != col_multiple
+        }
+        out_header = [name for name in kept_header if name != col_multiple]
+        indexed = [name for name in out_header if all_count[all_data.header.index(name)] < max_limit]
+        dicos = {name: {} for name in indexed}
+    else:
+        out_header = state["header"]
+        indexed = state["indexed"]
+        constants = state["constants"]
+        dicos = {name: load_dictionary(dico_folder+name) for name in indexed}
+    dico_sizes = {name: len(dico) for name, dico in dicos.items()}
+
+    # Encode the changed years in order, so that new dictionary codes are stable, and write them
+    pending_writes = []
+    for year in changed_years:
+        file_data = compresser.encode_columns(tables[year], out_header, indexed, dicos)
+        if executor is None:
+            compresser.output_file(output_file_name+"_"+str(year), file_data, out_header, file_extensions=file_extensions)
+        else:
+            pending_writes.append(executor.submit(compresser.output_file, output_file_name+"_"+str(year), file_data, out_header, file_extensions=file_extensions))
+    for pending_write in pending_writes:
+        pending_write.result()
+
+    for year in changed_years:
+        sources[str(year)] = {
+            "source": checksums[year],
+            "outputs": {extension: file_checksum(compresser.output_path(f"{output_file_name}_{year}", extension)) for extension in file_extensions},
+            "rows": len(tables[year]),
+        }
+
+    # Output the dictionaries that gained values
+    if full_build:
+        compresser.json_list_output_file(dico_folder+"header", out_header)
+    for name, dico in dicos.items():
+        if full_build or len(dico) != dico_sizes[name]:
+            compresser.json_output_file(dico_folder+name, compresser.revert_dict(dico))
+        if not full_build and len(dico) >= max_limit > dico_sizes[name]:
+            print(f"Warning: column {name} now has {len(dico)} distinct elements, it stays indexed to keep codes stable.")
+
+    compresser.json_output_file(state_path, {
+        "settings": settings,
+        "header": out_header,
+        "indexed": indexed,
+        "constants": constants,
+        "sources": sources,
+    })
+    print(f"Rebuilt years: {changed_years}")
+    return changed_years
@@ -0,0 +1,127 @@
+import compresser as compresser
+import json
+import os
+import re
+import shutil
+import numpy as np
+from columnar_file import read_columnar_file
+from encoded_file import read_encoded_header
+from incremental import file_checksum
+
+MANIFEST_FILE_NAME = "manifest.json"
+HASH_LENGTH = 12
+
+# Formats written as a single file, the only ones that can be published under a hashed name
+HASHABLE_EXTENSIONS = ["npz", "bin", "bin.gz", "rle", "rle.gz"]
+
+
+def describe_file(file_path:str, extension:str, header:list[str]) -> tuple[int, dict[str, str]]:
+    """
+    Returns the number of rows and the dtype of every column as stored in a yearly file.
+
+    Args:
+        file_path (str): Path to the file.
+        extension (str): Its format, see compresser.output_file.
+        header (list[str]): The header of the indexed data.
+    Returns:
+        tuple: The number of rows and the dtype of every column, as written in the file.
+    """
+    if extension in ["bin", "bin.gz"]:
+        columns = read_columnar_file(file_path)
+        return len(next(iter(columns.values()))), {name: column.dtype.name for name, column in columns.items()}
+    if extension == "npz":
+        with np.load(file_path) as npz:
+            data = npz["data"]
+        return len(data), {name: data.dtype.name for name in header}
+    # The files written before the dtypes were recorded only held int32 columns
+    description = read_encoded_header(file_path)
+    return description["rows"], {column["name"]: column.get("dtype", "int32") for column in description["columns"]}
+
+
+def hashed_file_name(file_name:str, extension:str, sha256:str) -> str:
+    """
+    Inserts the start of the hash before the extension: data_2024.npz becomes data_2024.<hash>.npz.
+    """
+    return f"{file_name.removesuffix('.'+extension)}.{sha256[:HASH_LENGTH]}.{extension}"
+
+
+def write_build_manifest(
+        output_file_name:str,
+        start:int,
+        end:int,
+        dico_folder:str,
+        file_extensions:list[str]=["npz"],
+        output_folder:str|None=None,
+    ) -> dict:
+    """
+    Copies the yearly files under content-hashed names and writes the manifest listing them.
+
+    data_<year>.<ext> is copied to <output_folder>data_<year>.<hash>.<ext>, <hash> being the
+    start of the SHA-256 of the file, and the older hashed copies of the same year and format
+    are removed. When the yearly files are kept in another folder, for the query, the rollups
+    and the incremental builds, their fixed-name copies left in output_folder by a former
+    build are removed so that every year is published once.
+    The writers being deterministic, an unchanged year keeps its name, so the hashed files
+    can be served with immutable, far-future cache headers. Only manifest.json, written
+    next to the files, must be revalidated:
+    {"version", "header", "years": {year: {"rows", "files": {ext: {"file", "sha256", "bytes", "dtypes"}}}}}.
+
+    Args:
+        output_file_name (str): The base name of the yearly files.
+        start (int): The first year.
+        end (int): The last year.
+        dico_folder (str): The folder of header.json.
+        file_extensions (list[str]): The formats to publish, the ones not written as a single file are skipped.
+        output_folder (str|None): The published folder, the folder of the yearly files if None.
+    Returns:
+        dict: The manifest.
+    """
+    header = compresser.open_json_file(dico_folder+"header")
+    data_folder = os.path.dirname(output_file_name) or "."
+    output_folder = output_folder or data_folder
+    separate = os.path.abspath(output_folder) != os.path.abspath(data_folder)
+    skipped = [extension for extension in file_extensions if extension not in HASHABLE_EXTENSIONS]
+    if skipped:
+        print(f"Formats {skipped} are not single files, they are not added to the manifest.")
+    if separate:
+        # The chunks are fetched by byte ranges under their fixed name, with their json manifest.
+        # The npy store is only read by query.py and stays with the yearly files.
+        for extension in [extension for extension in skipped if extension != "npy"]:
+            for year in range(start, end + 1):
+                for file_path in [f"{output_file_name}_{year}.{extension}", f"{output_file_name}_{year}.{extension}.json"]:
+                    if os.path.exists(file_path):
+                        shutil.copyfile(file_path, os.path.join(output_folder, os.path.basename(file_path)))
+
+    years = {}
+    for year in range(start, end + 1):
+        files = {}
+        for extension in file_extensions:
+            if extension in skipped:
+                continue
+            file_path = f"{output_file_name}_{year}.{extension}"
+            if not os.path.exists(file_path):
+                continue
+            sha256 = file_checksum(file_path)
+            file_name = hashed_file_name(os.path.basename(file_path), extension, sha256)
+
+            # Remove the copies of former builds of this year and format
+            published_path = os.path.join(output_folder, os.path.basename(file_path))
+            if separate and os.path.exists(published_path):
+                os.remove(published_path)
+            stale = re.compile(re.escape(os.path.basename(file_path).removesuffix('.'+extension)) + r"\.[0-9a-f]{%d}\.%s$" % (HASH_LENGTH, re.escape(extension)))
+            for existing in os.listdir(output_folder):
+                if stale.match(existing) and existing != file_name:
+                    os.remove(os.path.join(output_folder, existing))
+            if not os.path.exists(os.path.join(output_folder, file_name)):
+                shutil.copyfile(file_path, os.path.join(output_folder, file_name))
+
+            rows, dtypes = describe_file(file_path, extension, header)
+            files[extension] = {"file": file_name, "sha256": sha256, "bytes": os.path.getsize(file_path), "dtypes": dtypes}
+        if files:
+            years[str(year)] = {"rows": rows, "files": files}
+
+    manifest = {"version": 1, "header": header, "years": years}
+    with open(os.path.join(output_folder, MANIFEST_FILE_NAME), mode='w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=4)
+    print(f"Successfully wrote the build manifest of {len(years)} years.")
+    return manifest
@@ -0,0 +1,377 @@
+import cProfile
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable
+from contextlib import contextmanager
+from cache import cache_stats
+
+PROFILERS = ["cprofile", "tracemalloc"]
+PROMETHEUS_PREFIX = "wood_build"
+TRACEMALLOC_TOP = 10
+
+# The cProfile profiles by statistics file, shared by the metrics of a process so that the
+# runs of a stage (once per file for the per-file stages) add up
+_profiles:dict[str, cProfile.Profile] = {}
+
+# Structured logs: one JSON object per event, see log_to
+logger = logging.getLogger("wood.metrics")
+logger.addHandler(logging.NullHandler())
+
+
+def peak_rss() -> int:
+    """
+    Returns the peak resident memory of the process in bytes.
+    """
+    try:
+        with open("/proc/self/status", encoding="utf-8") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss() -> bool:
+    """
+    Resets the peak resident memory of the process, only possible on Linux.
+
+    Returns:
+        bool: Whether the peak was reset, otherwise the peaks are the peak of the process so far.
+    """
+    try:
+        with open("/proc/self/clear_refs", mode='w') as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def path_size(path:str) -> int:
+    """
+    Returns the size in bytes of a file, or of the files of a folder, 0 if it does not exist.
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _escape(value:str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metrics:
+    """
+    Measures the stages of a build and counts its bytes and errors.
+
+    Every span records its wall time, the rows it received and returned, and the peak
+    resident memory of the process while it ran. Spans can be nested, the peak of a span
+    includes the peaks of its children. Counters (bytes read and written, errors by stage)
+    can be updated from any thread. Every finished span and every error is also logged as
+    one JSON object by the wood.metrics logger.
+
+    The spans of the stages given to profile run under cProfile (the statistics of all the
+    runs of the stage are dumped to profile_<stage><profile_label>.prof) or tracemalloc (the
+    largest allocations are added to the span).
+    """
+
+    def __init__(self, profile:dict[str, str]|None=None, profile_folder:str="", profile_label:str=""):
+        self.profile = dict(profile or {})
+        self.profile_folder = profile_folder
+        self.profile_label = profile_label
+        self.spans:list[dict] = []
+        self.bytes = {"read": 0, "written": 0}
+        self.errors:dict[str, int] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._open:list[dict] = []
+
+    @contextmanager
+    def span(self, name:str, rows_in:int|None=None, **labels):
+        """
+        Measures the block as the stage name. The block can set record["rows_out"].
+
+        An exception raised by the block is counted as an error of the innermost stage and raised again.
+
+        Args:
+            name (str): The name of the stage.
+            rows_in (int|None): The number of rows given to the stage.
+            labels: Other values to record, the file of a per-file stage for instance.
+        Yields:
+            dict: The record of the span.
+        """
+        record = {"name": name, "rows_in": rows_in, "rows_out": None, **labels}
+        main_thread = threading.current_thread() is threading.main_thread()
+        if main_thread:
+            # The peaks of the open spans are kept before the peak is reset for this one
+            current_peak = peak_rss()
+            for parent in self._open:
+                parent["peak_rss_bytes"] = max(parent.get("peak_rss_bytes", 0), current_peak)
+            record["peak_rss_scope"] = "stage" if reset_peak_rss() else "process"
+            self._open.append(record)
+
+        profiler = self.profile.get(name)
+        if profiler == "cprofile":
+            profile_path = os.path.join(self.profile_folder, f"profile_{name}{self.profile_label}.prof")
+            profile = _profiles.setdefault(profile_path, cProfile.Profile())
+            profile.enable()
+        elif profiler == "tracemalloc":
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            if not getattr(e, "_metrics_counted", False):
+                self.error(name, e)
+                e._metrics_counted = True
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if profiler == "cprofile":
+                profile.disable()
+                record["profile"] = profile_path
+                profile.dump_stats(profile_path)
+            elif profiler == "tracemalloc":
+                record["alloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                own_frames = [tracemalloc.Filter(False, tracemalloc.__file__)]
+                differences = tracemalloc.take_snapshot().filter_traces(own_frames).compare_to(snapshot.filter_traces(own_frames), "lineno")
+                record["alloc_top"] = [str(stat) for stat in differences[:TRACEMALLOC_TOP]]
+                if not tracing:
+                    tracemalloc.stop()
+            if main_thread:
+                self._open.remove(record)
+                record["peak_rss_bytes"] = max(record.get("peak_rss_bytes", 0), peak_rss())
+                for parent in self._open:
+                    parent["peak_rss_bytes"] = max(parent.get("peak_rss_bytes", 0), record["peak_rss_bytes"])
+            with self._lock:
+                self.spans.append(record)
+            logger.info(json.dumps({"event": "span", **record}, ensure_ascii=False, default=str))
+
+    def add_bytes(self, direction:str, count:int) -> None:
+        """
+        Counts bytes read or written.
+
+        Args:
+            direction (str): "read" or "written".
+            count (int): The number of bytes.
+        """
+        with self._lock:
+            self.bytes[direction] += count
+
+    def error(self, stage:str, exception:Exception|str) -> None:
+        """
+        Counts an error of a stage, whether it was raised again or only printed.
+
+        Args:
+            stage (str): The stage, or the function, where the error happened.
+            exception (Exception|str): The error, or its message.
+        """
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+        error_type = type(exception).__name__ if isinstance(exception, Exception) else "error"
+        logger.error(json.dumps({"event": "error", "stage": stage, "error": error_type, "message": str(exception)}, ensure_ascii=False))
+
+    def counters(self) -> dict:
+        """
+        Returns the spans and counters, to merge into the metrics of another process.
+        """
+        return {"spans": list(self.spans), "bytes": dict(self.bytes), "errors": dict(self.errors)}
+
+    def merge(self, counters:dict) -> None:
+        """
+        Adds the spans and counters of another process, see counters.
+        """
+        with self._lock:
+            self.spans.extend(counters["spans"])
+            for direction, count in counters["bytes"].items():
+                self.bytes[direction] += count
+            for stage, count in counters["errors"].items():
+                self.errors[stage] = self.errors.get(stage, 0) + count
+
+    def stages(self) -> dict[str, dict]:
+        """
+        Sums the spans by stage name.
+
+        Returns:
+            dict: {stage: {"runs", "seconds", "rows_in", "rows_out", "peak_rss_bytes"}}, in the order the stages first ran.
+        """
+        stages:dict[str, dict] = {}
+        for record in self.spans:
+            stage = stages.setdefault(record["name"], {"runs": 0, "seconds": 0.0, "rows_in": 0, "rows_out": 0, "peak_rss_bytes": 0})
+            stage["runs"] += 1
+            stage["seconds"] += record["seconds"]
+            stage["rows_in"] += record["rows_in"] or 0
+            stage["rows_out"] += record["rows_out"] or 0
+            stage["peak_rss_bytes"] = max(stage["peak_rss_bytes"], record.get("peak_rss_bytes", 0))
+        return stages
+
+    def report(self) -> dict:
+        """
+        Returns every measure of the build.
+
+        Returns:
+            dict: {"started", "seconds", "peak_rss_bytes", "bytes", "errors", "cache", "stages", "spans"},
+                cache being the counters of the shared file cache of the process (see cache.FileCache.stats).
+        """
+        return {
+            "started": self.started,
+            "seconds": time.time() - self.started,
+            "peak_rss_bytes": max([record.get("peak_rss_bytes", 0) for record in self.spans] + [peak_rss()]),
+            "bytes": dict(self.bytes),
+            "errors": dict(self.errors),
+            "cache": cache_stats(),
+            "stages": self.stages(),
+            "spans": list(self.spans),
+        }
+
+    def prometheus(self) -> str:
+        """
+        Formats the measures in the Prometheus text format, for the textfile collector of node_exporter.
+        """
+        report = self.report()
+        lines = []
+
+        def metric(name:str, kind:str, help_text:str, samples:list[tuple[dict[str, str], float]]) -> None:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{'{'+label_text+'}' if label_text else ''} {value}")
+
+        stages = report["stages"]
+        metric("started_timestamp_seconds", "gauge", "Start of the build, in seconds since the epoch.", [({}, report["started"])])
+        metric("duration_seconds", "gauge", "Wall time of the build.", [({}, report["seconds"])])
+        metric("peak_rss_bytes", "gauge", "Peak resident memory of the build.", [({}, report["peak_rss_bytes"])])
+        metric("success", "gauge", "1 if no error was counted, 0 otherwise.", [({}, int(not report["errors"]))])
+        metric("bytes_total", "counter", "Bytes of the csv files read and of the files written.", [({"direction": direction}, count) for direction, count in report["bytes"].items()])
+        metric("errors_total", "counter", "Errors by stage, raised or only printed.", [({"stage": stage}, count) for stage, count in report["errors"].items()])
+        metric("cache_requests_total", "counter", "Loads through the shared file cache, by result.", [({"result": result}, report["cache"][result]) for result in ["hits", "misses"]])
+        metric("cache_evictions_total", "counter", "Entries evicted from the shared file cache to stay within its budget.", [({}, report["cache"]["evictions"])])
+        metric("cache_bytes", "gauge", "Memory held by the shared file cache at the end of the build.", [({}, report["cache"]["bytes"])])
+        metric("cache_max_bytes", "gauge", "Memory budget of the shared file cache.", [({}, report["cache"]["max_bytes"])])
+        metric("stage_runs_total", "counter", "Number of runs of every stage (once per file for the per-file stages).", [({"stage": name}, stage["runs"]) for name, stage in stages.items()])
+        metric("stage_seconds_total", "counter", "Wall time of every stage.", [({"stage": name}, stage["seconds"]) for name, stage in stages.items()])
+        metric("stage_rows_in_total", "counter", "Rows given to every stage.", [({"stage": name}, stage["rows_in"]) for name, stage in stages.items()])
+        metric("stage_rows_out_total", "counter", "Rows returned by every stage.", [({"stage": name}, stage["rows_out"]) for name, stage in stages.items()])
+        metric("stage_peak_rss_bytes", "gauge", "Peak resident memory during every stage.", [({"stage": name}, stage["peak_rss_bytes"]) for name, stage in stages.items()])
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_file_path:str) -> None:
+        """
+        Writes the measures to a file, in the Prometheus text format if its extension is .prom, as JSON otherwise.
+
+        The file is replaced atomically, a collector never reads a partial file.
+
+        Args:
+            output_file_path (str): Path to the output file.
+        """
+        content = self.prometheus() if output_file_path.endswith(".prom") else json.dumps(self.report(), ensure_ascii=False, indent=4, default=str)
+        try:
+            with open(output_file_path+".tmp", mode='w', encoding='utf-8') as output_file:
+                output_file.write(content)
+            os.replace(output_file_path+".tmp", output_file_path)
+            print(f"Successfully wrote the metrics to {output_file_path}.")
+        except Exception as e:
+            print(f"Error writing the metrics: {e}")
+
+
+def log_to(output_file_path:str) -> None:
+    """
+    Appends the structured logs of the metrics to a file, one JSON object per line.
+
+    Args:
+        output_file_path (str): Path to the log file.
+    """
+    handler = logging.FileHandler(output_file_path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('{"time": "%(asctime)s", "level": "%(levelname)s", "record": %(message)s}'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+# The metrics of the current process, updated by the pipeline functions
+METRICS = Metrics()
+
+
+def span(name:str, rows_in:int|None=None, **labels):
+    """
+    Measures a stage with the metrics of the process, see Metrics.span.
+    """
+    return METRICS.span(name, rows_in, **labels)
+
+
+def add_bytes(direction:str, count:int) -> None:
+    """
+    Counts bytes with the metrics of the process, see Metrics.add_bytes.
+    """
+    METRICS.add_bytes(direction, count)
+
+
+def error(stage:str, exception:Exception|str) -> None:
+    """
+    Counts an error with the metrics of the process, see Metrics.error.
+    """
+    METRICS.error(stage, exception)
+
+
+def run_measured(function:Callable, *args):
+    """
+    Runs a function in a worker process with new metrics, whose counters are returned with its result.
+
+    The metrics of a worker process are not those of the build, submit run_measured with
+    the function to a process pool and pass its results to collect. The cProfile statistics
+    of a worker are written to profile_<stage>_<pid>.prof.
+
+    Returns:
+        tuple: The result of the function and the counters of the worker.
+    """
+    global METRICS
+    METRICS = Metrics(METRICS.profile, METRICS.profile_folder, f"_{os.getpid()}")
+    result = function(*args)
+    return result, METRICS.counters()
+
+
+def collect(measured:tuple):
+    """
+    Merges the counters of a result of run_measured into the metrics of the process.
+
+    Returns:
+        The result of the function.
+    """
+    result, counters = measured
+    METRICS.merge(counters)
+    return result
+
+
+def configure(profile:dict[str, str]|None=None, profile_folder:str="", stages:list[str]|None=None) -> Metrics:
+    """
+    Replaces the metrics of the process, to profile some stages.
+
+    Args:
+        profile (dict|None): The profiler of the stages to profile, one of PROFILERS by stage name.
+        profile_folder (str): The folder of the cProfile statistics.
+        stages (list[str]|None): The names of the spans the build runs, to reject the stages
+            that would never be profiled. Not checked if None.
+    Returns:
+        Metrics: The new metrics of the process.
+    """
+    global METRICS
+    for stage, profiler in (profile or {}).items():
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler} for stage {stage}, expected one of {PROFILERS}.")
+        if stages is not None and stage not in stages:
+            raise ValueError(f"Unknown stage {stage}, expected one of {stages}.")
+    METRICS = Metrics(profile, profile_folder)
+    return METRICS
@@ -0,0 +1,306 @@
+import compresser as compresser
+import metrics
+from collections.abc import Callable
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+import numpy as np
+from readers import prefetch_files, read_csv
+from table import Table
+from validation import DEFAULT_THRESHOLDS, VALIDATED_COLUMNS, DataValidator
+
+# The stages of the in-memory build of compresser.py, when no --pipeline file is given
+DEFAULT_PIPELINE = [
+    {"stage": "correct_N890"},
+    {"stage": "validate"},
+    {"stage": "drop", "columns": ["GEOGRAPHIE_LIB", "N027_MOD", "N053_MOD", "N890_MOD"]},
+    {"stage": "drop_constant"},
+    {"stage": "index", "col_multiple": "ANNREF", "max_limit": 250},
+]
+
+
+@dataclass
+class Stage:
+    """
+    One step of a pipeline, only run when the pipeline is.
+
+    Attributes:
+        name (str): The name of the stage, a key of STAGES.
+        row_wise (bool): Whether the stage transforms every file on its own, it is then fused
+            into the read of the files. The other stages need the table of all the files.
+        reads (list[str]|None): The columns the stage reads, None for every column.
+        drops (list[str]): The columns the stage removes, known before reading the data.
+        apply (Callable): Runs the stage on a table, with the shared state of the run.
+        finish (Callable|None): Called once every file went through the row-wise stages,
+            returns False to stop the build before any file is written.
+    """
+    name: str
+    row_wise: bool
+    reads: list[str]|None
+    drops: list[str] = field(default_factory=list)
+    apply: Callable[[Table, dict], Table] = lambda data, state: data
+    finish: Callable[[dict], bool]|None = None
+
+
+def correct_N890_stage(dico_N890:dict|None=None) -> Stage:
+    """
+    Stage of compresser.correcter_N890.
+    """
+    return Stage(
+        "correct_N890", True, compresser.CORRECTION_COLUMNS,
+        apply=lambda data, state: compresser.correcter_N890(data, data.header, dico_N890),
+    )
+
+
+def validate_stage() -> Stage:
+    """
+    Stage checking the rows with a validation.DataValidator, file by file, before anything is written.
+    """
+    def apply(data:Table, state:dict) -> Table:
+        state.setdefault("validator", DataValidator()).update(data)
+        return data
+
+    def finish(state:dict) -> bool:
+        return state.setdefault("validator", DataValidator()).validate(state["dico_folder"], state["validation_thresholds"])
+
+    return Stage("validate", True, VALIDATED_COLUMNS, apply=apply, finish=finish)
+
+
+def drop_stage(columns:list[str]) -> Stage:
+    """
+    Stage of compresser.erased_specific_column, the columns absent from the data are ignored.
+    """
+    return Stage(
+        "drop", True, [], list(columns),
+        apply=lambda data, state: data.drop([data.header.index(name) for name in columns if name in data.header]),
+    )
+
+
+def drop_constant_stage() -> Stage:
+    """
+    Stage of compresser.erased_one_value_column, on the number of categories of every column of all the files.
+    """
+    return Stage(
+        "drop_constant", False, None,
+        apply=lambda data, state: compresser.erased_one_value_column(data, data.header, data.distinct_counts())[0],
+    )
+
+
+def index_stage(col_multiple:str="ANNREF", max_limit:int=250) -> Stage:
+    """
+    Stage of compresser.multiple_indexation_columns, writing the dictionaries and the yearly files.
+    """
+    def apply(data:Table, state:dict) -> Table:
+        state["indexed"] = compresser.multiple_indexation_columns(
+            data,
+            data.header,
+            state["output_file_name"],
+            dico_folder=state["dico_folder"],
+            col_multiple=col_multiple,
+            max_limit=max_limit,
+            executor=state["executor"],
+            file_extensions=state["file_extensions"],
+        )
+        return data
+
+    return Stage("index", False, None, apply=apply)
+
+
+STAGES:dict[str, Callable[..., Stage]] = {
+    "correct_N890": correct_N890_stage,
+    "validate": validate_stage,
+    "drop": drop_stage,
+    "drop_constant": drop_constant_stage,
+    "index": index_stage,
+}
+
+
+class Pipeline:
+    """
+    Lazy pipeline of stages, planned as a whole before reading the data.
+
+    Registering a stage runs nothing. When the pipeline is run, the planner:
+        - fuses the leading row-wise stages into the read of every file, so they run file by
+          file and the table of all the files is only built once, from their output,
+        - removes every dropped column right after the last stage reading it, and leaves the
+          ones that no stage reads out of the reader (see readers.read_csv), so they are
+          never decoded,
+        - runs the other stages once on the table of all the files.
+    """
+
+    def __init__(self, stages:list[Stage]|None=None):
+        self.stages = list(stages or [])
+
+    @classmethod
+    def from_config(cls, config:list[dict]) -> "Pipeline":
+        """
+        Builds a pipeline from its configuration, see DEFAULT_PIPELINE.
+
+        Args:
+            config (list[dict]): The stages in order, {"stage": name, **options} with name a key of STAGES.
+        Returns:
+            Pipeline: The pipeline.
+        """
+        pipeline = cls()
+        for stage_config in config:
+            options = dict(stage_config)
+            pipeline.add(options.pop("stage"), **options)
+        return pipeline
+
+    def add(self, name:str, **options) -> "Pipeline":
+        """
+        Registers a stage at the end of the pipeline.
+
+        Args:
+            name (str): The name of the stage, a key of STAGES.
+            options: The options of the stage.
+        Returns:
+            Pipeline: The pipeline itself, to chain the stages.
+        """
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage {name}, expected one of {list(STAGES)}.")
+        self.stages.append(STAGES[name](**options))
+        return self
+
+    def without(self, name:str) -> "Pipeline":
+        """
+        Returns a copy of the pipeline without the stages of the given name.
+        """
+        return Pipeline([stage for stage in self.stages if stage.name != name])
+
+    def plan(self) -> dict:
+        """
+        Plans the run of the pipeline.
+
+        Returns:
+            dict: {"skipped_columns": the columns left out of the reader,
+                   "file_stages": the fused row-wise stages and the columns removed after each,
+                   "table_stages": the other stages and the columns removed after each}.
+        """
+        file_count = next((i for i, stage in enumerate(self.stages) if not stage.row_wise), len(self.stages))
+        removals:list[list[str]] = [[] for _ in self.stages]
+        skipped_columns:list[str] = []
+        for stage_index, stage in enumerate(self.stages):
+            for name in stage.drops:
+                readers = [i for i in range(stage_index) if self.stages[i].reads is None or name in self.stages[i].reads]
+                if readers:
+                    removals[readers[-1]].append(name)
+                elif name not in skipped_columns:
+                    skipped_columns.append(name)
+
+        # The drop stages are replaced by the removals
+        steps = [(stage, removed) for stage, removed in zip(self.stages, removals)]
+        return {
+            "skipped_columns": skipped_columns,
+            "file_stages": [step for step in steps[:file_count] if step[0].name != "drop"],
+            "table_stages": [step for step in steps[file_count:] if step[0].name != "drop"],
+        }
+
+    def describe(self) -> str:
+        """
+        Returns the plan as text, one line per step.
+        """
+        plan = self.plan()
+        lines = [f"read files, skipping {plan['skipped_columns']}"]
+        for kind in ["file_stages", "table_stages"]:
+            for stage, removed in plan[kind]:
+                lines.append(f"{'per file' if kind == 'file_stages' else 'all files'}: {stage.name}" + (f", then remove {removed}" if removed else ""))
+        return "\n".join(lines)
+
+    def span_names(self) -> list[str]:
+        """
+        Returns the names of the spans measured when the pipeline is run, see metrics.span.
+        """
+        plan = self.plan()
+        names = ["read_csv", "concat"]
+        for stage, _ in plan["file_stages"] + plan["table_stages"]:
+            names.append(stage.name)
+            if stage.finish is not None:
+                names.append(stage.name+"_finish")
+        return names
+
+    def run(
+            self,
+            input_file_path:str,
+            start:int|None,
+            end:int|None,
+            output_file_name:str,
+            dico_folder:str="",
+            delimiter:str=";",
+            engine:str="block",
+            executor:Executor|None=None,
+            file_extensions:list[str]=["npz"],
+            validation_thresholds:dict|None=DEFAULT_THRESHOLDS,
+        ) -> list[np.ndarray]:
+        """
+        Runs the pipeline on the csv files, as planned by plan.
+
+        Args:
+            input_file_path (str): Path to the csv input file (without the file extension).
+            start (int|None): The first year of the files if put.
+            end (int|None): The last year of the files if put.
+            output_file_name (str): The base name of the yearly files.
+            dico_folder (str): The folder of the dictionaries and of the validation report.
+            delimiter (str): The delimiter used in the csv files.
+            engine (str): The csv reader, see readers.read_csv.
+            executor (Executor|None): Writes the files in the background, see compresser.multiple_indexation_columns.
+            file_extensions (list): The formats of the yearly files, see compresser.output_file.
+            validation_thresholds (dict|None): The thresholds of the validate stage, see validation.DEFAULT_THRESHOLDS.
+        Returns:
+            list: The indexed data written by the index stage, empty if the build was stopped.
+        """
+        plan = self.plan()
+        print(f"Pipeline plan:\n{self.describe()}")
+        state = {
+            "output_file_name": output_file_name,
+            "dico_folder": dico_folder,
+            "executor": executor,
+            "file_extensions": file_extensions,
+            "validation_thresholds": validation_thresholds,
+            "indexed": [],
+        }
+
+        if start is None or end is None:
+            file_names = [f"{input_file_path}.csv"]
+        else:
+            file_names = [f"{input_file_path}_{i}.csv" for i in range(start, end + 1)]
+        tables:list[Table] = []
+        try:
+            for file_name, content in prefetch_files(file_names):
+                with metrics.span("read_csv", file=file_name) as record:
+                    data = read_csv(file_name, delimiter, engine, content, plan["skipped_columns"])
+                    record["rows_out"] = len(data)
+                tables.append(run_steps(data, plan["file_stages"], state, file=file_name))
+                print(f"Successfully opened file {file_name}.")
+        except Exception as e:
+            metrics.error("open_files", e)
+            print(f"Error opening files: {e}")
+
+        for stage, _ in plan["file_stages"]:
+            if stage.finish is None:
+                continue
+            with metrics.span(stage.name+"_finish"):
+                passed = stage.finish(state)
+            if not passed:
+                metrics.error(stage.name, "build stopped")
+                print("Build stopped by the validation, no file was written.")
+                return []
+
+        with metrics.span("concat", sum(len(table) for table in tables)) as record:
+            data = Table.concat(tables)
+            record["rows_out"] = len(data)
+        run_steps(data, plan["table_stages"], state)
+        return state["indexed"]
+
+
+def run_steps(data:Table, steps:list[tuple[Stage, list[str]]], state:dict, **labels) -> Table:
+    """
+    Applies planned stages to a table, removing the columns planned after each of them.
+    Every stage is measured as a span of the metrics, with the given labels.
+    """
+    for stage, removed in steps:
+        with metrics.span(stage.name, len(data), **labels) as record:
+            data = stage.apply(data, state)
+            if removed:
+                data = data.drop([data.header.index(name) for name in removed if name in data.header])
+            record["rows_out"] = len(data)
+    return data
@@ -0,0 +1,296 @@
+"""
+Filters, groups and aggregates the indexed yearly files on decoded column names.
+
+Usage:
+    python query.py --where N027_LIB="Importation (valeur)" --where GEOGRAPHIE_MOD=DE --group-by ANNREF N053_LIB --start 2015 --end 2024
+"""
+import argparse
+import compresser as compresser
+import csv
+import json
+import numpy as np
+import os
+import sys
+from cache import DEFAULT_MAX_BYTES, cached_year, configure_cache
+from store import HEADER_FILE_NAME, ColumnStore
+
+YEAR_COLUMN = "ANNREF"
+VALUE_COLUMN = "VALEUR"
+AGGREGATES = ["sum", "count", "min", "max", "mean"]
+
+
+def _year_file(output_file_name:str, year:int) -> str|None:
+    """
+    Returns the most recent file of a year: the header of its npy store or its npz file.
+    """
+    paths = [path for path in [os.path.join(f"{output_file_name}_{year}", HEADER_FILE_NAME), f"{output_file_name}_{year}.npz"] if os.path.exists(path)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def load_year_columns(output_file_name:str, year:int, header:list[str]) -> dict[str, np.ndarray]|None:
+    """
+    Loads the columns of one year, lazily from the npy store when it is up to date, from the npz file otherwise.
+
+    Args:
+        output_file_name (str): The base name of the yearly files.
+        year (int): The year to load.
+        header (list[str]): The header of the indexed data.
+    Returns:
+        dict|None: The columns by name (memory maps for the store), None if the year is missing.
+    """
+    path = _year_file(output_file_name, year)
+    if path is None:
+        return None
+    if path.endswith(HEADER_FILE_NAME):
+        store = ColumnStore(os.path.dirname(path))
+        return {name: store[name] for name in store.header}
+    data = cached_year(path)
+    return {name: data[:, i] for i, name in enumerate(header)}
+
+
+def year_index(output_file_name:str, start:int, end:int, header:list[str], indexed:list[str], index_path:str) -> dict[str, dict]:
+    """
+    Returns the per-year index used to skip the years that can not match a query.
+
+    For every year: the min/max of every column and the sorted codes present in every indexed
+    column. The index is saved to index_path and a year is only indexed again when its file,
+    or the mtime or size of that file, changed.
+
+    Args:
+        output_file_name (str): The base name of the yearly files.
+        start (int): The first year.
+        end (int): The last year.
+        header (list[str]): The header of the indexed data.
+        indexed (list[str]): The columns encoded with a dictionary.
+        index_path (str): The JSON file of the index, out of the published folder (see run_query).
+    Returns:
+        dict: The index of every year found, by year as a string.
+    """
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, mode='r', encoding='utf-8') as index_file:
+            index = json.load(index_file)
+
+    changed = False
+    for year in range(start, end + 1):
+        path = _year_file(output_file_name, year)
+        if path is None:
+            index.pop(str(year), None)
+            continue
+        signature = [path, os.path.getmtime(path), os.path.getsize(path)]
+        if index.get(str(year), {}).get("signature") == signature:
+            continue
+        columns = load_year_columns(output_file_name, year, header)
+        index[str(year)] = {
+            "signature": signature,
+            "rows": len(columns[header[0]]),
+            "columns": {
+                name: {
+                    "min": column.min().item() if len(column) else None,
+                    "max": column.max().item() if len(column) else None,
+                    "codes": np.unique(column).tolist() if name in indexed else None,
+                }
+                for name, column in columns.items()
+            },
+        }
+        changed = True
+
+    if changed:
+        with open(index_path, mode='w', encoding='utf-8') as index_file:
+            json.dump(index, index_file)
+    return index
+
+
+def translate_filters(where:dict[str, list[str]], dicos:dict[str, dict[str, str]]) -> dict[str, np.ndarray]:
+    """
+    Translates the decoded values of the filters to the codes of the indexed files.
+
+    Args:
+        where (dict): The accepted values of every filtered column.
+        dicos (dict): The exported dictionaries (code to value) by column name.
+    Returns:
+        dict: The accepted codes of every filtered column, empty when no value is known.
+    """
+    codes = {}
+    for name, values in where.items():
+        if name not in dicos:
+            raise ValueError(f"{name} is not an indexed column, filter it with a range.")
+        reverse = compresser.revert_dict(dicos[name])
+        unknown = [value for value in values if value not in reverse]
+        if unknown:
+            print(f"Unknown values for {name}: {unknown}", file=sys.stderr)
+        codes[name] = np.array(sorted(int(reverse[value]) for value in values if value in reverse), dtype=np.int64)
+    return codes
+
+
+def can_match(year_entry:dict, codes:dict[str, np.ndarray], ranges:dict[str, tuple[int|None, int|None]]) -> bool:
+    """
+    Tells from the index of a year whether some of its rows may match the filters.
+    """
+    for name, accepted in codes.items():
+        if not np.isin(accepted, year_entry["columns"][name]["codes"]).any():
+            return False
+    for name, (low, high) in ranges.items():
+        column = year_entry["columns"][name]
+        if column["min"] is None:
+            return False
+        if (low is not None and column["max"] < low) or (high is not None and column["min"] > high):
+            return False
+    return True
+
+
+def run_query(
+        output_file_name:str,
+        dico_folder:str,
+        start:int,
+        end:int,
+        where:dict[str, list[str]]|None=None,
+        ranges:dict[str, tuple[int|None, int|None]]|None=None,
+        group_by:list[str]|None=None,
+        aggregate:str="sum",
+        value_column:str=VALUE_COLUMN,
+    ) -> tuple[list[str], list[list]]:
+    """
+    Filters the indexed yearly files, groups the rows and aggregates their values.
+
+    The filter values are translated to codes once, each year is then filtered with vectorized
+    masks, and the years whose index shows they can not match are not loaded at all.
+
+    Args:
+        output_file_name (str): The base name of the yearly files.
+        dico_folder (str): The folder of the header and of the dictionaries.
+        start (int): The first year.
+        end (int): The last year.
+        where (dict|None): The accepted decoded values of indexed columns, e.g. {"GEOGRAPHIE_MOD": ["DE", "IT"]}.
+        ranges (dict|None): The inclusive (low, high) bounds of columns, None for an open bound.
+        group_by (list[str]|None): The columns to group by, ANNREF being the year of the files.
+        aggregate (str): One of "sum", "count", "min", "max" and "mean".
+        value_column (str): The column to aggregate.
+    Returns:
+        tuple: The header of the result and its rows, in the order of the group codes, with decoded values.
+    """
+    where = where or {}
+    ranges = dict(ranges or {})
+    group_by = group_by or []
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate {aggregate}, expected one of {AGGREGATES}.")
+
+    # The messages go to stderr, stdout only holds the result
+    header = compresser.open_json_file(dico_folder+"header", quiet=True)
+    indexed = [name for name in header if os.path.exists(dico_folder+name+".json")]
+    dicos = {name: compresser.open_json_file(dico_folder+name, quiet=True) for name in indexed}
+    codes = translate_filters(where, dicos)
+    for name in list(group_by) + list(ranges) + [value_column]:
+        if name != YEAR_COLUMN and name not in header:
+            raise ValueError(f"Unknown column {name}.")
+    # The index is only used by the queries, it is kept with the dictionaries rather than published
+    index = year_index(output_file_name, start, end, header, indexed, dico_folder+os.path.basename(output_file_name)+"_index.json")
+
+    # The year is not stored in the files, its range only restricts the years to read
+    low, high = ranges.pop(YEAR_COLUMN, (None, None))
+    first_year = start if low is None else max(start, low)
+    last_year = end if high is None else min(end, high)
+
+    keys:list[list[np.ndarray]] = []
+    values:list[np.ndarray] = []
+    for year in range(first_year, last_year + 1):
+        if str(year) not in index or not can_match(index[str(year)], codes, ranges):
+            continue
+        columns = load_year_columns(output_file_name, year, header)
+        mask = np.ones(index[str(year)]["rows"], dtype=bool)
+        for name, accepted in codes.items():
+            mask &= np.isin(columns[name], accepted)
+        for name, (low, high) in ranges.items():
+            if low is not None:
+                mask &= columns[name] >= low
+            if high is not None:
+                mask &= columns[name] <= high
+        rows = int(np.count_nonzero(mask))
+        if not rows:
+            continue
+        keys.append([np.full(rows, year, dtype=np.int64) if name == YEAR_COLUMN else np.asarray(columns[name][mask], dtype=np.int64) for name in group_by])
+        values.append(np.asarray(columns[value_column][mask]))
+
+    result_header = group_by + [f"{aggregate}({value_column})"]
+    if not values:
+        return result_header, []
+    all_values = np.concatenate(values)
+    if not np.issubdtype(all_values.dtype, np.floating):
+        all_values = all_values.astype(np.int64)
+    if group_by:
+        all_keys = np.column_stack([np.concatenate([year_keys[i] for year_keys in keys]) for i in range(len(group_by))])
+        groups, inverse = np.unique(all_keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    else:
+        groups = np.empty((1, 0), dtype=np.int64)
+        inverse = np.zeros(len(all_values), dtype=np.int64)
+
+    counts = np.bincount(inverse, minlength=len(groups))
+    if aggregate == "count":
+        results = counts
+    elif aggregate in ["sum", "mean"]:
+        results = np.zeros(len(groups), dtype=all_values.dtype)
+        np.add.at(results, inverse, all_values)
+        if aggregate == "mean":
+            results = results / counts
+    else:
+        results = np.full(len(groups), all_values.max() if aggregate == "min" else all_values.min(), dtype=all_values.dtype)
+        (np.minimum if aggregate == "min" else np.maximum).at(results, inverse, all_values)
+
+    rows = []
+    for group, result in zip(groups, results):
+        decoded = [int(code) if name not in dicos else dicos[name][str(code)] for name, code in zip(group_by, group)]
+        rows.append(decoded + [result.item()])
+    return result_header, rows
+
+
+def _parse_where(conditions:list[str]) -> dict[str, list[str]]:
+    where:dict[str, list[str]] = {}
+    for condition in conditions:
+        name, _, value = condition.partition("=")
+        where.setdefault(name, []).append(value)
+    return where
+
+
+def _parse_ranges(conditions:list[str]) -> dict[str, tuple[int|None, int|None]]:
+    ranges = {}
+    for condition in conditions:
+        name, _, bounds = condition.partition("=")
+        low, _, high = bounds.partition(":")
+        ranges[name] = (int(low) if low else None, int(high) if high else None)
+    return ranges
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Queries the indexed yearly files.")
+    parser.add_argument("--where", action="append", default=[], help="COLUMN=VALUE filter on a decoded value, repeated values of a column are alternatives")
+    parser.add_argument("--range", action="append", default=[], help="COLUMN=LOW:HIGH inclusive filter, either bound can be empty")
+    parser.add_argument("--group-by", nargs="*", default=[], help="columns to group by, ANNREF for the year")
+    parser.add_argument("--aggregate", default="sum", choices=AGGREGATES)
+    parser.add_argument("--value", default=VALUE_COLUMN, help="column to aggregate")
+    parser.add_argument("--start", type=int, default=2012)
+    parser.add_argument("--end", type=int, default=2025)
+    parser.add_argument("--data", default="visualization/public/data/data", help="base name of the yearly files")
+    parser.add_argument("--dico-folder", default="test_result/", help="folder of the header and dictionaries")
+    parser.add_argument("--output", help="csv file to write the result to instead of printing it")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="memory budget of the cache of the yearly files, in MB")
+    args = parser.parse_args()
+    configure_cache(args.cache_mb * 1024 * 1024)
+
+    result_header, rows = run_query(
+        args.data,
+        args.dico_folder,
+        args.start,
+        args.end,
+        where=_parse_where(args.where),
+        ranges=_parse_ranges(args.range),
+        group_by=args.group_by,
+        aggregate=args.aggregate,
+        value_column=args.value,
+    )
+    if args.output:
+        compresser.output_file(args.output.removesuffix(".csv"), rows, result_header, file_extensions=["csv"])
+    else:
+        writer = csv.writer(sys.stdout, delimiter=";")
+        writer.writerow(result_header)
+        writer.writerows(rows)
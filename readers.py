@@ -0,0 +1,246 @@
+import csv
+import io
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import metrics
+from table import Table
+
+BLOCK_SIZE = 16 * 1024 * 1024
+ENGINES = ["csv", "block", "pyarrow"]
+
+
+def _pad(rows:list[list[str]], width:int) -> list[list[str]]:
+    return [row[:width] + [""] * (width - len(row)) for row in rows]
+
+
+def _columns(rows:list[list[str]], width:int, kept:list[int]) -> list[list[str]]:
+    """
+    Transposes rows into the kept columns, as Table.from_rows does: short rows are padded with "", extra fields dropped.
+    """
+    rows = _pad(rows, width)
+    return [[row[col_index] for row in rows] for col_index in kept]
+
+
+def _kept(header:list[str], skipped_columns:Iterable[str]) -> list[int]:
+    skipped_columns = set(skipped_columns)
+    return [col_index for col_index, name in enumerate(header) if name not in skipped_columns]
+
+
+def _no_header(file_name:str) -> ValueError:
+    return ValueError(f"{file_name} is empty, no header line found.")
+
+
+def _open_binary(file_name:str, content:bytes|None=None) -> io.BufferedIOBase:
+    return io.BytesIO(content) if content is not None else open(file_name, mode='rb')
+
+
+def read_bytes(file_name:str) -> bytes:
+    with open(file_name, mode='rb') as input_file:
+        return input_file.read()
+
+
+def prefetch_files(file_names:Iterable[str], depth:int=1) -> Iterator[tuple[str, bytes]]:
+    """
+    Reads files in a background thread, ahead of their processing.
+
+    While the caller processes a file, the next depth files are read by a thread (file reads
+    release the GIL), which hides the latency of slow or network-mounted storage. The files
+    are always yielded in the given order. A file that can not be read raises its error when
+    its turn comes, after the previous files were yielded.
+
+    Args:
+        file_names (Iterable[str]): The paths of the files, in processing order.
+        depth (int): The number of files read ahead.
+    Yields:
+        tuple: The path and the content of every file.
+    """
+    file_names = iter(file_names)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = deque()
+        for file_name in file_names:
+            pending.append((file_name, executor.submit(read_bytes, file_name)))
+            if len(pending) > depth:
+                break
+        while pending:
+            file_name, content = pending.popleft()
+            next_name = next(file_names, None)
+            if next_name is not None:
+                pending.append((next_name, executor.submit(read_bytes, next_name)))
+            yield file_name, content.result()
+
+
+def split_block(block:bytes, delimiter:str, width:int, kept:list[int]|None=None) -> list[list[str]]|None:
+    """
+    Splits a block of complete lines into columns, in bulk.
+
+    Fields are split with one str.split on the whole block once every line is known to
+    hold exactly width fields, which is checked on the raw bytes with numpy. Blocks the
+    fast path can not read exactly as the csv module would (quotes, lone carriage
+    returns, lines with a different number of fields) are refused.
+
+    Args:
+        block (bytes): Complete lines, the last one ending with a line feed.
+        delimiter (str): The one-character ASCII delimiter.
+        width (int): The number of fields of every line, the length of the header.
+        kept (list[int]|None): The indexes of the columns to return, all of them if None.
+    Returns:
+        list|None: The values of every kept column, None if the block must be read with the csv module.
+    """
+    kept = range(width) if kept is None else kept
+    block = block.replace(b"\r\n", b"\n")
+    if b'"' in block or b"\r" in block:
+        return None
+    data = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord("\n"))
+    if not len(ends):
+        return [[] for _ in kept]
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    fields = np.add.reduceat((data == ord(delimiter)).view(np.uint8), starts, dtype=np.int64)
+    if not np.all(fields == width - 1):
+        return None
+
+    # Invalid UTF-8 sequences are dropped as errors='ignore' does, they never contain the ASCII delimiter or line feed
+    values = block.decode("utf-8", errors="ignore").replace("\n", delimiter).split(delimiter)[:-1]
+    return [values[col_index::width] for col_index in kept]
+
+
+def read_csv_module(file_name:str, delimiter:str=";", content:bytes|None=None, skipped_columns:Iterable[str]=()) -> tuple[list[str], list[list[str]]]:
+    """
+    Reads a csv file with the csv module, line by line. The reference of the other engines.
+
+    Returns:
+        tuple: The header and the values of every column, without the skipped columns.
+    """
+    with io.TextIOWrapper(_open_binary(file_name, content), encoding='utf-8', errors='ignore', newline='') as input_file:
+        reader = csv.reader(input_file, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            raise _no_header(file_name)
+        kept = _kept(header, skipped_columns)
+        return [header[col_index] for col_index in kept], _columns(list(reader), len(header), kept)
+
+
+def read_csv_blocks(
+        file_name:str,
+        delimiter:str=";",
+        content:bytes|None=None,
+        skipped_columns:Iterable[str]=(),
+        block_size:int=BLOCK_SIZE,
+    ) -> tuple[list[str], list[list[str]]]:
+    """
+    Reads a csv file in large blocks of bytes, split into columns in bulk (see split_block).
+
+    The files of the pipeline have a fixed header, a single-character delimiter and no
+    quotes, every block is then read without looking at its lines one by one. From the
+    first block that does not have this simple layout, the rest of the file is read with
+    the csv module, so any file gives the same values as read_csv_module.
+
+    Args:
+        file_name (str): Path to the csv file.
+        delimiter (str): The delimiter used in the csv file.
+        content (bytes|None): The content of the file if already read, see prefetch_files.
+        skipped_columns (Iterable[str]): The columns never decoded, absent from the result.
+        block_size (int): The number of bytes read at once.
+    Returns:
+        tuple: The header and the values of every column, without the skipped columns.
+    """
+    with _open_binary(file_name, content) as input_file:
+        first_line = input_file.readline()
+        if not first_line:
+            raise _no_header(file_name)
+        header = next(csv.reader([first_line.decode("utf-8", errors="ignore")], delimiter=delimiter), [])
+        width = len(header)
+        kept = _kept(header, skipped_columns)
+        columns:list[list[str]] = [[] for _ in kept]
+        rest = b""
+        while True:
+            chunk = input_file.read(block_size)
+            block = rest + chunk
+            if not chunk:
+                if block and not block.endswith(b"\n"):
+                    block += b"\n"
+                rest = b""
+            else:
+                cut = block.rfind(b"\n") + 1
+                block, rest = block[:cut], block[cut:]
+            block_columns = split_block(block, delimiter, width, kept) if len(delimiter) == 1 and width else None
+            if block_columns is None:
+                # Read the remaining lines with the csv module, starting at the beginning of a line
+                text = (block + rest + input_file.read()).decode("utf-8", errors="ignore")
+                rows = list(csv.reader(io.StringIO(text, newline=''), delimiter=delimiter))
+                for column, values in zip(columns, _columns(rows, width, kept)):
+                    column.extend(values)
+                break
+            for column, values in zip(columns, block_columns):
+                column.extend(values)
+            if not chunk:
+                break
+    return [header[col_index] for col_index in kept], columns
+
+
+def read_csv_pyarrow(file_name:str, delimiter:str=";", content:bytes|None=None, skipped_columns:Iterable[str]=()) -> tuple[list[str], list[list[str]]]:
+    """
+    Reads a csv file with pyarrow's multithreaded parser, every column as strings.
+
+    pyarrow is optional, the block engine is used when it is not installed. Unlike the
+    csv module, pyarrow skips empty lines and rejects lines with a different number of fields.
+
+    Returns:
+        tuple: The header and the values of every column, without the skipped columns.
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        print("pyarrow is not installed, reading with the block engine.")
+        return read_csv_blocks(file_name, delimiter, content, skipped_columns)
+
+    content = (read_bytes(file_name) if content is None else content).decode("utf-8", errors="ignore").encode("utf-8")
+    if not content:
+        raise _no_header(file_name)
+    header = next(csv.reader([content.split(b"\n", 1)[0].decode("utf-8").rstrip("\r")], delimiter=delimiter), [])
+    table = pa_csv.read_csv(
+        io.BytesIO(content),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+        convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in header}, strings_can_be_null=False, quoted_strings_can_be_null=False),
+    )
+    kept = _kept(header, skipped_columns)
+    return [header[col_index] for col_index in kept], [table.column(col_index).to_pylist() for col_index in kept]
+
+
+READERS = {
+    "csv": read_csv_module,
+    "block": read_csv_blocks,
+    "pyarrow": read_csv_pyarrow,
+}
+
+
+def read_csv(
+        file_name:str,
+        delimiter:str=";",
+        engine:str="block",
+        content:bytes|None=None,
+        skipped_columns:Iterable[str]=(),
+    ) -> Table:
+    """
+    Reads a csv file with a header line into a table.
+
+    Args:
+        file_name (str): Path to the csv file.
+        delimiter (str): The delimiter used in the csv file.
+        engine (str): One of ENGINES: "csv" the csv module line by line, "block" the bulk
+            reader of read_csv_blocks (same result), "pyarrow" the optional pyarrow parser.
+        content (bytes|None): The content of the file if already read, see prefetch_files.
+        skipped_columns (Iterable[str]): Columns left out of the table, their values are never
+            decoded nor encoded. Names absent from the header are ignored.
+    Returns:
+        Table: The columnar table. An empty file, without a header line, raises a ValueError
+            naming it, whatever the engine.
+    """
+    if engine not in READERS:
+        raise ValueError(f"Unknown csv engine {engine}, expected one of {ENGINES}.")
+    header, columns = READERS[engine](file_name, delimiter, content, skipped_columns)
+    metrics.add_bytes("read", len(content) if content is not None else metrics.path_size(file_name))
+    return Table.from_columns(header, columns)
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Columns holding quantities, parsed as numbers. The other columns are categories,
+# stored as codes (see table.Table) and replaced by dictionary codes when indexed.
+NUMERIC_COLUMNS = ["VALEUR"]
+
+CODE_DTYPES = [np.uint8, np.uint16, np.uint32]
+INT32_RANGE = (int(np.iinfo(np.int32).min), int(np.iinfo(np.int32).max))
+FLOAT64_EXACT = 2**53
+
+
+def code_dtype(count:int) -> np.dtype:
+    """
+    Returns the narrowest unsigned dtype able to store the codes of count categories.
+    """
+    return np.dtype(next((dtype for dtype in CODE_DTYPES if count <= int(np.iinfo(dtype).max) + 1), np.uint64))
+
+
+def parse_numbers(values:np.ndarray) -> np.ndarray:
+    """
+    Parses the text of a numeric column, with one vectorized conversion.
+
+    The source files use ";" as delimiter, so their decimal separator may be a comma:
+    "1,5" and "1.5" both give 1.5. Blanks (thousands separators) are ignored.
+
+    Args:
+        values (np.ndarray): The values to parse (the categories of a column for instance).
+    Returns:
+        np.ndarray: int64 if every value is an integer, float64 otherwise, NaN for the values
+            that are not numbers.
+    """
+    text = np.char.replace(np.char.replace(np.asarray(values, dtype=str), " ", ""), ",", ".")
+    try:
+        return text.astype(np.int64)
+    except (ValueError, OverflowError):
+        pass
+    try:
+        numbers = text.astype(np.float64)
+    except ValueError:
+        numbers = np.array([_to_float(value) for value in text], dtype=np.float64)
+    if np.all(np.isfinite(numbers)) and np.array_equal(numbers, np.round(numbers)) and np.all(np.abs(numbers) < FLOAT64_EXACT):
+        return numbers.astype(np.int64)
+    return numbers
+
+
+def _to_float(value:str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def matrix_dtype(columns:list[np.ndarray]) -> np.dtype:
+    """
+    Returns the dtype of a matrix holding the columns without loss.
+
+    int32 whenever the range allows it, as the yearly files always were, int64 for
+    integers outside of it and float64 for decimal values. Floats holding integers are
+    downcast as well, so a year without decimals keeps an integer dtype.
+
+    Args:
+        columns (list[np.ndarray]): The typed columns, codes or parsed numbers.
+    Returns:
+        np.dtype: The narrowest of int32, int64 and float64 for every column.
+    """
+    dtype = np.dtype(np.int32)
+    for column in columns:
+        if np.issubdtype(column.dtype, np.floating) and not (np.array_equal(column, np.round(column)) and np.all(np.abs(column) < FLOAT64_EXACT)):
+            return np.dtype(np.float64)
+        if len(column) and (int(column.min()) < INT32_RANGE[0] or int(column.max()) > INT32_RANGE[1]):
+            dtype = np.dtype(np.int64)
+    return dtype
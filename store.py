@@ -0,0 +1,98 @@
+import json
+import os
+import numpy as np
+from columnar_file import narrowest_dtype
+from schema import matrix_dtype
+
+HEADER_FILE_NAME = "header.json"
+
+
+def write_store(output_folder_path:str, columns:list[np.ndarray], header:list[str]) -> None:
+    """
+    Writes columns as one uncompressed .npy file per column, which can be memory-mapped.
+
+    The folder contains <column>.npy for every column, stored with its narrowest dtype (see
+    columnar_file.narrowest_dtype), and header.json ({"rows", "columns"}) giving the order of
+    the columns. header.json is written last, a folder without it is an incomplete store.
+
+    Args:
+        output_folder_path (str): Path to the folder of the store, created if needed.
+        columns (list[np.ndarray]): The columns to write, all of the same length.
+        header (list[str]): The names of the columns.
+    """
+    os.makedirs(output_folder_path, exist_ok=True)
+    header_path = os.path.join(output_folder_path, HEADER_FILE_NAME)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+    for name, column in zip(header, columns):
+        np.save(os.path.join(output_folder_path, name+".npy"), np.ascontiguousarray(column, dtype=narrowest_dtype(column)))
+    with open(header_path, mode='w', encoding='utf-8') as header_file:
+        json.dump({"rows": len(columns[0]) if columns else 0, "columns": header}, header_file, ensure_ascii=False)
+
+
+class ColumnStore:
+    """
+    A store written by write_store, whose columns are only mapped when first accessed.
+
+    Opening a store only reads header.json; every column is then a read-only memory map,
+    so a query only reads the pages of the columns (and rows) it touches.
+    """
+
+    def __init__(self, folder_path:str):
+        with open(os.path.join(folder_path, HEADER_FILE_NAME), mode='r', encoding='utf-8') as header_file:
+            description = json.load(header_file)
+        self.folder_path = folder_path
+        self.header:list[str] = description["columns"]
+        self.rows:int = description["rows"]
+        self._columns:dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.header
+
+    def __getitem__(self, name:str) -> np.ndarray:
+        if name not in self._columns:
+            if name not in self.header:
+                raise KeyError(name)
+            self._columns[name] = np.load(os.path.join(self.folder_path, name+".npy"), mmap_mode='r')
+        return self._columns[name]
+
+    def matrix(self, names:list[str]|None=None, dtype=None) -> np.ndarray:
+        """
+        Reads columns into one matrix, like the data of the npz files.
+
+        Args:
+            names (list[str]|None): The columns to read, all of them if None.
+            dtype: The dtype of the matrix, the narrowest holding every column if None (see schema.matrix_dtype).
+        Returns:
+            np.ndarray: The matrix with one column per name.
+        """
+        names = self.header if names is None else names
+        dtype = matrix_dtype([self[name] for name in names]) if dtype is None else dtype
+        matrix = np.empty((self.rows, len(names)), dtype=dtype)
+        for i, name in enumerate(names):
+            matrix[:, i] = self[name]
+        return matrix
+
+
+def open_store(output_file_name:str, start:int, end:int) -> dict[int, ColumnStore]:
+    """
+    Opens the stores of every year written by the pipeline, without reading any column.
+
+    Args:
+        output_file_name (str): The base name of the yearly files, the stores are <output_file_name>_<year>.
+        start (int): The first year.
+        end (int): The last year.
+    Returns:
+        dict: The store of every year found.
+    """
+    stores = {}
+    for year in range(start, end + 1):
+        folder_path = f"{output_file_name}_{year}"
+        if os.path.exists(os.path.join(folder_path, HEADER_FILE_NAME)):
+            stores[year] = ColumnStore(folder_path)
+        else:
+            print(f"Missing yearly store {folder_path}, skipped.")
+    return stores
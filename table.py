@@ -0,0 +1,302 @@
+import csv
+import numpy as np
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import zip_longest
+from profiling import ColumnProfile, profile_column
+from schema import code_dtype, parse_numbers
+
+
+def factorize(values:Sequence) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes a sequence of hashable values as integer codes.
+
+    The codes are given in order of first appearance, as the dictionaries built by the
+    compression pipeline always were.
+
+    Args:
+        values (Sequence): The values to encode.
+    Returns:
+        tuple: The codes (narrowest unsigned dtype) and the distinct values (object array) indexed by code.
+    """
+    uniques = dict.fromkeys(values)
+    lookup = {value: code for code, value in enumerate(uniques)}
+    codes = np.fromiter(map(lookup.__getitem__, values), dtype=code_dtype(len(lookup)), count=len(values))
+    categories = np.empty(len(lookup), dtype=object)
+    categories[:] = list(uniques)
+    return codes, categories
+
+
+def compact_codes(codes:np.ndarray, categories:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Removes the unused categories of a column and renumbers its codes by first appearance.
+
+    Args:
+        codes (np.ndarray): The codes of the column.
+        categories (np.ndarray): The categories indexed by code.
+    Returns:
+        tuple: The new codes and categories.
+    """
+    if len(codes) == 0:
+        return codes.astype(np.uint8), categories[:0]
+    used, first_index, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty(len(order), dtype=code_dtype(len(order)))
+    rank[order] = np.arange(len(order))
+    return rank[inverse.ravel()], categories[used[order]]
+
+
+class Table:
+    """
+    Columnar table of string values.
+
+    Every column is stored as codes, of the narrowest unsigned dtype for its number of
+    categories, plus the array of its distinct values, in order of first appearance. The
+    categories of a column only ever contain values that are used, so the number of
+    distinct elements of a column is the length of its categories.
+    Columns are shared between tables, selecting or dropping columns copies nothing.
+    Tables are never modified in place, which lets them cache the profile of their columns
+    and the parsed values of their numeric columns.
+    """
+
+    def __init__(self, header:list[str], codes:list[np.ndarray], categories:list[np.ndarray]):
+        self.header = list(header)
+        self.codes = list(codes)
+        self.categories = list(categories)
+        self._profiles: list[ColumnProfile|None] = [None] * len(self.header)
+        self._numbers: list[np.ndarray|None] = [None] * len(self.header)
+
+    @classmethod
+    def from_rows(cls, rows:Iterable[Sequence[str]], header:list[str]) -> "Table":
+        """
+        Builds a table from rows of strings. Missing cells are filled with an empty string.
+
+        Args:
+            rows (Iterable): The rows of the table.
+            header (list[str]): The header of the table.
+        Returns:
+            Table: The columnar table.
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        columns = list(zip_longest(*rows, fillvalue=""))[:len(header)]
+        codes = []
+        categories = []
+        for col_index in range(len(header)):
+            column = columns[col_index] if col_index < len(columns) else ("",) * len(rows)
+            col_codes, col_categories = factorize(column)
+            codes.append(col_codes)
+            categories.append(col_categories)
+        return cls(header, codes, categories)
+
+    @classmethod
+    def from_columns(cls, header:list[str], columns:list[Sequence[str]]) -> "Table":
+        """
+        Builds a table from the values of every column.
+
+        Args:
+            header (list[str]): The header of the table.
+            columns (list[Sequence]): The values of every column, all of the same length.
+        Returns:
+            Table: The columnar table.
+        """
+        codes = []
+        categories = []
+        for column in columns:
+            col_codes, col_categories = factorize(column)
+            codes.append(col_codes)
+            categories.append(col_categories)
+        return cls(header, codes, categories)
+
+    @classmethod
+    def from_csv(cls, file_name:str, delimiter:str=";") -> "Table":
+        """
+        Reads a csv file with a header line into a table.
+
+        Args:
+            file_name (str): Path to the csv file.
+            delimiter (str): The delimiter used in the csv file.
+        Returns:
+            Table: The columnar table.
+        """
+        with open(file_name, mode='r', newline='', encoding='utf-8', errors='ignore') as input_file:
+            reader = csv.reader(input_file, delimiter=delimiter)
+            header = next(reader)
+            return cls.from_rows(list(reader), header)
+
+    @classmethod
+    def concat(cls, tables:list["Table"]) -> "Table":
+        """
+        Concatenates tables with the same header, merging the categories of every column.
+
+        Args:
+            tables (list[Table]): The tables to concatenate, in order.
+        Returns:
+            Table: The concatenated table.
+        """
+        if not tables:
+            return cls([], [], [])
+        header = tables[0].header
+        codes = []
+        categories = []
+        for col_index in range(len(header)):
+            lookup: dict[str, int] = {}
+            parts = []
+            for table in tables:
+                lut = np.array([lookup.setdefault(value, len(lookup)) for value in table.categories[col_index]], dtype=np.int32)
+                parts.append(lut[table.codes[col_index]] if len(lut) else table.codes[col_index])
+            col_categories = np.empty(len(lookup), dtype=object)
+            col_categories[:] = list(lookup)
+            codes.append(np.concatenate(parts).astype(code_dtype(len(lookup)), copy=False))
+            categories.append(col_categories)
+        return cls(header, codes, categories)
+
+    def __len__(self) -> int:
+        return len(self.codes[0]) if self.codes else 0
+
+    def __getitem__(self, index:int|slice) -> list[str]|list[list[str]]:
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[list[str]]:
+        columns = [self.values(col_index) for col_index in range(len(self.header))]
+        for row in zip(*columns):
+            yield list(row)
+
+    def row(self, index:int) -> list[str]:
+        """
+        Decodes one row of the table.
+
+        Args:
+            index (int): The index of the row.
+        Returns:
+            list[str]: The values of the row.
+        """
+        return [self.categories[i][self.codes[i][index]] for i in range(len(self.header))]
+
+    def values(self, col_index:int) -> np.ndarray:
+        """
+        Decodes one column of the table.
+
+        Args:
+            col_index (int): The index of the column.
+        Returns:
+            np.ndarray: The values of the column (object array of str).
+        """
+        return self.categories[col_index][self.codes[col_index]]
+
+    def profile(self) -> list[ColumnProfile]:
+        """
+        Profiles every column of the table.
+
+        The profiles are computed once and cached, tables derived with select or drop
+        reuse the profiles of the columns they keep.
+
+        Returns:
+            list[ColumnProfile]: The statistics of every column.
+        """
+        for col_index, column_profile in enumerate(self._profiles):
+            if column_profile is None:
+                self._profiles[col_index] = profile_column(self.header[col_index], self.codes[col_index], self.categories[col_index])
+        return list(self._profiles)
+
+    def numbers(self, col_index:int) -> np.ndarray:
+        """
+        Parses the categories of a numeric column, see schema.parse_numbers.
+
+        Every distinct value is parsed once and the result is cached, the parsed values of
+        the rows are numbers(col_index)[codes[col_index]].
+
+        Args:
+            col_index (int): The index of the column.
+        Returns:
+            np.ndarray: The int64 or float64 value of every category, NaN for the ones that are not numbers.
+        """
+        if self._numbers[col_index] is None:
+            self._numbers[col_index] = parse_numbers(self.categories[col_index])
+        return self._numbers[col_index]
+
+    def distinct_counts(self) -> list[int]:
+        """
+        Returns the number of distinct elements of every column.
+        """
+        return [len(col_categories) for col_categories in self.categories]
+
+    def select(self, col_indexes:list[int]) -> "Table":
+        """
+        Keeps only the given columns, in the given order.
+
+        Args:
+            col_indexes (list[int]): The indexes of the columns to keep.
+        Returns:
+            Table: The table with the selected columns.
+        """
+        table = Table(
+            [self.header[i] for i in col_indexes],
+            [self.codes[i] for i in col_indexes],
+            [self.categories[i] for i in col_indexes],
+        )
+        table._profiles = [self._profiles[i] for i in col_indexes]
+        table._numbers = [self._numbers[i] for i in col_indexes]
+        return table
+
+    def drop(self, col_indexes:list[int]) -> "Table":
+        """
+        Removes the given columns.
+
+        Args:
+            col_indexes (list[int]): The indexes of the columns to remove.
+        Returns:
+            Table: The table without these columns.
+        """
+        return self.select([i for i in range(len(self.header)) if i not in col_indexes])
+
+    def take(self, rows:np.ndarray) -> "Table":
+        """
+        Keeps only the given rows, the categories are compacted accordingly.
+
+        Args:
+            rows (np.ndarray): A boolean mask or the indexes of the rows to keep.
+        Returns:
+            Table: The table with the selected rows.
+        """
+        codes = []
+        categories = []
+        for col_codes, col_categories in zip(self.codes, self.categories):
+            new_codes, new_categories = compact_codes(col_codes[rows], col_categories)
+            codes.append(new_codes)
+            categories.append(new_categories)
+        return Table(self.header, codes, categories)
+
+    def with_column(self, col_index:int, codes:np.ndarray, categories:np.ndarray) -> "Table":
+        """
+        Replaces a column, its categories are compacted.
+
+        Args:
+            col_index (int): The index of the column to replace.
+            codes (np.ndarray): The new codes of the column.
+            categories (np.ndarray): The categories indexed by the new codes, unused ones are removed.
+        Returns:
+            Table: The table with the new column.
+        """
+        new_codes, new_categories = compact_codes(codes, categories)
+        table = self.select(list(range(len(self.header))))
+        table.codes[col_index] = new_codes
+        table.categories[col_index] = new_categories
+        table._profiles[col_index] = None
+        table._numbers[col_index] = None
+        return table
+
+
+def as_table(data:"Table|list[list[str]]", header:list[str]) -> Table:
+    """
+    Returns the data as a table, converting rows of strings if needed.
+
+    Args:
+        data (Table|list): The data to convert.
+        header (list[str]): The header of the data.
+    Returns:
+        Table: The columnar table.
+    """
+    if isinstance(data, Table):
+        return data
+    return Table.from_rows(data, header)
@@ -0,0 +1,315 @@
+"""
+Builds the levels of detail of the world map from a TopoJSON file, simplified and quantized once.
+
+Usage:
+    python topology.py                                   # writes visualization/public/world/world-lod-<level>.json
+    python topology.py --source visualization/public/world/world-110m
+"""
+import argparse
+import compresser as compresser
+import heapq
+import os
+import numpy as np
+
+OBJECT_NAME = "countries"
+INDEX_FILE_NAME = "world-lod"
+
+# The levels of detail, from the coarsest. min_weight is the smallest Visvalingam area
+# (in square degrees) of the points kept, min_area the smallest area of the polygons kept
+# besides the largest one of every country, quantization the number of steps of the
+# coordinates on each axis. The map switches to a level from its min_zoom.
+LOD_LEVELS = [
+    {"name": "low", "min_zoom": 0, "min_weight": 0.05, "min_area": 0.5, "quantization": 10000},
+    {"name": "medium", "min_zoom": 2, "min_weight": 0.005, "min_area": 0.05, "quantization": 30000},
+    {"name": "high", "min_zoom": 4, "min_weight": 0, "min_area": 0, "quantization": 100000},
+]
+
+
+def decode_arcs(topology:dict) -> list[np.ndarray]:
+    """
+    Returns the arcs of a TopoJSON topology as arrays of longitudes and latitudes,
+    undoing the delta encoding and the quantization if the topology has a transform.
+    """
+    transform = topology.get("transform")
+    arcs = []
+    for arc in topology["arcs"]:
+        points = np.asarray(arc, dtype=np.float64)[:, :2]
+        if transform:
+            points = np.cumsum(points, axis=0) * transform["scale"] + transform["translate"]
+        arcs.append(points)
+    return arcs
+
+
+def polygons(geometry:dict) -> list[list[list[int]]]:
+    """
+    Returns the polygons of a Polygon or MultiPolygon geometry, every ring as its arc indexes.
+    """
+    if geometry["type"] == "Polygon":
+        return [geometry["arcs"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["arcs"]
+    return []
+
+
+def ring_points(arcs:list[np.ndarray], ring:list[int]) -> np.ndarray:
+    """
+    Stitches the arcs of a ring, ~index being the arc index reversed as in TopoJSON.
+    """
+    parts = [arcs[index] if index >= 0 else arcs[~index][::-1] for index in ring]
+    return np.concatenate([parts[0]] + [part[1:] for part in parts[1:]])
+
+
+def ring_area(points:np.ndarray) -> float:
+    """
+    Returns the planar area of a ring in square degrees, with the shoelace formula.
+    """
+    x, y = points[:, 0], points[:, 1]
+    return abs(float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))) / 2
+
+
+def polygon_area(arcs:list[np.ndarray], polygon:list[list[int]]) -> float:
+    return ring_area(ring_points(arcs, polygon[0])) - sum(ring_area(ring_points(arcs, hole)) for hole in polygon[1:])
+
+
+def visvalingam_weights(points:np.ndarray) -> np.ndarray:
+    """
+    Returns the weight of every point of an arc for Visvalingam's simplification.
+
+    The point of the smallest triangle with its neighbours is removed first, its
+    neighbours' triangles are then updated. The weight of a point is the area of its
+    triangle when removed, at least the weight of the points removed before it, so the
+    points kept above any threshold are those Visvalingam's algorithm keeps. The ends of
+    the arc are never removed: they are shared with the neighbouring arcs, which keeps the
+    shared borders identical in every country (the topology is preserved).
+
+    Returns:
+        np.ndarray: The weight of every point, infinite for the ends.
+    """
+    count = len(points)
+    weights = np.full(count, np.inf)
+    if count < 3:
+        return weights
+    xs, ys = points[:, 0].tolist(), points[:, 1].tolist()
+    previous = list(range(-1, count - 1))
+    following = list(range(1, count + 1))
+
+    def area(i:int) -> float:
+        a, c = previous[i], following[i]
+        return abs((xs[i] - xs[a]) * (ys[c] - ys[a]) - (xs[c] - xs[a]) * (ys[i] - ys[a])) / 2
+
+    areas = [0.0] + [area(i) for i in range(1, count - 1)] + [0.0]
+    heap = [(areas[i], i) for i in range(1, count - 1)]
+    heapq.heapify(heap)
+    removed = [False] * count
+    max_area = 0.0
+    while heap:
+        current, i = heapq.heappop(heap)
+        if removed[i] or current != areas[i]:
+            continue
+        max_area = max(max_area, current)
+        weights[i] = max_area
+        removed[i] = True
+        a, c = previous[i], following[i]
+        following[a], previous[c] = c, a
+        for neighbour in (a, c):
+            if 0 < neighbour < count - 1:
+                areas[neighbour] = area(neighbour)
+                heapq.heappush(heap, (areas[neighbour], neighbour))
+    return weights
+
+
+def simplify_arc(points:np.ndarray, weights:np.ndarray, min_weight:float) -> np.ndarray:
+    """
+    Keeps the points of an arc whose weight reaches min_weight. A closed arc (a whole ring)
+    keeps at least its 2 heaviest inner points, so that it remains a ring.
+    """
+    kept = weights >= min_weight
+    if np.array_equal(points[0], points[-1]) and len(points) >= 4 and np.count_nonzero(kept) < 4:
+        kept[np.argsort(weights[1:-1])[-2:] + 1] = True
+    return points[kept]
+
+
+def quantize_arc(points:np.ndarray, translate:np.ndarray, scale:np.ndarray) -> list[list[int]]:
+    """
+    Quantizes an arc and delta-encodes it, as TopoJSON does. The points falling on the
+    same step as the previous one are removed, the ends are kept.
+    """
+    quantized = np.round((points - translate) / scale).astype(np.int64)
+    moved = np.any(quantized[1:] != quantized[:-1], axis=1)
+    kept = np.concatenate([[True], moved])
+    kept[-1] = True
+    quantized = quantized[kept]
+    return np.concatenate([quantized[:1], np.diff(quantized, axis=0)]).tolist()
+
+
+def longitude_range(longitudes:np.ndarray) -> tuple[float, float]:
+    """
+    Returns the smallest range of longitudes holding every given one, west then east as
+    d3.geoBounds does: west is greater than east when the range crosses the antimeridian.
+    """
+    ordered = np.unique(longitudes)
+    gaps = np.diff(np.concatenate([ordered, ordered[:1] + 360]))
+    largest = int(np.argmax(gaps))
+    if largest == len(ordered) - 1:
+        return float(ordered[0]), float(ordered[-1])
+    return float(ordered[largest + 1]), float(ordered[largest])
+
+
+def country_extent(arcs:list[np.ndarray], geometry:dict) -> dict:
+    """
+    Returns the centroid of the largest polygon of a country (inside the country, unlike
+    the centroid of all its islands) and the bounding box of all its polygons, as
+    [west, south, east, north] (see longitude_range).
+
+    The rings crossing the antimeridian are unwrapped for the centroid, which is then
+    brought back between -180 and 180. The rings around a pole (Antarctica) are kept as they are.
+    """
+    shapes = polygons(geometry)
+    largest = max(shapes, key=lambda polygon: polygon_area(arcs, polygon))
+    weighted = np.zeros(2)
+    total = 0.0
+    for sign, ring in [(1, largest[0])] + [(-1, hole) for hole in largest[1:]]:
+        points = ring_points(arcs, ring)
+        x, y = np.unwrap(points[:, 0], period=360), points[:, 1]
+        if abs(x[-1] - x[0]) > 180:
+            x = points[:, 0]
+        cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+        area = cross.sum() / 2
+        if area:
+            centroid = np.array([np.dot(x[:-1] + x[1:], cross), np.dot(y[:-1] + y[1:], cross)]) / (6 * area)
+            weighted += sign * abs(area) * centroid
+            total += sign * abs(area)
+    if total <= 0:
+        weighted, total = ring_points(arcs, largest[0]).mean(axis=0), 1.0
+    centroid = weighted / total
+    centroid[0] = (centroid[0] + 180) % 360 - 180
+    points = np.concatenate([ring_points(arcs, ring) for polygon in shapes for ring in polygon])
+    west, east = longitude_range(points[:, 0])
+    return {
+        "centroid": np.round(centroid, 4).tolist(),
+        "bbox": np.round([west, points[:, 1].min(), east, points[:, 1].max()], 4).tolist(),
+    }
+
+
+def country_codes(countries:dict, continents:dict) -> dict[str, str]:
+    """
+    Maps the English name of every country of the trade dictionaries to its code: the
+    countries of countries.json and the members of the continents of continents.json,
+    which the map merges in continent mode.
+    """
+    codes = {member["en"]: code for continent in continents.values() for code, member in continent["countries"].items()}
+    codes.update({country["en"]: country["code"] for country in countries.values()})
+    return codes
+
+
+def level_topology(arcs:list[np.ndarray], weights:list[np.ndarray], geometries:list[dict], bbox:np.ndarray, level:dict) -> dict:
+    """
+    Builds the topology of a level of detail: the arcs simplified to its min_weight, the
+    polygons smaller than its min_area dropped (but the largest of every country), the
+    arcs no longer used removed and the coordinates quantized.
+    """
+    simplified = [simplify_arc(points, arc_weights, level["min_weight"]) for points, arc_weights in zip(arcs, weights)]
+    level_geometries = []
+    for geometry in geometries:
+        shapes = polygons(geometry)
+        areas = [polygon_area(simplified, polygon) for polygon in shapes]
+        largest = int(np.argmax(areas))
+        shapes = [
+            [polygon[0]] + [hole for hole in polygon[1:] if ring_area(ring_points(simplified, hole)) >= level["min_area"]]
+            for i, polygon in enumerate(shapes) if i == largest or areas[i] >= level["min_area"]
+        ]
+        level_geometries.append({**geometry, "type": "Polygon" if len(shapes) == 1 else "MultiPolygon", "arcs": shapes[0] if len(shapes) == 1 else shapes})
+
+    # Renumber the arcs still used, in their order of appearance
+    used:dict[int, int] = {}
+    for geometry in level_geometries:
+        for polygon in polygons(geometry):
+            for ring in polygon:
+                for index in ring:
+                    used.setdefault(index if index >= 0 else ~index, len(used))
+    for geometry in level_geometries:
+        shapes = [[[used[index] if index >= 0 else ~used[~index] for index in ring] for ring in polygon] for polygon in polygons(geometry)]
+        geometry["arcs"] = shapes[0] if geometry["type"] == "Polygon" else shapes
+
+    scale = (bbox[2:] - bbox[:2]) / (level["quantization"] - 1)
+    return {
+        "type": "Topology",
+        "bbox": bbox.tolist(),
+        "transform": {"scale": scale.tolist(), "translate": bbox[:2].tolist()},
+        "objects": {OBJECT_NAME: {"type": "GeometryCollection", "geometries": level_geometries}},
+        "arcs": [quantize_arc(simplified[index], bbox[:2], scale) for index in used],
+    }
+
+
+def build_world_lods(
+        source_path:str="visualization/public/world/world-50m",
+        output_folder:str="visualization/public/world/",
+        countries_path:str="visualization/src/data/countries",
+        continents_path:str="visualization/src/data/continents",
+        levels:list[dict]=LOD_LEVELS,
+    ) -> dict:
+    """
+    Writes the levels of detail of the world map and their index.
+
+    The countries that are not in the trade dictionaries are removed, as well as every
+    other object of the source (the land outline). Every level is a TopoJSON file
+    world-lod-<level>.json with the same objects and properties as the source (name, id)
+    plus the code of every country, so the map reads any of them as it reads the source.
+    world-lod.json lists the levels (file, min_zoom, bytes and number of points) and the
+    centroid and bounding box of every country code, computed on the source geometry.
+
+    Args:
+        source_path (str): Path to the most detailed TopoJSON file (without the file extension).
+        output_folder (str): The folder to write the levels to.
+        countries_path (str): Path to countries.json (without the file extension).
+        continents_path (str): Path to continents.json (without the file extension).
+        levels (list[dict]): The levels of detail, see LOD_LEVELS.
+    Returns:
+        dict: The content of world-lod.json.
+    """
+    topology = compresser.open_json_file(source_path, cache=False)
+    if not isinstance(topology, dict) or OBJECT_NAME not in topology.get("objects", {}):
+        print(f"Error: no {OBJECT_NAME} object found in {source_path}.json.")
+        return {}
+    codes = country_codes(compresser.open_json_file(countries_path), compresser.open_json_file(continents_path))
+    geometries = [
+        {**geometry, "properties": {**geometry.get("properties", {}), "code": codes[geometry["properties"]["name"]]}}
+        for geometry in topology["objects"][OBJECT_NAME]["geometries"]
+        if polygons(geometry) and geometry.get("properties", {}).get("name") in codes
+    ]
+    print(f"Kept {len(geometries)} of {len(topology['objects'][OBJECT_NAME]['geometries'])} countries.")
+
+    arcs = decode_arcs(topology)
+    weights = [visvalingam_weights(points) for points in arcs]
+    used = sorted({index if index >= 0 else ~index for geometry in geometries for polygon in polygons(geometry) for ring in polygon for index in ring})
+    points = np.concatenate([arcs[index] for index in used])
+    bbox = np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+    index = {"levels": [], "countries": {}}
+    for level in levels:
+        level_file = f"{INDEX_FILE_NAME}-{level['name']}"
+        level_data = level_topology(arcs, weights, geometries, bbox, level)
+        compresser.json_output_file(output_folder+level_file, level_data, compact=True)
+        index["levels"].append({
+            **level,
+            "file": level_file+".json",
+            "points": sum(len(arc) for arc in level_data["arcs"]),
+            "bytes": os.path.getsize(output_folder+level_file+".json"),
+        })
+    for geometry in geometries:
+        index["countries"][geometry["properties"]["code"]] = {"name": geometry["properties"]["name"], **country_extent(arcs, geometry)}
+    compresser.json_output_file(output_folder+INDEX_FILE_NAME, index, compact=True)
+    for level in index["levels"]:
+        print(f"Level {level['name']}: {level['points']} points, {level['bytes']} bytes.")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the levels of detail of the world map.")
+    parser.add_argument("--source", default="visualization/public/world/world-50m", help="most detailed TopoJSON file, without the file extension")
+    parser.add_argument("--output", default="visualization/public/world/", help="folder to write the levels to")
+    parser.add_argument("--countries", default="visualization/src/data/countries", help="countries.json, without the file extension")
+    parser.add_argument("--continents", default="visualization/src/data/continents", help="continents.json, without the file extension")
+    args = parser.parse_args()
+
+    build_world_lods(args.source, args.output, args.countries, args.continents)
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import numpy as np
+from cache import cached_json
+from table import Table
+
+FUNCTIONAL_DEPENDENCIES = [("N027_LIB", "N027_MOD"), ("N053_LIB", "N053_MOD"), ("N890_LIB", "N890_MOD")]
+KEY_COLUMNS = ["ANNREF", "GEOGRAPHIE_MOD", "N027_MOD", "N053_MOD", "N890_MOD"]
+CATEGORY_COLUMNS = ["GEOGRAPHIE_MOD", "N027_LIB", "N053_LIB", "N890_LIB"]
+VALUE_COLUMN = "VALEUR"
+# Every column read by the checks, the others can be left out of the validated tables
+VALIDATED_COLUMNS = list(dict.fromkeys([name for pair in FUNCTIONAL_DEPENDENCIES for name in pair] + KEY_COLUMNS + CATEGORY_COLUMNS + [VALUE_COLUMN]))
+REPORT_FILE_NAME = "validation_report"
+MAX_EXAMPLES = 5
+INT32_MIN = int(np.iinfo(np.int32).min)
+INT32_MAX = int(np.iinfo(np.int32).max)
+
+# Maximum number of violations of every check, None to only report it, as are the checks
+# not listed. Several N890 codes may share a label after the correction, new categories are
+# expected with every new year, and values outside the int32 range are written with a wider
+# dtype (see schema.matrix_dtype).
+DEFAULT_THRESHOLDS:dict[str, int|None] = {
+    "functional_dependency:N027_LIB->N027_MOD": 0,
+    "functional_dependency:N027_MOD->N027_LIB": 0,
+    "functional_dependency:N053_LIB->N053_MOD": 0,
+    "functional_dependency:N053_MOD->N053_LIB": 0,
+    "functional_dependency:N890_LIB->N890_MOD": None,
+    "functional_dependency:N890_MOD->N890_LIB": 0,
+    "duplicate_keys": 0,
+    "values:not_numeric": 0,
+    "values:negative": 0,
+    "values:int32_overflow": None,
+    "new_categories:GEOGRAPHIE_MOD": None,
+    "new_categories:N027_LIB": None,
+    "new_categories:N053_LIB": None,
+    "new_categories:N890_LIB": None,
+}
+
+
+def _category_hashes(categories:np.ndarray) -> np.ndarray:
+    return np.array([int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "little") for value in categories], dtype=np.uint64)
+
+
+class DataValidator:
+    """
+    Accumulates the data-quality checks of the corrected rows, table by table.
+
+    The tables can be the whole data, one year or one batch, and validators of different
+    tables (built in other processes for instance) can be merged. Every check works on the
+    distinct values of a table, weighted by their number of rows when needed:
+        - functional dependencies between the LIB and MOD columns, in both directions,
+        - duplicate (year, country, flux, month, product) keys, on the whole data or year by year,
+        - values that are not numbers, negative, or outside the int32 range,
+        - categories absent from the dictionaries of the previous build.
+    With keys_by_year, the key hashes of a year are checked and dropped as soon as the rows of
+    another year come, so the memory of the checks is bounded by one year of rows (streaming
+    builds). The years are expected one after the other, the duplicates between two runs of
+    rows of a same year are not found and the year is listed under split_years in the report.
+    """
+
+    def __init__(self, keys_by_year:bool=False):
+        self.rows = 0
+        self.pairs:dict[tuple[str, str], set[tuple[str, str]]] = {pair: set() for pair in FUNCTIONAL_DEPENDENCIES}
+        self.keys_by_year = keys_by_year
+        self.key_hashes:list[np.ndarray] = []
+        self.key_year:str|None = None
+        self.checked_years:set[str] = set()
+        self.split_years:set[str] = set()
+        self.duplicate_keys = 0
+        self.duplicated_hashes:list[int] = []
+        self.key_examples:dict[int, list[str]] = {}
+        self.value_counts = {"not_numeric": 0, "negative": 0, "int32_overflow": 0}
+        self.value_examples:dict[str, list[str]] = {name: [] for name in self.value_counts}
+        self.categories:dict[str, set[str]] = {name: set() for name in CATEGORY_COLUMNS}
+
+    def update(self, data:Table) -> None:
+        """
+        Adds the rows of a table to the checks.
+
+        Args:
+            data (Table): Corrected rows, before any column is erased.
+        """
+        header = data.header
+        self.rows += len(data)
+        if not len(data):
+            return
+
+        for first, second in FUNCTIONAL_DEPENDENCIES:
+            if first in header and second in header:
+                first_index, second_index = header.index(first), header.index(second)
+                width = len(data.categories[second_index])
+                distinct = np.unique(data.codes[first_index].astype(np.int64) * width + data.codes[second_index])
+                self.pairs[(first, second)].update(
+                    zip(data.categories[first_index][distinct // width], data.categories[second_index][distinct % width])
+                )
+
+        if all(name in header for name in KEY_COLUMNS):
+            row_hashes = np.zeros(len(data), dtype=np.uint64)
+            for name in KEY_COLUMNS:
+                index = header.index(name)
+                row_hashes = row_hashes * np.uint64(0x100000001B3) ^ _category_hashes(data.categories[index])[data.codes[index]]
+            if self.keys_by_year:
+                year_index = header.index(KEY_COLUMNS[0])
+                for code in np.unique(data.codes[year_index]):
+                    self._add_year_keys(str(data.categories[year_index][code]), row_hashes[data.codes[year_index] == code])
+            else:
+                self.key_hashes.append(row_hashes)
+            distinct, first_rows, counts = np.unique(row_hashes, return_index=True, return_counts=True)
+            missing = max(0, MAX_EXAMPLES - len(self.key_examples))
+            for key_hash, row in zip(distinct[counts > 1][:missing], first_rows[counts > 1][:missing]):
+                self.key_examples.setdefault(int(key_hash), [str(data.categories[header.index(name)][data.codes[header.index(name)][row]]) for name in KEY_COLUMNS])
+
+        if VALUE_COLUMN in header:
+            index = header.index(VALUE_COLUMN)
+            numbers = data.numbers(index).astype(np.float64)
+            rows_per_value = np.bincount(data.codes[index], minlength=len(numbers))
+            failures = {
+                "not_numeric": np.isnan(numbers),
+                "negative": numbers < 0,
+                "int32_overflow": (numbers < INT32_MIN) | (numbers > INT32_MAX),
+            }
+            for failed, selected in failures.items():
+                self.value_counts[failed] += int(rows_per_value[selected].sum())
+                missing = MAX_EXAMPLES - len(self.value_examples[failed])
+                self.value_examples[failed].extend(str(value) for value in data.categories[index][selected][:missing])
+
+        for name in CATEGORY_COLUMNS:
+            if name in header:
+                self.categories[name].update(str(value) for value in data.categories[header.index(name)])
+
+    def _add_year_keys(self, year:str, row_hashes:np.ndarray) -> None:
+        if year != self.key_year:
+            self._check_keys()
+            if year in self.checked_years:
+                self.split_years.add(year)
+            self.key_year = year
+        self.key_hashes.append(row_hashes)
+
+    def _check_keys(self) -> None:
+        """
+        Counts the duplicates of the pending key hashes and drops them.
+        """
+        if self.key_hashes:
+            distinct, counts = np.unique(np.concatenate(self.key_hashes), return_counts=True)
+            self.duplicate_keys += int(np.sum(counts[counts > 1] - 1))
+            self.duplicated_hashes.extend(int(key_hash) for key_hash in distinct[counts > 1][:max(0, MAX_EXAMPLES - len(self.duplicated_hashes))])
+            self.key_hashes = []
+        if self.key_year is not None:
+            self.checked_years.add(self.key_year)
+
+    def merge(self, other:"DataValidator") -> None:
+        """
+        Adds the checks of another validator.
+        """
+        self.rows += other.rows
+        for pair, values in other.pairs.items():
+            self.pairs[pair].update(values)
+        self.key_hashes.extend(other.key_hashes)
+        self.duplicate_keys += other.duplicate_keys
+        self.duplicated_hashes = (self.duplicated_hashes + other.duplicated_hashes)[:MAX_EXAMPLES]
+        self.split_years.update(other.split_years)
+        for key_hash, example in other.key_examples.items():
+            self.key_examples.setdefault(key_hash, example)
+        for name, count in other.value_counts.items():
+            self.value_counts[name] += count
+            self.value_examples[name] = (self.value_examples[name] + other.value_examples[name])[:MAX_EXAMPLES]
+        for name, values in other.categories.items():
+            self.categories[name].update(values)
+
+    def report(self, dico_folder:str="", thresholds:dict[str, int|None]|None=None) -> dict:
+        """
+        Builds the report of the checks.
+
+        Args:
+            dico_folder (str): The folder of the dictionaries of the previous build, for the new categories.
+            thresholds (dict|None): The maximum number of violations of the checks, see DEFAULT_THRESHOLDS.
+        Returns:
+            dict: {"rows", "passed", "checks": [{"check", "violations", "threshold", "passed", "examples"}]}.
+        """
+        thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+        results = []
+
+        def add(check:str, violations:int, examples:list, **details) -> None:
+            threshold = thresholds.get(check)
+            results.append({
+                "check": check,
+                "violations": violations,
+                "threshold": threshold,
+                "passed": threshold is None or violations <= threshold,
+                "examples": examples[:MAX_EXAMPLES],
+                **details,
+            })
+
+        for (first, second), pairs in self.pairs.items():
+            if not pairs:
+                continue
+            for source, target in [(0, 1), (1, 0)]:
+                mapping:dict[str, set[str]] = {}
+                for pair in pairs:
+                    mapping.setdefault(pair[source], set()).add(pair[target])
+                names = (first, second) if source == 0 else (second, first)
+                conflicts = [{"value": value, "maps_to": sorted(targets)} for value, targets in mapping.items() if len(targets) > 1]
+                add(f"functional_dependency:{names[0]}->{names[1]}", len(conflicts), conflicts)
+
+        if self.key_hashes or self.checked_years:
+            duplicate_keys, duplicated = self.duplicate_keys, list(self.duplicated_hashes)
+            if self.key_hashes:
+                distinct, counts = np.unique(np.concatenate(self.key_hashes), return_counts=True)
+                duplicate_keys += int(np.sum(counts[counts > 1] - 1))
+                duplicated.extend(int(key_hash) for key_hash in distinct[counts > 1])
+            examples = [self.key_examples[key_hash] for key_hash in duplicated if key_hash in self.key_examples]
+            details = {"scope": "year", "split_years": sorted(self.split_years)} if self.keys_by_year else {"scope": "build"}
+            add("duplicate_keys", duplicate_keys, [dict(zip(KEY_COLUMNS, example)) for example in examples], **details)
+
+        for name, count in self.value_counts.items():
+            add(f"values:{name}", count, self.value_examples[name])
+
+        for name, values in self.categories.items():
+            if not values or not os.path.exists(dico_folder+name+".json"):
+                continue
+            known = set(cached_json(dico_folder+name+".json").values())
+            new_values = sorted(values - known)
+            add(f"new_categories:{name}", len(new_values), new_values)
+
+        return {"rows": self.rows, "passed": all(result["passed"] for result in results), "checks": results}
+
+    def validate(self, dico_folder:str="", thresholds:dict[str, int|None]|None=None) -> bool:
+        """
+        Writes the report to <dico_folder>validation_report.json and prints the failed checks.
+
+        Args:
+            dico_folder (str): The folder of the dictionaries, where the report is written.
+            thresholds (dict|None): The maximum number of violations of the checks, see DEFAULT_THRESHOLDS.
+        Returns:
+            bool: Whether every check passed its threshold.
+        """
+        report = self.report(dico_folder, thresholds)
+        with open(dico_folder+REPORT_FILE_NAME+".json", mode='w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=4)
+        for result in report["checks"]:
+            if result["violations"]:
+                status = "FAILED" if not result["passed"] else "reported"
+                print(f"Validation {status}: {result['check']} has {result['violations']} violations (threshold {result['threshold']}), e.g. {result['examples'][:2]}")
+        print(f"Validation of {report['rows']} rows {'passed' if report['passed'] else 'failed'}, report written to {dico_folder+REPORT_FILE_NAME}.json")
+        return report["passed"]
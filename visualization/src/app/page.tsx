@@ -3,8 +3,6 @@
 import { useTranslations } from "next-intl";
 import { Fragment, type JSX, useEffect, useState } from "react";
 
-import Papa from "papaparse";
-
 import ArrowUpDown from "@/components/ArrowUpDown";
 import ParamBar from "@/components/ParamBar";
 import ConfigBar from "@/components/configBar";
@@ -22,13 +20,13 @@ import {
     getAllChildren,
 } from "@/utils/MODLecture";
 import Icon from "@/utils/icon";
-import { readNpz } from "@/utils/read";
+import { type EventIndex, readEvents, readNpz } from "@/utils/read";
 
 export default function HomePage(): JSX.Element {
     const t = useTranslations("HomePage");
 
     const [allData, setAllData] = useState<{ [key: string]: number[][] }>({});
-    const [allEvents, setAllEvents] = useState<any[]>([]);
+    const [allEvents, setAllEvents] = useState<EventIndex | null>(null);
     const [typeData, setTypeData] = useState<number>(0);
     const [currentYear, setCurrentYear] = useState<number>(
         metadata_app.bois.start_year,
@@ -69,43 +67,15 @@ export default function HomePage(): JSX.Element {
         }
     }, []);
 
-    // 🔹 Charger le CSV une seule fois
+    // 🔹 Charger l'index des évènements (compilé par events.py) une seule fois
     useEffect(() => {
-        const basePath = process.env.NEXT_PUBLIC_BASE_PATH ?? "";
-        const url = `${basePath}/data/all_event_wood_bis.csv`;
-
-        fetch(url)
-            .then((res) => {
-                console.log(`📥 Fetch terminé, status=${res.status}`);
-                if (!res.ok) {
-                    throw new Error(`Impossible de charger le CSV à ${url}`);
-                }
-                return res.text();
-            })
-            .then((csvText) => {
-                console.log(
-                    `📝 CSV chargé, longueur=${csvText.length} caractères`,
-                );
-
-                // Parser le CSV avec PapaParse
-                Papa.parse(csvText, {
-                    worker: true, // utiliser un worker pour ne pas bloquer le thread principal
-                    header: true, // première ligne = noms de colonnes
-                    skipEmptyLines: true,
-                    dynamicTyping: true,
-                    complete: (result: any) => {
-                        console.log(
-                            `✅ CSV parsé, ${result.data.length} lignes`,
-                        );
-                        setAllEvents(result.data);
-                    },
-                    error: (err: any) => {
-                        console.error("❌ Erreur PapaParse:", err);
-                    },
-                });
+        readEvents()
+            .then((events) => {
+                console.log(`✅ Index chargé, ${events.start.length} évènements`);
+                setAllEvents(events);
             })
             .catch((err) => {
-                console.error("❌ Fetch CSV échoué:", err);
+                console.error("❌ Chargement des évènements échoué:", err);
             });
     }, []);
 
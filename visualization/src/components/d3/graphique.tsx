@@ -18,6 +18,12 @@ import pays from "@/data/countries.json";
 import type_data from "@/data/exports.json";
 import list_products from "@/data/products.json";
 import all_icons from "@/data/symboles.json";
+import {
+    type EventIndex,
+    eventDate,
+    eventMonth,
+    eventsInWindow,
+} from "@/utils/read";
 
 import updateMultiLines_with_icons from "./line_chart_with_icons";
 import updateMirrorStackedAreaChart from "./mirror_stacked_area_chart";
@@ -47,7 +53,7 @@ interface GraphiqueProps {
     countriesSelected: number[];
     isGlobalView: boolean;
     iconSelected: string[];
-    allEvents: any;
+    allEvents: EventIndex | null;
 }
 type Country = {
     code: string;
@@ -190,8 +196,13 @@ export default function Graphique({
     }, [iconSelected]);
 
     const events_filtered = useMemo(() => {
-        return filterevents(allEvents, map_icons, countriesSelected);
-    }, [allEvents, map_icons, countriesSelected]);
+        return filterevents(
+            allEvents,
+            map_icons,
+            countriesSelected,
+            globalAllDates,
+        );
+    }, [allEvents, map_icons, countriesSelected, globalAllDates]);
 
     //init du SVG
     useEffect(() => {
@@ -460,62 +471,39 @@ function flattenGlobalMap(
 }
 
 function filterevents(
-    events: any[],
+    events: EventIndex | null,
     map_icons: Record<string, any>,
     contrySelected: number[],
+    dates: Date[],
 ) {
-    //données traités pour avoir les infos des icones
-    const parseDate1 = d3.timeParse("%Y-%m-%d"); // parsing date pour les icones
-    const parseDate2 = d3.timeParse("%Y-%m");
-    const paysMap: Record<string, any> = pays;
-    // construire la liste des valeurs possibles depuis la sélection
-    const selectedValues = contrySelected.flatMap((id) => {
-        const v = paysMap[id];
-        if (!v) return [];
-        return [v.code, v.en, v.fr, v.event_name].filter(Boolean);
-    });
-    selectedValues.push("France Bois"); // on ajoute la France
-    const eventsWithIcons = events
-        .map((event) => {
-            // parse de la date
-
-            const dateParsed = parseDate1(event.date_debut)
-                ? parseDate1(event.date_debut)
-                : parseDate2(event.date_debut)
-                  ? parseDate2(event.date_debut)
-                  : null;
-            if (!dateParsed) return null;
-
-            // catégorie / icône
-            let category = "";
-            let icon = null;
-            if (event.categorie) {
-                const typeList = event.categorie.split("/");
-                category = typeList.find((t: any) => t in map_icons) || "";
-                icon = map_icons[category] || null;
-            } else {
-                icon = map_icons[category] || null;
-            }
-            //filtrage par pays event.pays
-            // valeurs du event (split + trim)
-            const eventValues = event.pays.split("/").map((p: any) => p.trim());
-
-            const filterContry = eventValues.some((ev: any) =>
-                selectedValues.includes(ev),
-            );
-            if (!filterContry) return null;
-
-            if (!icon) return null;
-            const id = `icon-${category.toLowerCase().replace(/\s+/g, "-")}`;
-            return {
-                ...event, // on garde toutes les infos originales
-                dateParsed, // date prête à l’emploi
+    if (!events || !dates.length) return [];
+    // évènements qui chevauchent la période affichée, pour les pays sélectionnés
+    // (et ceux de "France Bois", toujours affichés), trouvés par recherche dichotomique
+    const ids = eventsInWindow(
+        events,
+        eventMonth(events, dates[0]),
+        eventMonth(events, dates[dates.length - 1]),
+        contrySelected,
+    );
+    return ids.flatMap((eventId) => {
+        // catégorie / icône
+        const category =
+            events.categories[eventId].find((t) => t in map_icons) || "";
+        const icon = map_icons[category] || null;
+        if (!icon) return [];
+        const id = `icon-${category.toLowerCase().replace(/\s+/g, "-")}`;
+        return [
+            {
+                titre_court: events.title[eventId],
+                description_rapide: events.description[eventId],
+                categorie: events.categories[eventId].join("/"),
+                pays: events.countries[eventId].join("/"),
+                dateParsed: eventDate(events, eventId), // date prête à l’emploi
                 category, // catégorie finale
                 id, //id associée
-            };
-        })
-        .filter((d) => d !== null); // on enlève les events invalides
-    return eventsWithIcons;
+            },
+        ];
+    });
 }
 
 function flattenGroupedData3(groupedData: any[]) {
@@ -66,10 +66,11 @@ export const LOCALES = {
     FRENCH: "fr",
 } as const;
 
+// Levels of detail of the map, world-<size>.json written by topology.py (see world-lod.json)
 export const MAP_DEFINITIONS = {
-    low: "110m",
-    medium: "50m",
-    high: "10m",
+    low: "lod-low",
+    medium: "lod-medium",
+    high: "lod-high",
 } as const;
 
 /**
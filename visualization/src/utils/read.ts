@@ -1,7 +1,49 @@
 const basePath = process.env.NEXT_PUBLIC_BASE_PATH ?? "";
 
+interface BuildManifest {
+    version: number;
+    header: string[];
+    years: Record<
+        string,
+        {
+            rows: number;
+            files: Record<
+                string,
+                {
+                    file: string;
+                    sha256: string;
+                    bytes: number;
+                    dtypes: Record<string, string>;
+                }
+            >;
+        }
+    >;
+}
+
+let buildManifest: Promise<BuildManifest | null> | null = null;
+
+// The manifest written by compresser.py --hashed-names, revalidated on every load since
+// it is the only file whose content changes under the same name. null when missing.
+function readBuildManifest(): Promise<BuildManifest | null> {
+    if (!buildManifest) {
+        buildManifest = fetch(`${basePath}/data/manifest.json`, {
+            cache: "no-cache",
+        })
+            .then((res) => (res.ok ? res.json() : null))
+            .catch(() => null);
+    }
+    return buildManifest;
+}
+
+// URL of the file of a year, under its content-hashed name when the manifest lists it.
+async function dataUrl(year: number, extension: string): Promise<string> {
+    const manifest = await readBuildManifest();
+    const file = manifest?.years[year]?.files[extension]?.file;
+    return `${basePath}/data/${file ?? `data_${year}.${extension}`}`;
+}
+
 export async function readNpz(year: number): Promise<number[][]> {
-    const url = `${basePath}/data/data_${year}.npz`;
+    const url = await dataUrl(year, "npz");
     const res = await fetch(url);
     if (!res.ok) {
         throw new Error(`Failed to fetch NPZ for year ${year}: ${res.status}`);
@@ -28,12 +70,12 @@ export async function readNpz(year: number): Promise<number[][]> {
 
         const parsed = await parser.parse((data as Uint8Array).buffer);
         // eslint-disable-next-line @typescript-eslint/no-explicit-any
-        const arrData: any = parsed.data; // TypedArray
+        const arrData: any = parsed.data; // TypedArray, BigInt64Array for the int64 years
         const shape: number[] = parsed.shape;
 
         if (Array.isArray(shape) && shape.length === 2) {
             const [rows, cols] = shape;
-            const flat = Array.from(arrData as Iterable<number>);
+            const flat = Array.from(arrData as Iterable<number | bigint>, Number);
             const matrix: number[][] = new Array(rows);
             for (let r = 0; r < rows; r++) {
                 matrix[r] = flat.slice(r * cols, (r + 1) * cols);
@@ -42,7 +84,7 @@ export async function readNpz(year: number): Promise<number[][]> {
             break;
         } else {
             // Flatten 1D arrays into a single row for a consistent number[][] return.
-            const flat = Array.from(arrData as Iterable<number>);
+            const flat = Array.from(arrData as Iterable<number | bigint>, Number);
             fallbackArrays.push(flat);
         }
     }
@@ -51,3 +93,95 @@ export async function readNpz(year: number): Promise<number[][]> {
     if (fallbackArrays.length) return fallbackArrays;
     throw new Error(`No arrays found in NPZ for year ${year}`);
 }
+
+export interface EventIndex {
+    base_year: number;
+    start: number[];
+    end: number[];
+    max_end: number[];
+    day: number[];
+    title: string[];
+    description: string[];
+    categories: string[][];
+    countries: string[][];
+    postings: Record<string, number[]>;
+    always: number[];
+}
+
+let eventIndex: Promise<EventIndex> | null = null;
+
+// Fetches the event index compiled by events.py, once.
+export function readEvents(): Promise<EventIndex> {
+    if (!eventIndex) {
+        eventIndex = fetch(`${basePath}/data/events.json`).then((res) => {
+            if (!res.ok) {
+                throw new Error(`Failed to fetch events: ${res.status}`);
+            }
+            return res.json();
+        });
+        eventIndex.catch(() => (eventIndex = null));
+    }
+    return eventIndex;
+}
+
+// Index of the first value of a sorted array greater than or equal to the target
+// (strictly greater with after), values.length if there is none.
+function bisect(values: number[], target: number, after = false): number {
+    let low = 0;
+    let high = values.length;
+    while (low < high) {
+        const middle = (low + high) >> 1;
+        if (values[middle] < target || (after && values[middle] === target)) {
+            low = middle + 1;
+        } else {
+            high = middle;
+        }
+    }
+    return low;
+}
+
+// Month of a date on the axis of the event index, 0 for January of its base year.
+export function eventMonth(index: EventIndex, date: Date): number {
+    return (date.getFullYear() - index.base_year) * 12 + date.getMonth();
+}
+
+// Indexes of the events overlapping the months first to last (included), of the given
+// countries of countries.json (and the always shown ones), or of every country when
+// countries is null. Found by binary search, see overlapping_events in events.py.
+export function eventsInWindow(
+    index: EventIndex,
+    first: number,
+    last: number,
+    countries: (number | string)[] | null = null,
+): number[] {
+    const lower = bisect(index.max_end, first);
+    const upper = bisect(index.start, last, true);
+    const lists =
+        countries === null
+            ? [Array.from({ length: upper - lower }, (_, i) => lower + i)]
+            : [
+                  index.always,
+                  ...countries.map((id) => index.postings[String(id)] ?? []),
+              ].map((ids) =>
+                  ids.slice(bisect(ids, lower), bisect(ids, upper)),
+              );
+    const found = new Set<number>();
+    for (const ids of lists) {
+        for (const id of ids) {
+            if (index.end[id] >= first) {
+                found.add(id);
+            }
+        }
+    }
+    return Array.from(found).sort((a, b) => a - b);
+}
+
+// Date of the start of an event, without parsing any text.
+export function eventDate(index: EventIndex, id: number): Date {
+    const month = index.start[id];
+    return new Date(
+        index.base_year + Math.floor(month / 12),
+        ((month % 12) + 12) % 12,
+        index.day[id],
+    );
+}